@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from model import FireRescueModel
+from rng import game_seed
+from profiler import Profiler
+from game_trace import TraceWriter
+
+
+def play_game(seed, strategy='improved', num_agents=1, max_steps=20000, cell_grid=False, mcts_budget=0.05,
+              profiler=None, max_turns=None, trace=None, game=None, keyframes=0, mcts_workers=0):
+    model = FireRescueModel(strategy=strategy, num_agents=num_agents, seed=seed, cell_grid=cell_grid,
+                            mcts_budget=mcts_budget, mcts_workers=mcts_workers)
+    if profiler is not None:
+        model.enable_profiling(profiler)
+    if trace is not None:
+        model.enable_tracing(trace, game, keyframes)
+    steps = 0
+    turns = 0
+    try:
+        while not model.game_over and steps < max_steps and (max_turns is None or turns < max_turns):
+            if model.advance_fire:
+                turns += 1
+            model.step()
+            steps += 1
+    finally:
+        model.close()
+    model.disable_tracing()
+    result = {
+        "seed": seed,
+        "strategy": strategy,
+        "num_agents": num_agents,
+        "finished": model.game_over,
+        "won": model.game_won,
+        "victims_rescued": model.victims_rescued,
+        "victims_lost": model.victims_lost,
+        "damage_cubes": model.damage_cubes,
+        "turns": turns,
+        "steps": steps
+    }
+    if model.planner is not None:
+        result["rollouts"] = model.planner.rollouts
+        result["search_sec"] = model.planner.search_time
+    return result
+
+
+def _play_chunk(args):
+    base_seed, games, strategy, num_agents, max_steps, cell_grid, mcts_budget, profile, trace, keyframes, mcts_workers = args
+    profiler = Profiler() if profile else None
+    # One trace file per chunk, so worker processes never share a file
+    writer = TraceWriter(f"{trace}.{games[0]}") if trace else None
+    results = []
+    try:
+        for game in games:
+            # Replay a single game with play_game(game_seed(base_seed, game), ...)
+            result = play_game(game_seed(base_seed, game), strategy, num_agents, max_steps, cell_grid, mcts_budget,
+                               profiler, trace=writer, game=game, keyframes=keyframes, mcts_workers=mcts_workers)
+            result["seed"] = base_seed
+            result["game"] = game
+            results.append(result)
+    finally:
+        if writer is not None:
+            writer.close()
+    return results, profiler
+
+
+def aggregate(results):
+    games = len(results)
+    if games == 0:
+        return {"games": 0}
+    finished = [r for r in results if r["finished"]]
+    summary = {
+        "games": games,
+        "finished": len(finished),
+        "win_rate": sum(r["won"] for r in results) / games,
+        "avg_victims_rescued": sum(r["victims_rescued"] for r in results) / games,
+        "avg_victims_lost": sum(r["victims_lost"] for r in results) / games,
+        "avg_damage_cubes": sum(r["damage_cubes"] for r in results) / games,
+        "avg_turns": sum(r["turns"] for r in finished) / len(finished) if finished else None,
+        "avg_steps": sum(r["steps"] for r in results) / games
+    }
+    search_sec = sum(r.get("search_sec", 0.0) for r in results)
+    if search_sec:
+        summary["rollouts_per_sec"] = sum(r["rollouts"] for r in results) / search_sec
+    return summary
+
+
+def run_batch(games, strategy='improved', num_agents=1, base_seed=0, workers=None,
+              max_steps=20000, chunk_size=None, cell_grid=False, mcts_budget=0.05, profiler=None, trace=None,
+              keyframes=0, mcts_workers=0):
+    """Play ``games`` games; with a ``profiler``, every worker's phase timings are merged into it.
+
+    With ``trace`` set, every game is recorded to ``<trace>.<first game of its chunk>`` trace files,
+    numbered by its game index; ``game_trace.trace_files(trace)`` lists them. With ``keyframes`` the
+    traces also hold every game state, for ``replay.Replay``.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Game i gets stream i spawned from base_seed, so batches with nearby base seeds never share games
+    # and the results do not depend on how games are split between workers
+    indexes = list(range(games))
+    # Several games per task keeps pickling and scheduling overhead small next to the games themselves
+    if chunk_size is None:
+        chunk_size = max(1, games // (workers * 4))
+    chunks = [(base_seed, indexes[i:i + chunk_size], strategy, num_agents, max_steps, cell_grid, mcts_budget,
+               profiler is not None, trace, keyframes, mcts_workers)
+              for i in range(0, games, chunk_size)]
+    start = time.perf_counter()
+    results = []
+    def collect(chunk_results, chunk_profiler):
+        results.extend(chunk_results)
+        if chunk_profiler is not None:
+            profiler.merge(chunk_profiler)
+    if workers == 1:
+        for chunk in chunks:
+            collect(*_play_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_output in pool.map(_play_chunk, chunks):
+                collect(*chunk_output)
+    elapsed = time.perf_counter() - start
+    summary = aggregate(results)
+    summary.update({
+        "strategy": strategy,
+        "num_agents": num_agents,
+        "base_seed": base_seed,
+        "workers": workers,
+        "elapsed_sec": elapsed,
+        "games_per_sec": games / elapsed if elapsed > 0 else None
+    })
+    return summary, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless FireRescueModel games in parallel")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--strategy", nargs="+", default=["improved"])
+    parser.add_argument("--num-agents", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=20000)
+    parser.add_argument("--cell-grid", action="store_true", help="use the array-backed fire/smoke grid")
+    parser.add_argument("--mcts-budget", type=float, default=0.05, help="seconds of rollouts per action for --strategy mcts")
+    parser.add_argument("--mcts-workers", type=int, default=0,
+                        help="processes each --strategy mcts search runs in (use with --workers 1)")
+    parser.add_argument("--output", default=None, help="write per-game results as JSON lines")
+    parser.add_argument("--profile", default=None, help="write per-phase timings of every configuration as JSON")
+    parser.add_argument("--trace", default=None,
+                        help="record every game to PREFIX.<strategy>_<agents>.<chunk> trace files")
+    parser.add_argument("--keyframes", type=int, default=0,
+                        help="with --trace, also record game states, in full every N steps, for replay.py")
+    args = parser.parse_args()
+    summaries = []
+    profiles = {}
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for strategy in args.strategy:
+            for num_agents in args.num_agents:
+                profiler = Profiler() if args.profile else None
+                trace = f"{args.trace}.{strategy}_{num_agents}" if args.trace else None
+                summary, results = run_batch(args.games, strategy, min(num_agents, 6), args.seed,
+                                             args.workers, args.max_steps, cell_grid=args.cell_grid,
+                                             mcts_budget=args.mcts_budget, profiler=profiler, trace=trace,
+                                             keyframes=args.keyframes, mcts_workers=args.mcts_workers)
+                if profiler is not None:
+                    profiles[f"{strategy}/{num_agents}"] = profiler.report()
+                summaries.append(summary)
+                print(json.dumps(summary))
+                if out:
+                    for result in results:
+                        out.write(json.dumps(result) + "\n")
+    finally:
+        if out:
+            out.close()
+    if args.profile:
+        with open(args.profile, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, indent=2)
+    return summaries
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import http.client
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import mesa
+import numpy as np
+from model import FireRescueModel
+from profiler import percentile
+from random_model import RandomFireRescueModel
+
+# Benchmark functions by name, in the order they run
+BENCHMARKS = {}
+# Statistic compared against a baseline to flag regressions
+METRIC = 'p50_us'
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(op, repeat, setup=None):
+    """Time ``repeat`` calls of ``op``; ``setup``, if given, runs untimed before each one."""
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        op(i)
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "calls": len(times),
+        "mean_us": sum(times) / len(times) * 1e6,
+        "min_us": times[0] * 1e6,
+        "p50_us": percentile(times, 0.50) * 1e6,
+        "p90_us": percentile(times, 0.90) * 1e6,
+        "p99_us": percentile(times, 0.99) * 1e6
+    }
+
+
+def midgame_model(num_agents=4, seed=3, steps=150):
+    model = FireRescueModel(num_agents=num_agents, seed=seed)
+    for _ in range(steps):
+        model.step()
+    return model
+
+
+def play_random_model(num_agents, seed, max_steps):
+    model = RandomFireRescueModel(num_agents=num_agents, seed=seed)
+    steps = 0
+    while not model.game_over and steps < max_steps:
+        model.step_firefighter()
+        steps += 1
+        # The random strategy rarely finishes its turns, so the fire advances on a fixed beat
+        if steps % 4 == 0:
+            model.step_fire()
+            model.check_game_outcome()
+    return steps
+
+
+def play_model(num_agents, seed, max_steps):
+    model = FireRescueModel(num_agents=num_agents, seed=seed)
+    steps = 0
+    while not model.game_over and steps < max_steps:
+        model.step()
+        steps += 1
+    return steps
+
+
+@benchmark('construct_model')
+def bench_construct_model(scale):
+    return measure(lambda i: FireRescueModel(num_agents=6, seed=i), 200 * scale)
+
+
+@benchmark('construct_random_model')
+def bench_construct_random_model(scale):
+    return measure(lambda i: RandomFireRescueModel(num_agents=6, seed=i), 200 * scale)
+
+
+def dijkstra_pairs(model, count):
+    rng = random.Random(0)
+    x0, y0, x1, y1 = model.interior
+    cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    return [(rng.choice(model.exit_positions), rng.choice(cells)) for _ in range(count)]
+
+
+@benchmark('dijkstra_start_board')
+def bench_dijkstra_start_board(scale):
+    model = FireRescueModel(num_agents=1, seed=0)
+    pairs = dijkstra_pairs(model, 500 * scale)
+    # The uncached search, so every call does the full work
+    return measure(lambda i: model.dijkstra(*pairs[i]), len(pairs))
+
+
+@benchmark('dijkstra_midgame')
+def bench_dijkstra_midgame(scale):
+    model = midgame_model()
+    pairs = dijkstra_pairs(model, 500 * scale)
+    agent = next(iter(model.firefighters))
+    return measure(lambda i: model.dijkstra(pairs[i][0], pairs[i][1], agent), len(pairs))
+
+
+@benchmark('fire_phase_explosions')
+def bench_fire_phase_explosions(scale):
+    # Half the building on fire, so most dice rolls hit a fire and explode
+    model = midgame_model()
+    rng = random.Random(0)
+    x0, y0, x1, y1 = model.interior
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            if rng.random() < 0.5:
+                model.place_fire((x, y))
+    snapshot = model.snapshot()
+    explosions = []
+    model.event_listeners.append(lambda event: explosions.append(1) if event[0] == 'explosion' else None)
+    def setup(i):
+        model.restore(snapshot)
+        model.reseed(i)
+    result = measure(lambda i: model.advance_fire_phase(), 300 * scale, setup)
+    result["explosions_per_phase"] = len(explosions) / result["calls"]
+    return result
+
+
+@benchmark('get_state_json')
+def bench_get_state_json(scale):
+    model = midgame_model()
+    return measure(lambda i: json.dumps(model.get_state()), 1000 * scale)
+
+
+@benchmark('get_state_encoded')
+def bench_get_state_encoded(scale):
+    # The path the server answers with, after every step of a running game, so the cached wall,
+    # door, fire and smoke fragments are invalidated as often as they would be in play
+    model = midgame_model()
+    snapshot = model.snapshot()
+    def setup(i):
+        if model.game_over:
+            model.restore(snapshot)
+        model.step()
+    return measure(lambda i: model.get_state_json(), 1000 * scale, setup)
+
+
+def bench_games(play, num_agents, games, max_steps):
+    steps = []
+    result = measure(lambda i: steps.append(play(num_agents, i, max_steps)), games)
+    result["steps_per_sec"] = sum(steps) / (result["mean_us"] * result["calls"] / 1e6)
+    return result
+
+
+@benchmark('game_model_1')
+def bench_game_model_1(scale):
+    return bench_games(play_model, 1, 10 * scale, 3000)
+
+
+@benchmark('game_model_6')
+def bench_game_model_6(scale):
+    return bench_games(play_model, 6, 10 * scale, 3000)
+
+
+@benchmark('game_random_model_1')
+def bench_game_random_model_1(scale):
+    return bench_games(play_random_model, 1, 10 * scale, 3000)
+
+
+@benchmark('game_random_model_6')
+def bench_game_random_model_6(scale):
+    return bench_games(play_random_model, 6, 10 * scale, 3000)
+
+
+@benchmark('http_step')
+def bench_http_step(scale):
+    import server
+    from sessions import SessionManager
+    server.sessions = SessionManager()
+    httpd = server.SimulationServer(('127.0.0.1', 0), server.Server)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+    def request(method, path, body=None):
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        return json.loads(conn.getresponse().read())
+    times = []
+    try:
+        game = 0
+        while len(times) < 500 * scale:
+            request('POST', '/reset', json.dumps({"num_agents": 4, "seed": game}))
+            game += 1
+            game_over = False
+            while not game_over and len(times) < 500 * scale:
+                start = time.perf_counter()
+                response = request('GET', '/step')
+                times.append(time.perf_counter() - start)
+                game_over = response["game_state"]["game_stats"]["game_over"]
+    finally:
+        conn.close()
+        httpd.shutdown()
+        httpd.server_close()
+    return summarize(times)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "mesa": mesa.__version__
+    }
+
+
+def run_benchmarks(names=None, scale=1):
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = func(scale)
+        print(f"{name:24} {METRIC} {results[name][METRIC]:12.1f}", file=sys.stderr)
+    return {"environment": environment(), "scale": scale, "benchmarks": results}
+
+
+def compare(baseline, current, threshold):
+    """Benchmarks whose ``METRIC`` got more than ``threshold`` (a fraction) slower than ``baseline``."""
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        ratio = result[METRIC] / before[METRIC]
+        print(f"{name:24} {before[METRIC]:12.1f} -> {result[METRIC]:12.1f} us  x{ratio:.2f}", file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append({"name": name, "baseline": before[METRIC], "current": result[METRIC],
+                                "ratio": ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths and flag regressions against a baseline")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default all: {', '.join(BENCHMARKS)})")
+    parser.add_argument("--scale", type=int, default=1, help="multiply every repeat count, for steadier numbers")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown fraction counted as a regression")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    current = run_benchmarks(args.names, args.scale)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        current["baseline"] = args.compare
+        current["regressions"] = compare(baseline, current, args.threshold)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    print(json.dumps(current.get("regressions", current["benchmarks"])))
+    return 1 if current.get("regressions") else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+from collections.abc import MutableMapping
+import mesa
+import numpy as np
+
+DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+OPPOSITE = (2, 3, 0, 1)
+
+NO_WALL, WALL_INTACT, WALL_DAMAGED, WALL_DESTROYED = 0, 1, 2, 3
+NO_DOOR, DOOR_CLOSED, DOOR_OPEN, DOOR_DESTROYED = 0, 1, 2, 3
+DOOR_CODES = {'closed': DOOR_CLOSED, 'open': DOOR_OPEN, 'destroyed': DOOR_DESTROYED}
+
+
+class EdgeTable:
+    """Wall and door state for every cell side, indexed by (x, y, direction).
+
+    Each shared edge is stored on both of its cells so a lookup never has to
+    build the sorted (pos1, pos2) key used by ``model.walls`` and ``model.doors``.
+    Wall codes are damage + 1 (0 means no wall), door codes follow ``DOOR_CODES``.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.wall = np.zeros((width, height, 4), dtype=np.int8)
+        self.door = np.zeros((width, height, 4), dtype=np.int8)
+
+    @classmethod
+    def from_board(cls, width, height, walls, wall_damage, doors):
+        table = cls(width, height)
+        for wall in walls:
+            table.set_wall(wall[0], wall[1], wall_damage.get(wall, 0))
+        for door, info in doors.items():
+            table.set_door(door[0], door[1], info['state'])
+        return table
+
+    @classmethod
+    def from_arrays(cls, wall, door, copy=True):
+        """Table holding copies of ``wall`` and ``door``, or (``copy=False``) the arrays themselves."""
+        table = cls.__new__(cls)
+        table.width, table.height = wall.shape[0], wall.shape[1]
+        table.wall = np.array(wall, dtype=np.int8) if copy else wall
+        table.door = np.array(door, dtype=np.int8) if copy else door
+        return table
+
+    def copy(self):
+        return EdgeTable.from_arrays(self.wall, self.door)
+
+    def _set(self, array, pos1, pos2, code):
+        d = DIRECTION_INDEX.get((pos2[0] - pos1[0], pos2[1] - pos1[1]))
+        if d is None:
+            return
+        if 0 <= pos1[0] < self.width and 0 <= pos1[1] < self.height:
+            array[pos1[0], pos1[1], d] = code
+        if 0 <= pos2[0] < self.width and 0 <= pos2[1] < self.height:
+            array[pos2[0], pos2[1], OPPOSITE[d]] = code
+
+    def set_wall(self, pos1, pos2, damage):
+        self._set(self.wall, pos1, pos2, damage + 1)
+
+    def set_door(self, pos1, pos2, state):
+        self._set(self.door, pos1, pos2, DOOR_CODES[state])
+
+    def wall_code(self, pos1, pos2):
+        d = DIRECTION_INDEX.get((pos2[0] - pos1[0], pos2[1] - pos1[1]))
+        if d is None:
+            return NO_WALL
+        return self.wall.item(pos1[0], pos1[1], d)
+
+    def door_code(self, pos1, pos2):
+        d = DIRECTION_INDEX.get((pos2[0] - pos1[0], pos2[1] - pos1[1]))
+        if d is None:
+            return NO_DOOR
+        return self.door.item(pos1[0], pos1[1], d)
+
+    def wall_blocks(self, pos1, pos2):
+        return WALL_INTACT <= self.wall_code(pos1, pos2) < WALL_DESTROYED
+
+    def blocks_fire(self, pos1, pos2):
+        return self.wall_blocks(pos1, pos2) or self.door_code(pos1, pos2) == DOOR_CLOSED
+
+
+EMPTY, SMOKE, FIRE = 0, 1, 2
+
+
+class CellLayer(MutableMapping):
+    """Dict-style view of the cells in ``cells`` that hold ``code``.
+
+    Lets the fire and smoke layers live in one uint8 grid while callers keep
+    using ``pos in model.fires``, ``del model.smoke[pos]`` and ``.keys()``.
+    """
+
+    def __init__(self, cells, code, marker):
+        self.cells = cells
+        self.code = code
+        self.marker = marker
+        self.width, self.height = cells.shape
+
+    def __contains__(self, pos):
+        x, y = pos
+        return 0 <= x < self.width and 0 <= y < self.height and self.cells.item(x, y) == self.code
+
+    def __getitem__(self, pos):
+        if pos not in self:
+            raise KeyError(pos)
+        return self.marker(pos)
+
+    def __setitem__(self, pos, value):
+        self.cells[pos] = self.code
+
+    def __delitem__(self, pos):
+        if pos not in self:
+            raise KeyError(pos)
+        self.cells[pos] = EMPTY
+
+    def __iter__(self):
+        xs, ys = np.nonzero(self.cells == self.code)
+        return iter(list(zip(xs.tolist(), ys.tolist())))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.cells == self.code))
+
+
+
+class OccupancyGrid(mesa.space.MultiGrid):
+    """MultiGrid that also counts the agents of ``tracked_type`` on every cell.
+
+    The counts follow place_agent/remove_agent (move_agent goes through both),
+    so "is a firefighter standing here?" is an array lookup instead of a scan of
+    the cell's contents.
+    """
+
+    def __init__(self, width, height, torus, tracked_type):
+        super().__init__(width, height, torus)
+        self.tracked_type = tracked_type
+        self.occupancy = np.zeros((width, height), dtype=np.uint8)
+
+    def place_agent(self, agent, pos):
+        super().place_agent(agent, pos)
+        if isinstance(agent, self.tracked_type):
+            self.occupancy[agent.pos] += 1
+
+    def remove_agent(self, agent):
+        if isinstance(agent, self.tracked_type):
+            self.occupancy[agent.pos] -= 1
+        super().remove_agent(agent)
+
+    def is_occupied(self, pos, ignore=None):
+        """Whether a tracked agent other than ``ignore`` stands on ``pos``."""
+        if self.out_of_bounds(pos):
+            return False
+        count = self.occupancy.item(pos)
+        if ignore is not None and ignore.pos == pos:
+            count -= 1
+        return count > 0
+
+def shift(array, dx, dy):
+    """Return ``out`` with ``out[x, y] == array[x + dx, y + dy]``, zero past the border."""
+    out = np.zeros_like(array)
+    width, height = array.shape[:2]
+    out[max(0, -dx):width - max(0, dx), max(0, -dy):height - max(0, dy)] = \
+        array[max(0, dx):width - max(0, -dx), max(0, dy):height - max(0, -dy)]
+    return out
+
+
+def flashover_mask(cells, edges):
+    """Smoke cells that share an open side (no standing wall, no closed door) with a fire."""
+    fire = cells == FIRE
+    passable = (((edges.wall == NO_WALL) | (edges.wall == WALL_DESTROYED))
+                & (edges.door != DOOR_CLOSED))
+    spread = np.zeros_like(fire)
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        spread |= shift(fire, dx, dy) & passable[:, :, d]
+    return spread & (cells == SMOKE)
@@ -0,0 +1,130 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+# Sections of FireRescueModel.get_state and how their entries are keyed
+KEYED_SECTIONS = ('agents', 'victims', 'pois')
+EDGE_SECTIONS = ('walls', 'doors')
+CELL_SECTIONS = ('fires', 'smoke', 'signs')
+
+# Shared by every tracker so a version number from one game can never match a state of another
+_versions = itertools.count(1)
+_versions_lock = threading.Lock()
+
+
+def _next_version():
+    with _versions_lock:
+        return next(_versions)
+
+
+def index_state(state):
+    """Key every entry of a ``get_state`` dict so two states can be compared section by section."""
+    index = {}
+    for section in KEYED_SECTIONS:
+        index[section] = {item['id']: item for item in state[section]}
+    for section in EDGE_SECTIONS:
+        index[section] = {tuple(tuple(p) for p in item['pos']): item for item in state[section]}
+    for section in CELL_SECTIONS:
+        index[section] = {tuple(pos): pos for pos in state[section]}
+    index['game_stats'] = state['game_stats']
+    return index
+
+
+def diff_indexes(old, new):
+    """Changes needed to turn the ``old`` index into ``new``; unchanged sections are left out."""
+    delta = {}
+    for section in KEYED_SECTIONS + EDGE_SECTIONS + CELL_SECTIONS:
+        before = old[section]
+        after = new[section]
+        changed = [value for key, value in after.items() if before.get(key) != value]
+        removed = [key for key in before if key not in after]
+        if not changed and not removed:
+            continue
+        entry = {}
+        if section in CELL_SECTIONS:
+            if changed:
+                entry['add'] = changed
+            if removed:
+                entry['remove'] = removed
+        else:
+            if changed:
+                entry['upsert'] = changed
+            if removed:
+                entry['remove'] = removed
+        delta[section] = entry
+    if old['game_stats'] != new['game_stats']:
+        delta['game_stats'] = new['game_stats']
+    return delta
+
+
+def _key(section, key):
+    # Keys come back as lists once a delta went through JSON
+    if section in EDGE_SECTIONS:
+        return tuple(tuple(p) for p in key)
+    if section in CELL_SECTIONS:
+        return tuple(key)
+    return key
+
+
+def apply_delta(index, delta):
+    """Apply a ``diff_indexes`` delta to ``index`` in place, turning the old index into the new one."""
+    for section, entry in delta.items():
+        if section == 'game_stats':
+            index['game_stats'] = entry
+            continue
+        items = index[section]
+        for key in entry.get('remove', ()):
+            items.pop(_key(section, key), None)
+        for item in entry.get('upsert', entry.get('add', ())):
+            if section in KEYED_SECTIONS:
+                items[item['id']] = item
+            elif section in EDGE_SECTIONS:
+                items[_key(section, item['pos'])] = item
+            else:
+                items[_key(section, item)] = item
+    return index
+
+
+def state_from_index(index):
+    """The ``get_state`` dict an index was built from."""
+    state = {section: list(index[section].values()) for section in KEYED_SECTIONS + CELL_SECTIONS + EDGE_SECTIONS}
+    state['game_stats'] = index['game_stats']
+    return {key: state[key] for key in ('agents', 'victims', 'pois', 'fires', 'smoke', 'signs', 'walls', 'doors',
+                                        'game_stats')}
+
+
+class DeltaTracker:
+    """Recent state versions of one game, used to answer "what changed since version N".
+
+    ``record`` is called with every state the server is about to send; a new
+    version is only minted when something actually changed. Clients pass the
+    last version they applied (``since``); the delta is always taken from that
+    version, never from what was last sent, since a response can be lost on
+    the way. Anything no longer in history gets a full snapshot instead.
+    """
+
+    def __init__(self, history=64):
+        self.history = history
+        self.indexes = OrderedDict()
+        self.version = None
+
+    def reset(self):
+        self.indexes.clear()
+        self.version = None
+
+    def record(self, state):
+        index = index_state(state)
+        if self.version is not None and self.indexes[self.version] == index:
+            return self.version
+        self.version = _next_version()
+        self.indexes[self.version] = index
+        while len(self.indexes) > self.history:
+            self.indexes.popitem(last=False)
+        return self.version
+
+    def payload(self, state, since=None, full=False):
+        version = self.record(state)
+        if full or since is None or since not in self.indexes:
+            return {"version": version, "full": True, "game_state": state}
+        return {"version": version, "since": since, "full": False,
+                "delta": diff_indexes(self.indexes[since], self.indexes[version])}
@@ -0,0 +1,384 @@
+import argparse
+import collections
+import glob
+import json
+import os
+import struct
+import threading
+from delta import diff_indexes, index_state
+
+# Layout of the records, stored as the last byte of MAGIC; readers refuse any other version
+FORMAT_VERSION = 2
+# First bytes of every trace file
+MAGIC = b'FRTRACE' + str(FORMAT_VERSION).encode('ascii')
+# Each record is its length, then a HEADER and a UTF-8 JSON body
+LENGTH = struct.Struct('<I')
+# Record type, game, step and turn (0 where the record type has none)
+HEADER = struct.Struct('<BIII')
+# Record types, the first field of every record, and the JSON body each one is stored with:
+#   (GAME, game, meta)                  a game starts; meta describes it (seed, scenario, strategy, ...)
+#   (STEP, game, step, events)          the events one model.step raised, in order, as emitted; body events
+#   (END, game, step, stats)            the game ended or stopped being recorded; body stats
+#   (KEYFRAME, game, step, turn, state, board_order)
+#                                       get_state after the step; turn counts fire phases and board_order
+#                                       names the sections the model lists in board rather than insertion order;
+#                                       body [state, board_order]
+#   (DELTA, game, step, turn, delta)    delta.diff_indexes from the previous step's state; body delta
+GAME, STEP, END, KEYFRAME, DELTA = 0, 1, 2, 3, 4
+# Entry of the <trace>.idx file the writer keeps, one per KEYFRAME record: game, step, turn, file offset
+INDEX_ENTRY = struct.Struct('<IIIQ')
+# Event kinds stored as their index here; a kind missing from the list is stored as its name
+EVENT_KINDS = ('move', 'extinguish', 'chop', 'toggle_door', 'carry', 'reveal', 'rescue', 'wall', 'door', 'fire',
+               'smoke', 'clear', 'fire_phase', 'explosion', 'knockdown', 'victim_lost', 'poi_lost', 'poi',
+               'game_over', 'end_turn')
+EVENT_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+
+def _tuples(value):
+    # Events are tuples all the way down; JSON hands them back as lists
+    if type(value) is list:
+        return tuple(_tuples(item) for item in value)
+    return value
+
+
+def encode_record(record):
+    """The bytes of one record, without its length prefix."""
+    kind, game = record[0], record[1]
+    if kind == GAME:
+        header, body = HEADER.pack(kind, game, 0, 0), record[2]
+    elif kind == STEP or kind == END:
+        header, body = HEADER.pack(kind, game, record[2], 0), record[3]
+    elif kind == KEYFRAME:
+        header, body = HEADER.pack(kind, game, record[2], record[3]), (record[4], record[5])
+    elif kind == DELTA:
+        header, body = HEADER.pack(kind, game, record[2], record[3]), record[4]
+    else:
+        raise ValueError(f"unknown trace record type {kind!r}")
+    return header + json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+
+def decode_record(data):
+    """The record ``data`` was encoded from; events come back as tuples, everything else as JSON gives it.
+
+    Raises ValueError on anything malformed.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("trace record shorter than its header")
+    kind, game, step, turn = HEADER.unpack_from(data)
+    body = json.loads(data[HEADER.size:])
+    if kind == GAME:
+        return (GAME, game, body)
+    if kind == STEP:
+        return (STEP, game, step, _tuples(body))
+    if kind == END:
+        return (END, game, step, body)
+    if kind == KEYFRAME:
+        if type(body) is not list or len(body) != 2 or type(body[1]) is not list:
+            raise ValueError("malformed KEYFRAME record")
+        return (KEYFRAME, game, step, turn, body[0], tuple(body[1]))
+    if kind == DELTA:
+        return (DELTA, game, step, turn, body)
+    raise ValueError(f"unknown trace record type {kind}")
+
+
+def check_magic(f, path):
+    """Read the header of the trace ``f``, raising ValueError unless it is one this module can read."""
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        if len(magic) == len(MAGIC) and magic[:-1] == MAGIC[:-1]:
+            raise ValueError(f"{path} is a version {magic[-1:].decode('ascii', 'replace')} trace, "
+                             f"only version {FORMAT_VERSION} can be read")
+        raise ValueError(f"{path} is not a trace file")
+
+
+class TraceWriter:
+    """Append-only trace file written by a background thread.
+
+    ``write`` only queues the record, so the thread stepping a model never
+    waits on the disk. The writer thread wakes when ``batch_size`` records are
+    pending or every ``flush_interval`` seconds, encodes everything queued and
+    appends it with a single write. Records of many games can share one
+    writer, from any number of threads; each carries its game number.
+    With ``append`` an existing trace is continued rather than replaced;
+    game numbers then restart from 0 unless passed to ``new_game``. The
+    offset of every KEYFRAME record goes to ``<path>.idx`` for seeking.
+    """
+
+    def __init__(self, path, batch_size=1024, flush_interval=0.5, append=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        mode = 'ab' if append else 'wb'
+        if append and os.path.exists(path) and os.path.getsize(path):
+            # Records of another format version would make the whole file unreadable
+            with open(path, 'rb') as f:
+                check_magic(f, path)
+        self.file = open(path, mode)
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.offset = self.file.tell()
+        self.index_file = open(path + '.idx', mode)
+        self.pending = collections.deque()
+        self.wake = threading.Event()
+        self.closed = False
+        self.error = None
+        self.games = 0
+        self.records = 0
+        self.bytes = 0
+        self.batches = 0
+        self._games_lock = threading.Lock()
+        # Held while checking ``closed`` and queueing, so nothing is queued after the final drain
+        self._queue_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f"trace-writer {path}", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def new_game(self, meta, game=None):
+        """Write a GAME record and return its game number (the next free one unless ``game`` is given)."""
+        with self._games_lock:
+            if game is None:
+                game = self.games
+            self.games = max(self.games, game + 1)
+        self.write((GAME, game, meta))
+        return game
+
+    def write(self, record):
+        with self._queue_lock:
+            if self.closed:
+                raise ValueError("trace writer is closed")
+            self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            self.wake.set()
+
+    def _drain(self):
+        chunks = []
+        entries = []
+        flushed = []
+        offset = self.offset
+        pending = self.pending
+        pack = LENGTH.pack
+        encode = encode_record
+        try:
+            while pending:
+                record = pending.popleft()
+                # flush() queues an Event, set once everything before it is in the file
+                if isinstance(record, threading.Event):
+                    flushed.append(record)
+                    continue
+                data = encode(record)
+                if record[0] == KEYFRAME:
+                    entries.append(INDEX_ENTRY.pack(record[1], record[2], record[3], offset))
+                chunks.append(pack(len(data)))
+                chunks.append(data)
+                offset += LENGTH.size + len(data)
+        finally:
+            if chunks:
+                data = b''.join(chunks)
+                self.file.write(data)
+                self.file.flush()
+                if entries:
+                    self.index_file.write(b''.join(entries))
+                    self.index_file.flush()
+                self.offset = offset
+                self.records += len(chunks) // 2
+                self.bytes += len(data)
+                self.batches += 1
+            for event in flushed:
+                event.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            stopping = self.closed
+            try:
+                self._drain()
+            except Exception as exc:
+                # Keep running so writers are never stuck; the first error is raised by close()
+                self.error = self.error or exc
+            if stopping:
+                return
+
+    def flush(self, timeout=None):
+        """Wait until everything written so far is in the file."""
+        done = threading.Event()
+        with self._queue_lock:
+            closed = self.closed
+            if not closed:
+                self.pending.append(done)
+        if closed:
+            # close() writes out everything queued before it returns
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        self.wake.set()
+        return done.wait(timeout)
+
+    def close(self):
+        with self._queue_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self.file.close()
+        self.index_file.close()
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        return {"path": self.path, "games": self.games, "records": self.records, "bytes": self.bytes,
+                "batches": self.batches, "pending": len(self.pending)}
+
+
+class GameRecorder:
+    """Model event listener that turns one game into trace records.
+
+    Events are collected as they are raised and written as one STEP record
+    when the model calls ``step_done``, so a firefighter action and a fire
+    phase each become one record. With ``keyframes`` set, every step also
+    records the game state: a full KEYFRAME every ``keyframes`` steps and a
+    DELTA against the previous step in between, so ``replay.Replay`` can
+    rebuild the state at any step from the nearest keyframe.
+    """
+
+    def __init__(self, model, writer, game=None, meta=None, keyframes=0):
+        self.model = model
+        self.writer = writer
+        self.keyframes = keyframes
+        self.game = writer.new_game(dict(meta or {}, keyframes=keyframes), game)
+        self.events = []
+        self.turn = 0
+        self.index = None
+        self.keyframe_step = None
+        # The array-backed grid lists fire and smoke cells sorted by position
+        self.board_order = ('fires', 'smoke') if model.cells is not None else ()
+        self.finished = False
+        if keyframes:
+            self.write_state(model.steps)
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def step_done(self):
+        step = self.model.steps
+        self.write_step(step)
+        if self.keyframes:
+            self.write_state(step)
+        if self.model.game_over:
+            self.finish()
+
+    def write_step(self, step):
+        if self.events:
+            codes = EVENT_CODES
+            events = tuple((codes.get(event[0], event[0]),) + event[1:] for event in self.events)
+            self.turn += sum(1 for event in self.events if event[0] == 'fire_phase')
+            self.writer.write((STEP, self.game, step, events))
+            self.events = []
+
+    def write_state(self, step):
+        state = self.model.get_state()
+        index = index_state(state)
+        if self.index is None or step - self.keyframe_step >= self.keyframes:
+            self.writer.write((KEYFRAME, self.game, step, self.turn, state, self.board_order))
+            self.keyframe_step = step
+        else:
+            self.writer.write((DELTA, self.game, step, self.turn, diff_indexes(self.index, index)))
+        self.index = index
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.write_step(self.model.steps)
+        self.writer.write((END, self.game, self.model.steps, self.model._game_stats()))
+
+
+def trace_files(path):
+    """``path`` itself, or else the ``path.N`` files a batch run wrote, ordered by N."""
+    if os.path.exists(path):
+        return [path]
+    parts = [part for part in glob.glob(glob.escape(path) + '.*') if part.rsplit('.', 1)[1].isdigit()]
+    return sorted(parts, key=lambda part: int(part.rsplit('.', 1)[1]))
+
+
+def iter_records(f, offset=len(MAGIC)):
+    """``(offset, record)`` for the raw records of the open trace ``f``, from ``offset`` on.
+
+    A record cut short at the end of the file (the writer was killed mid-batch)
+    ends the iteration instead of raising; a malformed one raises ValueError.
+    """
+    f.seek(offset)
+    read = f.read
+    unpack = LENGTH.unpack
+    while True:
+        header = read(LENGTH.size)
+        if len(header) < LENGTH.size:
+            return
+        size, = unpack(header)
+        data = read(size)
+        if len(data) < size:
+            return
+        yield offset, decode_record(data)
+        offset += LENGTH.size + size
+
+
+def read_trace(path, game=None):
+    """Records of a trace file, one at a time, with event kinds decoded; with ``game``, only that game's."""
+    with open(path, 'rb') as f:
+        check_magic(f, path)
+        for _, record in iter_records(f):
+            if game is None or record[1] == game:
+                if record[0] == STEP:
+                    kinds = EVENT_KINDS
+                    events = tuple((kinds[event[0]] if type(event[0]) is int else event[0],) + event[1:]
+                                   for event in record[3])
+                    record = (STEP, record[1], record[2], events)
+                yield record
+
+
+def iter_events(path, game=None):
+    """``(game, step, event)`` for every recorded event, in file order."""
+    for record in read_trace(path, game):
+        if record[0] == STEP:
+            _, game_id, step, events = record
+            for event in events:
+                yield game_id, step, event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a game trace file, or the parts of a batch trace")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, default=None, help="print every record of this game")
+    args = parser.parse_args()
+    paths = trace_files(args.path)
+    if not paths:
+        parser.error(f"no trace at {args.path}")
+    if args.game is not None:
+        for path in paths:
+            for record in read_trace(path, args.game):
+                print(json.dumps(record))
+        return
+    games = ended = records = keyframes = 0
+    kinds = collections.Counter()
+    for record in (record for path in paths for record in read_trace(path)):
+        records += 1
+        if record[0] == GAME:
+            games += 1
+        elif record[0] == END:
+            ended += 1
+        elif record[0] == KEYFRAME:
+            keyframes += 1
+        elif record[0] == STEP:
+            kinds.update(event[0] for event in record[3])
+    print(json.dumps({"files": len(paths), "bytes": sum(os.path.getsize(path) for path in paths), "games": games,
+                      "ended": ended, "records": records, "keyframes": keyframes, "events": dict(kinds)},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
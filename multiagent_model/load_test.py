@@ -0,0 +1,77 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+from profiler import percentile
+
+
+def client_loop(host, port, path, method, deadline, latencies, errors):
+    # One connection per client for the whole run, like a keep-alive Unity poller
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request(method, path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(type(exc).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run_load_test(host='localhost', port=8585, path='/step', method='GET', clients=4,
+                  duration=10.0, num_agents=1):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request('POST', '/reset', body=json.dumps({"num_agents": num_agents}),
+                 headers={'Content-Type': 'application/json'})
+    conn.getresponse().read()
+    conn.close()
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client_loop,
+                                args=(host, port, path, method, deadline, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "path": path,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_sec": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed > 0 else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer the simulation server and report throughput and latency")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8585)
+    parser.add_argument("--path", default="/step")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--num-agents", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(run_load_test(args.host, args.port, args.path, args.method, args.clients,
+                                   args.duration, args.num_agents)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import math
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from board import NO_DOOR, DOOR_DESTROYED
+
+# Scratch models kept per thread, keyed by (model class, scenario, cell_grid, firefighters), reused by every
+# rollout; per thread because sessions running the mcts strategy can search at the same time
+_scratch = threading.local()
+
+
+def legal_actions(model, agent):
+    """Single actions ``agent`` could try right now, as ``(kind, pos)`` tuples.
+
+    The first one is always whatever the improved strategy would do, the
+    baseline the search has to beat.
+    """
+    actions = [('improved', None), ('end_turn', None)]
+    neighbours = model.grid.get_neighborhood(agent.pos, moore=False, include_center=False)
+    for pos in neighbours:
+        if model.is_valid_move(agent.pos, pos) and agent.action_points >= agent.get_movement_cost(pos):
+            actions.append(('move', pos))
+    for pos in [agent.pos] + list(neighbours):
+        if (pos in model.fires or pos in model.smoke) and not model.edges.blocks_fire(agent.pos, pos):
+            actions.append(('extinguish', pos))
+    for pos in neighbours:
+        if model.edges.door_code(agent.pos, pos) not in (NO_DOOR, DOOR_DESTROYED):
+            actions.append(('door', pos))
+    return actions
+
+
+def apply_action(agent, action):
+    kind, pos = action
+    if kind == 'move':
+        done = agent.move_action(pos)
+    elif kind == 'extinguish':
+        done = agent.extinguish_action(pos)
+    elif kind == 'door':
+        done = agent.open_close_door_action(pos)
+    elif kind == 'improved':
+        done = agent.improved_strategy_single_action()
+    else:
+        done = False
+    if not done or agent.action_points <= 0:
+        agent.end_turn()
+    return done
+
+
+def score(model):
+    """Rollout value: rescues and losses dominate; carried victims, progress towards exits and
+    targets, knockdowns, damage and fire break ties."""
+    if model.game_over:
+        return 100.0 if model.game_won else -100.0
+    x0, y0, x1, y1 = model.interior
+    targets = [agent.pos for agent in model.victims] + [poi.pos for poi in model.hidden_pois]
+    value = 10.0 * model.victims_rescued - 10.0 * model.victims_lost - model.damage_cubes - 0.2 * len(model.fires)
+    for agent in model.firefighters:
+        x, y = agent.pos
+        if agent.is_knocked_down:
+            value -= 3.0
+        if agent.is_carrying_victim:
+            to_exit = max(0, min(x - x0 + 1, x1 - x + 1, y - y0 + 1, y1 - y + 1))
+            value += 5.0 - 0.5 * to_exit
+        elif targets:
+            value -= 0.2 * min(abs(x - tx) + abs(y - ty) for tx, ty in targets)
+    return value
+
+
+def _scratch_model(model_class, snapshot):
+    models = getattr(_scratch, 'models', None)
+    if models is None:
+        models = _scratch.models = {}
+    key = (model_class, snapshot.scenario, snapshot.cell_grid, len(snapshot.firefighters))
+    scratch = models.get(key)
+    if scratch is None:
+        scratch = models[key] = model_class.from_snapshot(snapshot)
+    return scratch
+
+
+def rollout(scratch, snapshot, agent_id, action, seed, horizon):
+    """Play ``action`` from ``snapshot`` then ``horizon`` rounds of the improved strategy."""
+    scratch.restore(snapshot)
+    scratch.reseed(seed)
+    agent = None
+    for firefighter in scratch.firefighters:
+        firefighter.strategy = 'improved'
+        if firefighter.unique_id == agent_id:
+            agent = firefighter
+    apply_action(agent, action)
+    if agent.turn_completed:
+        scratch.advance_fire = True
+    fire_phases = 0
+    steps = 0
+    # horizon counts rounds: every firefighter takes a turn, each followed by a fire phase
+    fire_phases_left = horizon * len(scratch.firefighters)
+    while fire_phases < fire_phases_left and not scratch.game_over and steps < 200 * horizon:
+        if scratch.advance_fire:
+            fire_phases += 1
+        scratch.step()
+        steps += 1
+    return score(scratch)
+
+
+def search(model_class, snapshot, agent_id, actions, budget, seed, horizon, exploration):
+    """UCB1 over ``actions`` until ``budget`` seconds are spent; returns per-action visits and totals.
+
+    Rollout k of every action uses the same fire-dice seed, so actions are
+    compared on the same futures.
+    """
+    scratch = _scratch_model(model_class, snapshot)
+    visits = [0] * len(actions)
+    totals = [0.0] * len(actions)
+    deadline = time.perf_counter() + budget
+    played = 0
+    while True:
+        if played >= len(actions) and time.perf_counter() >= deadline:
+            break
+        if played < len(actions):
+            i = played
+        else:
+            log_n = math.log(played)
+            i = max(range(len(actions)),
+                    key=lambda j: totals[j] / visits[j] + exploration * math.sqrt(log_n / visits[j]))
+        totals[i] += rollout(scratch, snapshot, agent_id, actions[i], seed + visits[i], horizon)
+        visits[i] += 1
+        played += 1
+    return visits, totals
+
+
+class MCTSPlanner:
+    """Time-budgeted rollout search over one firefighter's next action.
+
+    Each decision forks the game into a scratch model, tries every legal action
+    followed by ``horizon`` turns of the improved strategy under different
+    fire-dice seeds. The improved strategy's own choice is kept unless another
+    action beats its mean score by ``margin``, so more budget can only move
+    play away from the greedy baseline when the rollouts agree. With
+    ``workers`` set, the root is searched in that many processes at once and
+    their statistics are merged.
+    """
+
+    def __init__(self, budget=0.05, horizon=1, exploration=20.0, margin=3.0, workers=0, seed=None):
+        self.budget = budget
+        self.horizon = horizon
+        self.exploration = exploration
+        self.margin = margin
+        self.workers = workers
+        self.random = random.Random(seed)
+        self.pool = None
+        self.decisions = 0
+        self.rollouts = 0
+        self.search_time = 0.0
+
+    def choose(self, agent):
+        model = agent.model
+        actions = legal_actions(model, agent)
+        snapshot = model.snapshot()
+        seed = self.random.getrandbits(32)
+        start = time.perf_counter()
+        args = (type(model), snapshot, agent.unique_id, actions, self.budget, seed, self.horizon,
+                self.exploration)
+        if self.workers:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            # Different seeds per worker so they explore different futures
+            futures = [self.pool.submit(search, *args[:5], seed + k * 7919, *args[6:])
+                       for k in range(self.workers)]
+            visits = [0] * len(actions)
+            totals = [0.0] * len(actions)
+            for future in futures:
+                worker_visits, worker_totals = future.result()
+                visits = [a + b for a, b in zip(visits, worker_visits)]
+                totals = [a + b for a, b in zip(totals, worker_totals)]
+        else:
+            visits, totals = search(*args)
+        self.search_time += time.perf_counter() - start
+        self.decisions += 1
+        self.rollouts += sum(visits)
+        means = [totals[i] / visits[i] if visits[i] else float('-inf') for i in range(len(actions))]
+        best = max(range(len(actions)), key=means.__getitem__)
+        if means[best] < means[0] + self.margin:
+            best = 0
+        return actions[best]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def stats(self):
+        return {
+            "decisions": self.decisions,
+            "rollouts": self.rollouts,
+            "search_sec": self.search_time,
+            "rollouts_per_sec": self.rollouts / self.search_time if self.search_time else None,
+            "rollouts_per_decision": self.rollouts / self.decisions if self.decisions else None
+        }
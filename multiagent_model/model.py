@@ -1,38 +1,75 @@
+import json
 import mesa
-import heapq
-import random
+import numpy as np
+from board import (NO_WALL, WALL_DESTROYED, NO_DOOR, DOOR_CLOSED, DOOR_OPEN, DOOR_DESTROYED,
+                   CellLayer, OccupancyGrid, SMOKE, FIRE, flashover_mask)
+from pathfinding import DistanceFieldService, find_path
+from scenario import load_scenario
+from mcts import MCTSPlanner, apply_action
+from rng import RandomStreams
+from profiler import Profiler
+from game_trace import GameRecorder
 class Wall:
+    __slots__ = ('unique_id',)
     def __init__(self, unique_id):
         self.unique_id = unique_id
 class Door:
+    __slots__ = ('unique_id', 'state', 'destroyed')
     def __init__(self, unique_id, state='closed'):
         self.unique_id = unique_id
         self.state = state
         self.destroyed = False
+# mesa.Agent has a __dict__, so the slots below only cover our own attributes
 class Victim(mesa.Agent):
+    __slots__ = ('is_revealed',)
     def __init__(self, unique_id, model, is_revealed=False):
         super().__init__(model)
         self.unique_id = unique_id
         self.is_revealed = is_revealed
 class POI(mesa.Agent):
+    __slots__ = ('content_type', 'is_revealed')
     def __init__(self, unique_id, model, content_type='unknown'):
-        super().__init__(model)
-        self.unique_id = unique_id
+        # Set before Agent.__init__ registers us, so the model's POI counters see the content
         self.content_type = content_type
         self.is_revealed = False
-class Fire:
-    def __init__(self, unique_id, pos):
+        super().__init__(model)
         self.unique_id = unique_id
-        self.pos = pos
-class Smoke:
+class CellMarker:
+    """Fire or smoke marker for one cell.
+
+    Markers carry nothing but their position, so ``at`` hands out one shared
+    instance per cell instead of allocating a new object every time fire or
+    smoke appears.
+    """
+    __slots__ = ('unique_id', 'pos')
+    prefix = 'marker'
+    _interned = {}
     def __init__(self, unique_id, pos):
         self.unique_id = unique_id
         self.pos = pos
+    @classmethod
+    def at(cls, pos):
+        marker = cls._interned.get(pos)
+        if marker is None:
+            marker = cls._interned[pos] = cls(f"{cls.prefix}_{pos[0]}_{pos[1]}", pos)
+        return marker
+class Fire(CellMarker):
+    __slots__ = ()
+    prefix = 'fire'
+    _interned = {}
+class Smoke(CellMarker):
+    __slots__ = ()
+    prefix = 'smoke'
+    _interned = {}
 class Sign:
+    __slots__ = ('unique_id', 'pos')
     def __init__(self, unique_id, pos):
         self.unique_id = unique_id
         self.pos = pos
 class FirefighterAgent(mesa.Agent):
+    __slots__ = ('action_points', 'saved_ap', 'is_carrying_victim', 'is_knocked_down', 'strategy',
+                 'turn_completed', 'last_positions', 'turns_carrying_victim', 'current_target',
+                 'target_commitment_turns', 'area_visit_count')
     def __init__(self, unique_id, model, strategy='random'):
         super().__init__(model)
         self.unique_id = unique_id
@@ -57,6 +94,8 @@ class FirefighterAgent(mesa.Agent):
             self.random_strategy_with_loop_avoidance()
         elif self.strategy == 'improved':
             self.improved_strategy_single_action()
+        elif self.strategy == 'mcts':
+            self.mcts_strategy_single_action()
         else:
             self.random_strategy_with_loop_avoidance()
 
@@ -64,20 +103,15 @@ class FirefighterAgent(mesa.Agent):
     def move_action(self, new_position):
         if self.model.manhattan_distance(self.pos, new_position) != 1:
             return False
-        door_between = None
-        move_tuple = tuple(sorted((self.pos, new_position)))
-        if move_tuple in self.model.walls:
-            if move_tuple not in self.model.wall_damage or self.model.wall_damage[move_tuple] < 2:
+        edges = self.model.edges
+        if edges.wall_blocks(self.pos, new_position):
+            return False
+        if edges.door_code(self.pos, new_position) == DOOR_CLOSED:
+            if self.action_points >= 2:
+                self.model.set_door_state(tuple(sorted((self.pos, new_position))), 'open')
+                self.action_points -= 1
+            else:
                 return False
-        if move_tuple in self.model.doors:
-            door_between = move_tuple
-            door_state = self.model.doors[door_between]['state']
-            if door_state == 'closed':
-                if self.action_points >= 2:
-                    self.model.doors[door_between]['state'] = 'open'
-                    self.action_points -= 1
-                else:
-                    return False
         has_fire = new_position in self.model.fires
         has_smoke = new_position in self.model.smoke
         base_cost = 2 if (has_fire or has_smoke) else 1
@@ -87,10 +121,8 @@ class FirefighterAgent(mesa.Agent):
         if self.action_points >= cost:
             if has_fire and self.is_carrying_victim:
                 return False
-            cell_contents = self.model.grid.get_cell_list_contents([new_position])
-            for obj in cell_contents:
-                if isinstance(obj, FirefighterAgent):
-                    return False
+            if self.model.grid.is_occupied(new_position):
+                return False
             self.last_positions.append(self.pos)
             if len(self.last_positions) > 4:
                 self.last_positions.pop(0)
@@ -106,8 +138,9 @@ class FirefighterAgent(mesa.Agent):
                     self.last_positions[-2] != self.last_positions[-1] and
                     new_position == self.last_positions[-2]):
                     return False
-            self.model.grid.move_agent(self, new_position)
+            self.model.move_firefighter(self, new_position)
             self.action_points -= cost
+            self.model.emit('move', self.unique_id, new_position)
             if len(self.last_positions) >= 2:
                 if new_position not in self.last_positions[-2:]:
                     self.last_positions = [self.pos]
@@ -134,36 +167,26 @@ class FirefighterAgent(mesa.Agent):
         if self.model.manhattan_distance(self.pos, target_pos) > 1:
             return False
         
-        # Check if there's a wall between the firefighter and the target
-        move_tuple = tuple(sorted((self.pos, target_pos)))
-        if move_tuple in self.model.walls:
-            if move_tuple not in self.model.wall_damage or self.model.wall_damage[move_tuple] < 2:
-                # Wall exists and is not destroyed, can't extinguish through it
-                return False
-        
-        # Check if there's a closed door between the firefighter and the target
-        if move_tuple in self.model.doors:
-            door_state = self.model.doors[move_tuple]['state']
-            if door_state == 'closed':
-                # Door is closed, can't extinguish through it
-                return False
+        # Can't extinguish through an intact wall or a closed door
+        if self.model.edges.blocks_fire(self.pos, target_pos):
+            return False
         
         if self.action_points >= 1:
             action_taken = False
             if target_pos in self.model.fires:
                 if self.action_points >= 2:
-                    del self.model.fires[target_pos]
+                    self.model.emit('extinguish', self.unique_id, target_pos)
+                    self.model.clear_hazard(target_pos)
                     self.action_points -= 2
                     action_taken = True
                 else:
-                    del self.model.fires[target_pos]
-                    smoke = Smoke(f"smoke_{self.model.smoke_counter}", target_pos)
-                    self.model.smoke[target_pos] = smoke
-                    self.model.smoke_counter += 1
+                    self.model.emit('extinguish', self.unique_id, target_pos)
+                    self.model.place_smoke(target_pos)
                     self.action_points -= 1
                     action_taken = True
             elif target_pos in self.model.smoke and not action_taken:
-                del self.model.smoke[target_pos]
+                self.model.emit('extinguish', self.unique_id, target_pos)
+                self.model.clear_hazard(target_pos)
                 self.action_points -= 1
                 action_taken = True
             return action_taken
@@ -177,10 +200,9 @@ class FirefighterAgent(mesa.Agent):
                     wall_key = wall
                     break
             if wall_key:
-                if wall_key not in self.model.wall_damage:
-                    self.model.wall_damage[wall_key] = 0
-                if self.model.wall_damage[wall_key] < 2:
-                    self.model.wall_damage[wall_key] += 1
+                if self.model.wall_damage.get(wall_key, 0) < 2:
+                    self.model.emit('chop', self.unique_id, wall_key)
+                    self.model.damage_wall(wall_key)
                     self.model.damage_cubes += 1
                     self.action_points -= 2
                     state_str = ['saludable', 'dañado', 'destruido'][self.model.wall_damage[wall_key]]
@@ -204,7 +226,8 @@ class FirefighterAgent(mesa.Agent):
                     new_state = 'closed'
                 else:
                     return False
-                self.model.doors[door_key]['state'] = new_state
+                self.model.emit('toggle_door', self.unique_id, door_key)
+                self.model.set_door_state(door_key, new_state)
                 self.action_points -= 1
                 return True
         return False
@@ -220,6 +243,7 @@ class FirefighterAgent(mesa.Agent):
                 self.is_carrying_victim = True
                 self.turns_carrying_victim = 0
                 self.action_points -= 2
+                self.model.emit('carry', self.unique_id, self.pos)
                 return True
         return False
     
@@ -227,7 +251,8 @@ class FirefighterAgent(mesa.Agent):
         cell_contents = self.model.grid.get_cell_list_contents([self.pos])
         pois_in_cell = [obj for obj in cell_contents if isinstance(obj, POI) and not obj.is_revealed]
         for poi in pois_in_cell:
-            poi.is_revealed = True
+            self.model.reveal_poi(poi)
+            self.model.emit('reveal', self.unique_id, poi.pos, poi.content_type)
             if poi.content_type == 'victim':
                 victim = Victim(f"revealed_victim_{poi.unique_id}", self.model, is_revealed=True)
                 self.model.grid.place_agent(victim, poi.pos)
@@ -241,14 +266,14 @@ class FirefighterAgent(mesa.Agent):
         self.carry_victim_action()
 
     def rescue_victim_at_exit(self):
-        x, y = self.pos
-        is_outside = (y == 0 or y == 9 or x == 0 or x == 7)
+        is_outside = not self.model.is_interior(self.pos)
         if self.is_carrying_victim and is_outside and self.action_points >= 1:
             self.is_carrying_victim = False
             self.turns_carrying_victim = 0
             self.area_visit_count = {}
             self.model.victims_rescued += 1
             self.action_points -= 1
+            self.model.emit('rescue', self.unique_id, self.pos)
             return True
         return False
     
@@ -269,25 +294,19 @@ class FirefighterAgent(mesa.Agent):
         for move in valid_moves:
             cost = self.get_movement_cost(move)
             if self.action_points >= cost:
-                if not self.would_create_loop(move):
-                    cell_contents = self.model.grid.get_cell_list_contents([move])
-                    has_firefighter = any(isinstance(obj, FirefighterAgent) for obj in cell_contents)
-                    if not has_firefighter:
-                        affordable_moves.append(move)
+                if not self.would_create_loop(move) and not self.model.grid.is_occupied(move):
+                    affordable_moves.append(move)
         if affordable_moves:
-            new_position = self.model.random.choice(affordable_moves)
+            new_position = self.model.streams.agent.choice(affordable_moves)
             if self.move_action(new_position):
                 return True
         fallback_moves = []
         for move in valid_moves:
             cost = self.get_movement_cost(move)
-            if self.action_points >= cost:
-                cell_contents = self.model.grid.get_cell_list_contents([move])
-                has_firefighter = any(isinstance(obj, FirefighterAgent) for obj in cell_contents)
-                if not has_firefighter:
-                    fallback_moves.append(move)
+            if self.action_points >= cost and not self.model.grid.is_occupied(move):
+                fallback_moves.append(move)
         if fallback_moves:
-            new_position = self.model.random.choice(fallback_moves)
+            new_position = self.model.streams.agent.choice(fallback_moves)
             if self.move_action(new_position):
                 return True
         if self.carry_victim_action():
@@ -339,20 +358,18 @@ class FirefighterAgent(mesa.Agent):
                 if pos in self.model.fires or pos in self.model.smoke:
                     if self.extinguish_action(pos):
                         return True
-            exits = [(0, y) for y in range(10)] + [(7, y) for y in range(10)] + \
-                    [(x, 0) for x in range(8)] + [(x, 9) for x in range(8)]
-            valid_exits = [pos for pos in exits if not self.model.grid.out_of_bounds(pos)]
-            valid_exits.sort(key=lambda e: self.model.manhattan_distance(self.pos, e))
-            for exit_pos in valid_exits[:6]:
-                path, _ = self.model.dijkstra(self.pos, exit_pos, self)
-                if path and len(path) > 1:
-                    next_pos = path[1]
-                    move_cost = self.get_movement_cost(next_pos)
-                    if self.action_points >= move_cost and self.move_action(next_pos):
-                        return True
+            fields = self.model.distance_fields
+            field = fields.exit_field(self.model.other_firefighter_positions(self))
+            steps = fields.ranked_steps(field, self.pos, self)
+            # Steps away from the nearest exit waste AP; take one only when nothing else is open
+            here = field.distance(self.pos)
+            closer = [pos for pos in steps if field.distance(pos) <= here]
+            for next_pos in closer or steps:
+                move_cost = self.get_movement_cost(next_pos)
+                if self.action_points >= move_cost and self.move_action(next_pos):
+                    return True
             for adj in self.model.grid.get_neighborhood(self.pos, moore=False, include_center=False):
-                door_between = tuple(sorted((self.pos, adj)))
-                if door_between in self.model.doors and self.model.doors[door_between]['state'] == 'closed':
+                if self.model.edges.door_code(self.pos, adj) == DOOR_CLOSED:
                     if self.open_close_door_action(adj):
                         return True
             self.turn_completed = True
@@ -366,21 +383,23 @@ class FirefighterAgent(mesa.Agent):
         for pos in self.model.grid.get_neighborhood(self.pos, moore=False, include_center=True):
             if self.extinguish_action(pos):
                 return True
-        victims = [a for a in self.model.agents if isinstance(a, Victim) and a.is_revealed and hasattr(a, 'pos') and a.pos is not None]
-        pois = [a for a in self.model.agents if isinstance(a, POI) and not a.is_revealed and hasattr(a, 'pos') and a.pos is not None]
+        victims = [a for a in self.model.victims if a.is_revealed and a.pos is not None]
+        pois = [a for a in self.model.hidden_pois if a.pos is not None]
         targets = victims if victims else pois
         if targets:
             targets.sort(key=lambda t: self.model.manhattan_distance(self.pos, t.pos))
             target = targets[0]
-            path, _ = self.model.dijkstra(self.pos, target.pos, self)
-            if path and len(path) > 1:
-                next_pos = path[1]
+            fields = self.model.distance_fields
+            # Like find_path, only leave the building on the way when one end is outside
+            interior_only = self.model.is_interior(self.pos) and self.model.is_interior(target.pos)
+            field = fields.field([target.pos], self.model.other_firefighter_positions(self), interior_only)
+            next_pos = fields.next_step(field, self.pos, self)
+            if next_pos is not None:
                 move_cost = self.get_movement_cost(next_pos)
                 if self.action_points >= move_cost and self.move_action(next_pos):
                     return True
             for adj in self.model.grid.get_neighborhood(self.pos, moore=False, include_center=False):
-                door_between = tuple(sorted((self.pos, adj)))
-                if door_between in self.model.doors and self.model.doors[door_between]['state'] == 'closed':
+                if self.model.edges.door_code(self.pos, adj) == DOOR_CLOSED:
                     if self.model.manhattan_distance(adj, target.pos) < self.model.manhattan_distance(self.pos, target.pos):
                         if self.open_close_door_action(adj):
                             return True
@@ -406,6 +425,14 @@ class FirefighterAgent(mesa.Agent):
         self.action_points = 0
         return False
     
+    def mcts_strategy_single_action(self):
+        if self.action_points <= 0:
+            self.turn_completed = True
+            return False
+        if self.rescue_victim_at_exit():
+            return True
+        return apply_action(self, self.model.planner.choose(self))
+
     def start_new_turn(self):
         self.action_points = 4
         self.saved_ap = 0
@@ -413,15 +440,66 @@ class FirefighterAgent(mesa.Agent):
         self.last_positions = []
         if not self.is_carrying_victim:
             self.turns_carrying_victim = 0
+# Firefighter attributes captured by FireRescueModel.snapshot, in tuple order after unique_id and pos
+FIREFIGHTER_STATE = ('action_points', 'saved_ap', 'is_carrying_victim', 'is_knocked_down', 'strategy',
+                     'turn_completed', 'last_positions', 'turns_carrying_victim', 'current_target',
+                     'target_commitment_turns', 'area_visit_count')
+# Model counters and flags captured by FireRescueModel.snapshot
+MODEL_STATE = ('advance_fire', 'victims_rescued', 'victims_lost', 'damage_cubes', 'total_victims_on_board',
+               'poi_placed', 'game_over', 'game_won', 'fire_counter', 'smoke_counter', 'poi_counter',
+               'victim_counter', 'false_alarms_revealed', 'steps')
+class ModelSnapshot:
+    """Immutable copy of everything that changes during a game.
+
+    Agents are stored as plain tuples, edges as read-only arrays and the RNG
+    streams as their state tuples; the static board (wall positions, signs,
+    scenario) is shared with the model it came from.
+    """
+    __slots__ = ('scenario', 'cell_grid', 'counters', 'fires', 'smoke', 'wall_damage', 'doors',
+                 'edge_wall', 'edge_door', 'firefighters', 'victims', 'pois', 'random_state', 'rng_state')
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelSnapshot is immutable")
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
 class FireRescueModel(mesa.Model):
-    def __init__(self, width=8, height=10, num_agents=1, strategy='improved'):
-        super().__init__()
+    def __init__(self, width=None, height=None, num_agents=1, strategy='improved', seed=None, cell_grid=False,
+                 scenario='final.txt', mcts_budget=0.05, mcts_workers=0, profile=False, trace=None):
+        # Fire dice, POI placement and firefighter choices each draw from their own stream,
+        # so changing how often one subsystem rolls never shifts the others
+        self.streams = RandomStreams(seed)
+        super().__init__(seed=self.streams.entropy)
+        self.random = self.streams.model
+        self.rng = np.random.default_rng(self.random.getrandbits(64))
+        # Set by enable_profiling; None keeps every phase on its untimed path
+        self.profiler = None
+        # Set by enable_tracing; the event listener streaming this game to a trace file
+        self.recorder = None
+        # Per-type agent indexes in registration order, kept up to date by register_agent,
+        # deregister_agent and reveal_poi so hot paths never scan self.agents
+        self.firefighters = {}
+        self.victims = {}
+        self.pois = {}
+        self.hidden_pois = {}
+        self.victims_in_pois = 0
+        self.false_alarms_in_pois = 0
+        self.false_alarms_revealed = 0
+        self.scenario_name = scenario
+        self.scenario = load_scenario(scenario)
+        width = width or self.scenario.width
+        height = height or self.scenario.height
+        if (width, height) != (self.scenario.width, self.scenario.height):
+            raise ValueError(f"scenario {scenario} is {self.scenario.width}x{self.scenario.height}, not {width}x{height}")
         self.width, self.height = width, height
-        self.grid = mesa.space.MultiGrid(width, height, torus=False)
-        self.building_width = 8
-        self.building_height = 10
-        self.interior_width = 6
-        self.interior_height = 8
+        self.grid = OccupancyGrid(width, height, False, FirefighterAgent)
+        self.interior = self.scenario.interior
+        self.fire_dice = self.scenario.dice
+        self.starting_positions = list(self.scenario.starts)
         num_agents = min(num_agents, 6)
         self.advance_fire = False
         self.victims_rescued = 0
@@ -438,237 +516,314 @@ class FireRescueModel(mesa.Model):
         self.walls = set()
         self.doors = {}
         self.wall_damage = {}
-        self.fires = {}
-        self.smoke = {}
+        # cell_grid keeps fire and smoke in one uint8 array so the fire phase can be vectorized;
+        # fires/smoke stay dict-like views over it either way
+        if cell_grid:
+            self.cells = np.zeros((width, height), dtype=np.uint8)
+            self.fires = CellLayer(self.cells, FIRE, Fire.at)
+            self.smoke = CellLayer(self.cells, SMOKE, Smoke.at)
+        else:
+            self.cells = None
+            self.fires = {}
+            self.smoke = {}
         self.signs = {}
         self.game_over = False
         self.game_won = False
+        self.terrain_version = 0
+        # Bumped when a wall is damaged or a door changes; keys the cached walls/doors JSON
+        self.edge_version = 0
+        # Pre-encoded get_state_json sections as section -> (version, bytes)
+        self.json_fragments = {}
+        # Callables handed every event tuple as it happens, e.g. to build an animation trace
+        self.event_listeners = []
         self.fire_counter = 0
         self.smoke_counter = 0
         self.sign_counter = 0
         self.poi_counter = 0
         self.victim_counter = 0
-        self._load_scenario_from_file("final.txt")
-        starting_positions = [(4, 0), (7, 6), (0, 3), (3, 9)]
+        self.edges = self.scenario.edges.copy()
+        self._load_scenario(self.scenario)
+        self.exit_positions = tuple((x, y) for x in range(width) for y in range(height)
+                                    if not self.is_interior((x, y)))
+        # Outer ring of the board, where an explosion throws firefighters
+        self.border_positions = ([(x, y) for x in range(width) for y in (0, height - 1)] +
+                                 [(x, y) for y in range(1, height - 1) for x in (0, width - 1)])
+        self.distance_fields = DistanceFieldService(self)
+        # Seconds of rollouts per firefighter action for strategy='mcts'
+        self.planner = (MCTSPlanner(mcts_budget, workers=mcts_workers, seed=self.streams.agent.getrandbits(32))
+                        if strategy == 'mcts' else None)
         for i in range(num_agents):
             agent = FirefighterAgent(f"firefighter_{i+1}", self, strategy)
-            spot = starting_positions[i % len(starting_positions)]
+            spot = self.starting_positions[i % len(self.starting_positions)]
             self.register_agent(agent)
             self.grid.place_agent(agent, spot)
-    def _load_scenario_from_file(self, filename):
-        self._create_perimeter_walls()
-        self._create_manual_interior_walls()
-        door_positions = [
-            (0, 3), (4, 0), (3, 9), (7,6)
-        ]
-        for x, y in door_positions:
-            self._create_door_at_position((x, y))
-        interior_doors = [
-            ((1, 5), (1, 6)),
-            ((1, 7), (1, 8)),
-            ((2, 4), (3, 4)),
-            ((3, 6), (3, 7)),
-            ((4, 8), (5, 8)),
-            ((5, 5), (5, 6)),
-            ((6, 3), (6, 4)),
-            ((4, 2), (4, 3))
-        ]
-        for wall_segment in interior_doors:
-            self._create_interior_door(wall_segment)
-        poi_positions = [
-            (2, 1),
-            (2, 8),
-            (5, 4)
-        ]
-        poi_types = ['false_alarm', 'victim', 'victim']
-        for i, pos in enumerate(poi_positions):
-            if 1 <= pos[0] <= 6 and 1 <= pos[1] <= 8:
-                content_type = poi_types[i]
-                poi = POI(f"poi_{self.poi_counter}", self, content_type)
-                self.grid.place_agent(poi, pos)
-                self.register_agent(poi)
-                self.poi_counter += 1
-                self.poi_placed += 1
-            else:
-                pass
-        fire_positions = [
-            (4, 2), (5, 2), (4,3), (5,3),
-            (3,4), (4,4), (4,5), (1,6), (2,6), (2,7)
-        ]
-        for pos in fire_positions:
-            if 1 <= pos[0] <= 6 and 1 <= pos[1] <= 8:
-                fire = Fire(f"fire_{self.fire_counter}", pos)
-                self.fires[pos] = fire
-                self.fire_counter += 1
-            else:
-                pass
-    def _create_perimeter_walls(self):
-        for i in range(self.building_width):
-            wall = tuple(sorted(((i, 0), (i, 1))))
-            if wall != ((0, 0), (1, 0)) and wall != ((0, 0), (0, 1)) and wall != ((6, 0), (7, 0)):
-                self.walls.add(wall)
-        for i in range(self.building_width):
-            wall = tuple(sorted(((i, 8), (i, 9))))
-            if wall != ((0, 8), (0, 9)) and wall != ((6, 8), (7, 9)):
-                self.walls.add(wall)
-        for j in range(self.building_height):
-            wall = tuple(sorted(((0, j), (1, j))))
-            if wall != ((0, 0), (1, 0)) and wall != ((0, 9), (1, 9)):
-                self.walls.add(wall)
-        for j in range(self.building_height):
-            wall = tuple(sorted(((6, j), (7, j))))
-            if wall != ((6, 0), (7, 0)):
-                self.walls.add(wall)
-        wall_to_remove1 = ((7, 0), (7, 1))
-        if wall_to_remove1 in self.walls:
-            self.walls.remove(wall_to_remove1)
-        wall_to_remove2 = ((7, 8), (7, 9))
-        if wall_to_remove2 in self.walls:
-            self.walls.remove(wall_to_remove2)
-        wall_to_remove3 = ((6, 9), (7, 9))
-        if wall_to_remove3 in self.walls:
-            self.walls.remove(wall_to_remove3)
-    def _create_manual_interior_walls(self):
-        """Create interior walls manually based on the board game layout.
-        NOTE: This method is kept for future reference when implementing interior doors.
-        The wall segments here can be used as a reference for where interior doors should be placed.
+        if profile:
+            self.enable_profiling()
+        if trace is not None:
+            self.enable_tracing(trace)
+    def enable_profiling(self, profiler=None):
+        """Time every phase and action from now on; pass a shared ``profiler`` to pool several games."""
+        if self.profiler is not None:
+            self.profiler.detach(self)
+        return (profiler or Profiler()).attach(self)
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach(self)
+    def trace_meta(self):
+        return {
+            "scenario": self.scenario_name,
+            "num_agents": len(self.firefighters),
+            "strategy": next(iter(self.firefighters)).strategy if self.firefighters else None,
+            "cell_grid": self.cells is not None,
+            "entropy": self.streams.entropy,
+            "spawn_key": tuple(getattr(self.streams.seed, 'spawn_key', ()))
+        }
+    def enable_tracing(self, writer, game=None, keyframes=0, **meta):
+        """Stream every event from now on to ``writer``, a ``game_trace.TraceWriter``; returns the game number.
+
+        With ``keyframes`` the game state is recorded too, in full every
+        ``keyframes`` steps and as deltas in between, for ``replay.Replay``.
         """
-        walls_created = 0
-        wall_segments = [
-            ((2,1),(3,1)), ((2,2),(3,2)), ((2,3),(3,3)), ((2,4),(3,4)), ((2,5),(3,5)), ((2,6),(3,6)), ((2,7),(3,7)), ((2,8),(3,8)),
-            ((4,3),(5,3)), ((4,4),(5,4)), ((4,5),(5,5)), ((4,6),(5,6)), ((4,7),(5,7)), ((4,8),(5,8)),
-            ((3,2),(3,3)), ((4,2), (4,3)),
-            ((5,3), (5,4)), ((6,3), (6,4)),
-            ((1,5),(1,6)),((2,5),(2,6)),
-            ((5,5),(5,6)),((6,5),(6,6)),
-            ((1,7),(1,8)),((2,7),(2,8)),
-            ((3,6),(3,7)),((4,6),(4,7)),
-        ]
-        for wall in wall_segments:
-            wall_tuple = tuple(sorted(wall))
-            self.walls.add(wall_tuple)
-            walls_created += 1
-    def _create_door_at_position(self, pos):
-        x, y = pos
-        wall_to_remove = None
-        if x == 0 and 0 <= y < self.building_height:
-            wall_to_remove = tuple(sorted(((0, y), (1, y))))
-        elif x == 7 and 0 <= y < self.building_height:
-            wall_to_remove = tuple(sorted(((6, y), (7, y))))
-        elif y == 0 and 0 <= x < self.building_width:
-            wall_to_remove = tuple(sorted(((x, 0), (x, 1))))
-        elif y == 9 and 0 <= x < self.building_width:
-            wall_to_remove = tuple(sorted(((x, 8), (x, 9))))
-        if wall_to_remove and wall_to_remove in self.walls:
-            self.walls.remove(wall_to_remove)
-            closed_doors = []
-            state = 'closed' if pos in closed_doors else 'open'
-            self.doors[wall_to_remove] = {'state': state}
-            sign = Sign(f"sign_{self.sign_counter}", pos)
-            self.signs[pos] = sign
+        self.disable_tracing()
+        self.recorder = GameRecorder(self, writer, game, dict(self.trace_meta(), **meta), keyframes)
+        self.event_listeners.append(self.recorder)
+        return self.recorder.game
+    def close(self):
+        """Shut down the MCTS planner's worker processes; a later search starts new ones."""
+        if self.planner is not None:
+            self.planner.close()
+    def disable_tracing(self):
+        """Stop recording; the trace gets the END record of this game if it has not ended yet."""
+        if self.recorder is not None:
+            self.recorder.finish()
+            self.event_listeners.remove(self.recorder)
+            self.recorder = None
+    def _load_scenario(self, scenario):
+        self.walls.update(scenario.walls)
+        self.doors.update((door, {'state': state}) for door, state in scenario.doors)
+        for pos in scenario.signs:
+            self.signs[pos] = Sign(f"sign_{self.sign_counter}", pos)
             self.sign_counter += 1
+        for pos, content_type in scenario.pois:
+            poi = POI(f"poi_{self.poi_counter}", self, content_type)
+            self.grid.place_agent(poi, pos)
+            self.register_agent(poi)
+            self.poi_counter += 1
+            self.poi_placed += 1
+        for pos in scenario.fires:
+            self.place_fire(pos)
+    def register_agent(self, agent):
+        # Agents register themselves in Agent.__init__ and the code registers them again
+        # after placing them, so this has to be idempotent
+        super().register_agent(agent)
+        if isinstance(agent, FirefighterAgent):
+            self.firefighters[agent] = None
+        elif isinstance(agent, Victim):
+            self.victims[agent] = None
+        elif isinstance(agent, POI) and agent not in self.pois:
+            self.pois[agent] = None
+            if not agent.is_revealed:
+                self.hidden_pois[agent] = None
+                if agent.content_type == 'false_alarm':
+                    self.false_alarms_in_pois += 1
+            if agent.content_type == 'victim':
+                self.victims_in_pois += 1
+    def deregister_agent(self, agent):
+        super().deregister_agent(agent)
+        if isinstance(agent, FirefighterAgent):
+            self.firefighters.pop(agent, None)
+        elif isinstance(agent, Victim):
+            self.victims.pop(agent, None)
+        elif isinstance(agent, POI) and agent in self.pois:
+            del self.pois[agent]
+            if not agent.is_revealed:
+                del self.hidden_pois[agent]
+                if agent.content_type == 'false_alarm':
+                    self.false_alarms_in_pois -= 1
+            if agent.content_type == 'victim':
+                self.victims_in_pois -= 1
+    def reveal_poi(self, poi):
+        if poi.is_revealed:
+            return
+        poi.is_revealed = True
+        self.hidden_pois.pop(poi, None)
+        if poi.content_type == 'false_alarm':
+            self.false_alarms_in_pois -= 1
+            self.false_alarms_revealed += 1
+    def damage_wall(self, wall):
+        damage = self.wall_damage.get(wall, 0) + 1
+        self.wall_damage[wall] = damage
+        self.edges.set_wall(wall[0], wall[1], damage)
+        self.edge_version += 1
+        self._terrain_changed()
+        self.emit('wall', wall, damage)
+        return damage
+    def set_door_state(self, door, state):
+        self.doors[door]['state'] = state
+        self.edges.set_door(door[0], door[1], state)
+        self.edge_version += 1
+        self._terrain_changed()
+        self.emit('door', door, state)
+    def place_fire(self, pos):
+        if self.cells is not None:
+            self.cells[pos] = FIRE
         else:
-            pass  # No action needed if wall doesn't exist or can't be removed
-            
-    def _create_interior_door(self, wall_segment):
-        wall_tuple = tuple(sorted(wall_segment))
-        if wall_tuple in self.walls:
-            self.walls.remove(wall_tuple)
-            state = 'closed'
-            self.doors[wall_tuple] = {'state': state}
-            sign_pos = wall_segment[0]
-            sign = Sign(f"sign_{self.sign_counter}", sign_pos)
-            self.signs[sign_pos] = sign
-            self.sign_counter += 1
-            return True
+            self.smoke.pop(pos, None)
+            self.fires[pos] = Fire.at(pos)
+        self.fire_counter += 1
+        self._terrain_changed()
+        self.emit('fire', pos)
+    def place_smoke(self, pos):
+        if self.cells is not None:
+            self.cells[pos] = SMOKE
         else:
-            return False
+            self.fires.pop(pos, None)
+            self.smoke[pos] = Smoke.at(pos)
+        self.smoke_counter += 1
+        self._terrain_changed()
+        self.emit('smoke', pos)
+    def clear_hazard(self, pos):
+        if self.cells is not None:
+            self.cells[pos] = 0
+        else:
+            self.fires.pop(pos, None)
+            self.smoke.pop(pos, None)
+        self._terrain_changed()
+        self.emit('clear', pos)
+    def _terrain_changed(self):
+        self.terrain_version += 1
+    def move_firefighter(self, agent, pos):
+        self.grid.move_agent(agent, pos)
+    def emit(self, kind, *data):
+        if self.event_listeners:
+            event = (kind,) + data
+            for listener in self.event_listeners:
+                listener(event)
+    def snapshot(self):
+        def frozen(array):
+            array = array.copy()
+            array.flags.writeable = False
+            return array
+        return ModelSnapshot(
+            scenario=self.scenario_name,
+            cell_grid=self.cells is not None,
+            counters=tuple(getattr(self, name) for name in MODEL_STATE),
+            fires=tuple(self.fires),
+            smoke=tuple(self.smoke),
+            wall_damage=tuple(self.wall_damage.items()),
+            doors=tuple((door, info['state']) for door, info in self.doors.items()),
+            edge_wall=frozen(self.edges.wall),
+            edge_door=frozen(self.edges.door),
+            firefighters=tuple(
+                (agent.unique_id, agent.pos, agent.action_points, agent.saved_ap, agent.is_carrying_victim,
+                 agent.is_knocked_down, agent.strategy, agent.turn_completed, tuple(agent.last_positions),
+                 agent.turns_carrying_victim, agent.current_target, agent.target_commitment_turns,
+                 tuple(agent.area_visit_count.items()))
+                for agent in self.firefighters),
+            victims=tuple((agent.unique_id, agent.pos, agent.is_revealed) for agent in self.victims),
+            pois=tuple((agent.unique_id, agent.pos, agent.content_type, agent.is_revealed) for agent in self.pois),
+            random_state=self.streams.getstate(),
+            rng_state=self.rng.bit_generator.state)
+    def restore(self, snapshot):
+        """Put the game back to ``snapshot``, which must come from a model on the same scenario."""
+        if snapshot.scenario != self.scenario_name or snapshot.cell_grid != (self.cells is not None):
+            raise ValueError("snapshot was taken on a different board")
+        if self.cells is not None:
+            self.cells[...] = 0
+            for pos in snapshot.smoke:
+                self.cells[pos] = SMOKE
+            for pos in snapshot.fires:
+                self.cells[pos] = FIRE
+        else:
+            self.fires.clear()
+            self.smoke.clear()
+            for pos in snapshot.fires:
+                self.fires[pos] = Fire.at(pos)
+            for pos in snapshot.smoke:
+                self.smoke[pos] = Smoke.at(pos)
+        self.wall_damage = dict(snapshot.wall_damage)
+        for door, state in snapshot.doors:
+            self.doors[door]['state'] = state
+        self.edges.wall[...] = snapshot.edge_wall
+        self.edges.door[...] = snapshot.edge_door
+        firefighters = {agent.unique_id: agent for agent in self.firefighters}
+        for unique_id, pos, *state in snapshot.firefighters:
+            agent = firefighters.pop(unique_id, None)
+            if agent is None:
+                agent = FirefighterAgent(unique_id, self)
+                self.register_agent(agent)
+                self.grid.place_agent(agent, pos)
+            elif agent.pos != pos:
+                self.grid.move_agent(agent, pos)
+            for name, value in zip(FIREFIGHTER_STATE, state):
+                setattr(agent, name, value)
+            agent.last_positions = list(agent.last_positions)
+            agent.area_visit_count = dict(agent.area_visit_count)
+        for agent in list(firefighters.values()) + list(self.victims) + list(self.pois):
+            self.grid.remove_agent(agent)
+            self.deregister_agent(agent)
+        for unique_id, pos, is_revealed in snapshot.victims:
+            victim = Victim(unique_id, self, is_revealed=is_revealed)
+            self.grid.place_agent(victim, pos)
+        for unique_id, pos, content_type, is_revealed in snapshot.pois:
+            poi = POI(unique_id, self, content_type)
+            self.grid.place_agent(poi, pos)
+            if is_revealed:
+                self.reveal_poi(poi)
+        # After the agents, so the counters reveal_poi touches end up as captured
+        for name, value in zip(MODEL_STATE, snapshot.counters):
+            setattr(self, name, value)
+        self.streams.setstate(snapshot.random_state)
+        self.rng.bit_generator.state = snapshot.rng_state
+        self.edge_version += 1
+        self._terrain_changed()
+    def reseed(self, seed):
+        """Restart every random stream from ``seed`` without touching the game."""
+        self.streams.reseed(seed)
+    def fork(self):
+        """Independent copy of this game, sharing nothing mutable with it."""
+        return self.from_snapshot(self.snapshot())
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        model = cls(num_agents=len(snapshot.firefighters), cell_grid=snapshot.cell_grid,
+                    scenario=snapshot.scenario)
+        model.restore(snapshot)
+        return model
+    def field_cache_stats(self):
+        return self.distance_fields.stats()
+    def other_firefighter_positions(self, firefighter):
+        return [a.pos for a in self.firefighters if a is not firefighter]
+    def is_interior(self, pos):
+        x0, y0, x1, y1 = self.interior
+        return x0 <= pos[0] <= x1 and y0 <= pos[1] <= y1
+    def has_other_firefighter(self, pos, firefighter=None):
+        return self.grid.is_occupied(pos, firefighter)
     def is_valid_move(self, pos1, pos2):
         if self.grid.out_of_bounds(pos2):
             return False
-        move_tuple = tuple(sorted((pos1, pos2)))
-        if move_tuple in self.walls:
-            if move_tuple in self.wall_damage and self.wall_damage[move_tuple] >= 2:
-                pass
-            else:
-                return False
-        if move_tuple in self.doors:
-            door_state = self.doors[move_tuple]['state']
-            if door_state == 'closed':
-                pass
-        cell_contents = self.grid.get_cell_list_contents([pos2])
-        for obj in cell_contents:
-            if isinstance(obj, FirefighterAgent):
-                return False
-        return True
+        if self.edges.wall_blocks(pos1, pos2):
+            return False
+        return not self.grid.is_occupied(pos2)
     def manhattan_distance(self, pos1, pos2):
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
     def dijkstra(self, start, end, firefighter=None):
-        pq = [(0, start, [])]
-        visited = set()
-        max_iterations = 500
-        iterations = 0
-        firefighter_positions = set()
-        for agent in self.agents:
-            if isinstance(agent, FirefighterAgent) and agent != firefighter:
-                firefighter_positions.add(agent.pos)
-        is_interior_position = lambda pos: 1 <= pos[0] <= 6 and 1 <= pos[1] <= 8
-        allow_outside_paths = not is_interior_position(start) or not is_interior_position(end)
-        while pq and iterations < max_iterations:
-            iterations += 1
-            (cost, current, path) = heapq.heappop(pq)
-            if current in visited:
-                continue
-            path = path + [current]
-            visited.add(current)
-            if current == end:
-                return path, cost
-            for neighbor in self.grid.get_neighborhood(current, moore=False, include_center=False):
-                if self.grid.out_of_bounds(neighbor):
-                    continue
-                if neighbor in firefighter_positions and neighbor != end:
-                    continue
-                if not allow_outside_paths and not is_interior_position(neighbor) and neighbor != end:
-                    continue
-                if neighbor not in visited and self.is_valid_move(current, neighbor):
-                    move_cost = 1
-                    move_tuple = tuple(sorted((current, neighbor)))
-                    if move_tuple in self.doors:
-                        door_state = self.doors[move_tuple]['state']
-                        if door_state == 'closed':
-                            move_cost += 3
-                    if neighbor in self.fires and firefighter and firefighter.is_carrying_victim:
-                        move_cost = 1000
-                    if neighbor in self.fires:
-                        move_cost = 10
-                    elif neighbor in self.smoke:
-                        move_cost = 3
-                    if not is_interior_position(neighbor) and neighbor != end:
-                        move_cost += 20
-                    if firefighter and hasattr(firefighter, 'last_positions') and len(firefighter.last_positions) >= 3:
-                        if neighbor in firefighter.last_positions[-3:]:
-                            move_cost += 5
-                    heapq.heappush(pq, (cost + move_cost, neighbor, path))
-        return None, float('inf')
+        return find_path(self, start, end, firefighter)
     def advance_fire_phase(self):
         if self.game_over:
             return
-        target_x = self.random.randint(1, 8)
-        target_y = self.random.randint(1, 6)
+        x_faces, y_faces = self.fire_dice
+        target_x = self.streams.fire.randint(self.interior[0], self.interior[0] + x_faces - 1)
+        target_y = self.streams.fire.randint(self.interior[1], self.interior[1] + y_faces - 1)
         target_pos = (target_x, target_y)
-        if not (1 <= target_pos[0] <= 6 and 1 <= target_pos[1] <= 8):
+        self.emit('fire_phase', target_pos)
+        if not self.is_interior(target_pos):
             return
         if target_pos in self.fires:
             self.handle_explosion(target_pos)
         elif target_pos in self.smoke:
-            del self.smoke[target_pos]
-            fire = Fire(f"fire_{self.fire_counter}", target_pos)
-            self.fires[target_pos] = fire
-            self.fire_counter += 1
+            self.place_fire(target_pos)
         else:
-            smoke = Smoke(f"smoke_{self.smoke_counter}", target_pos)
-            self.smoke[target_pos] = smoke
-            self.smoke_counter += 1
+            self.place_smoke(target_pos)
         self.convert_adjacent_smoke_to_fire()
         self.check_victims_in_fire()
         self.replenish_pois()
@@ -681,40 +836,29 @@ class FireRescueModel(mesa.Model):
             next_pos = (current_pos[0] + direction[0], current_pos[1] + direction[1])
             if self.grid.out_of_bounds(next_pos):
                 break
-            move_tuple = tuple(sorted((current_pos, next_pos)))
-            if move_tuple in self.walls:
-                if move_tuple not in self.wall_damage:
-                    self.wall_damage[move_tuple] = 0
-                if self.wall_damage[move_tuple] < 2:
-                    self.wall_damage[move_tuple] += 1
-                    self.damage_cubes += 1
-                    state_str = ['saludable', 'dañado', 'destruido'][self.wall_damage[move_tuple]]
-                    if self.wall_damage[move_tuple] == 2:
-                        pass  # Wall is destroyed, shockwave continues
-                    if self.wall_damage[move_tuple] < 2:
-                        break
-            if move_tuple in self.doors:
-                door_state = self.doors[move_tuple]['state']
-                if door_state == 'closed':
-                    self.doors[move_tuple]['state'] = 'destroyed'
+            wall_code = self.edges.wall_code(current_pos, next_pos)
+            if wall_code != NO_WALL and wall_code < WALL_DESTROYED:
+                self.damage_cubes += 1
+                if self.damage_wall(tuple(sorted((current_pos, next_pos)))) < 2:
                     break
-                elif door_state == 'open':
-                    self.doors[move_tuple]['state'] = 'destroyed'
+                # Wall is destroyed, shockwave continues
+            door_code = self.edges.door_code(current_pos, next_pos)
+            if door_code == DOOR_CLOSED:
+                self.set_door_state(tuple(sorted((current_pos, next_pos))), 'destroyed')
+                break
+            elif door_code == DOOR_OPEN:
+                self.set_door_state(tuple(sorted((current_pos, next_pos))), 'destroyed')
             if next_pos in self.smoke:
-                del self.smoke[next_pos]
-                fire = Fire(f"fire_{self.fire_counter}", next_pos)
-                self.fires[next_pos] = fire
-                self.fire_counter += 1
+                self.place_fire(next_pos)
                 break
             elif next_pos not in self.fires:
-                fire = Fire(f"fire_{self.fire_counter}", next_pos)
-                self.fires[next_pos] = fire
-                self.fire_counter += 1
+                self.place_fire(next_pos)
                 break
             else:
                 current_pos = next_pos
 
     def handle_explosion(self, pos):
+        self.emit('explosion', pos)
         directions = [(0, 1), (0, -1), (-1, 0), (1, 0)]
         explosion_count = 0
         damaged_walls_this_turn = set()
@@ -724,28 +868,22 @@ class FireRescueModel(mesa.Model):
                 next_pos = (current_pos[0] + dx, current_pos[1] + dy)
                 if self.grid.out_of_bounds(next_pos):
                     break
-                move_tuple = tuple(sorted((current_pos, next_pos)))
-                if move_tuple in self.walls and move_tuple not in damaged_walls_this_turn:
-                    if move_tuple not in self.wall_damage:
-                        self.wall_damage[move_tuple] = 0
-                    if self.wall_damage[move_tuple] < 2:
-                        self.wall_damage[move_tuple] += 1
+                wall_code = self.edges.wall_code(current_pos, next_pos)
+                door_code = self.edges.door_code(current_pos, next_pos)
+                if wall_code != NO_WALL or door_code != NO_DOOR:
+                    move_tuple = tuple(sorted((current_pos, next_pos)))
+                if wall_code != NO_WALL and move_tuple not in damaged_walls_this_turn:
+                    if wall_code < WALL_DESTROYED:
+                        self.damage_wall(move_tuple)
                         self.damage_cubes += 0.5
                         damaged_walls_this_turn.add(move_tuple)
-                        state_str = ['saludable', 'dañado', 'destruido'][self.wall_damage[move_tuple]]
-                        if self.wall_damage[move_tuple] == 2:
-                            pass  # Wall is destroyed, shockwave continues
                     else:
                         break
-                if move_tuple in self.doors:
-                    if self.doors[move_tuple]['state'] != 'destroyed':
-                        self.doors[move_tuple]['state'] = 'destroyed'
-                        break
+                if door_code != NO_DOOR and door_code != DOOR_DESTROYED:
+                    self.set_door_state(move_tuple, 'destroyed')
+                    break
                 if next_pos in self.smoke:
-                    del self.smoke[next_pos]
-                    fire = Fire(f"fire_{self.fire_counter}", next_pos)
-                    self.fires[next_pos] = fire
-                    self.fire_counter += 1
+                    self.place_fire(next_pos)
                     explosion_count += 1
                     if explosion_count >= 1:
                         break
@@ -754,13 +892,9 @@ class FireRescueModel(mesa.Model):
                     for agent in cell_contents:
                         if isinstance(agent, FirefighterAgent):
                             agent.is_knocked_down = True
-                            outside_positions = []
-                            for x in range(self.width):
-                                outside_positions.extend([(x, 0), (x, 9)])
-                            for y in range(1, 9):
-                                outside_positions.extend([(0, y), (7, y)])
-                            nearest_outside = min(outside_positions, key=lambda spot: self.manhattan_distance(next_pos, spot))
-                            self.grid.move_agent(agent, nearest_outside)
+                            nearest_outside = min(self.border_positions, key=lambda spot: self.manhattan_distance(next_pos, spot))
+                            self.move_firefighter(agent, nearest_outside)
+                            self.emit('knockdown', agent.unique_id, nearest_outside)
                             if agent.is_carrying_victim:
                                 agent.is_carrying_victim = False
                                 self.victims_lost += 1
@@ -772,69 +906,65 @@ class FireRescueModel(mesa.Model):
             break
 
     def convert_adjacent_smoke_to_fire(self):
-        def convert_adjacent_smoke_to_fire(self):
-            smokes_to_convert = []
-            for smoke_pos in list(self.smoke.keys()):
-                neighbors = self.grid.get_neighborhood(smoke_pos, moore=False, include_center=False)
-                for neighbor_pos in neighbors:
-                    if neighbor_pos in self.fires:
-                        move_tuple = tuple(sorted((smoke_pos, neighbor_pos)))
-                        blocked = False
-                        if move_tuple in self.walls:
-                            if move_tuple not in self.wall_damage or self.wall_damage[move_tuple] < 2:
-                                blocked = True
-                        if move_tuple in self.doors and self.doors[move_tuple]['state'] == 'closed':
-                            blocked = True
-                        if not blocked:
-                            smokes_to_convert.append(smoke_pos)
-                            break  # No need to check other neighbors for this smoke
-            for smoke_pos in smokes_to_convert:
-                if smoke_pos in self.smoke:
-                    del self.smoke[smoke_pos]
-                    if smoke_pos not in self.fires:
-                        fire = Fire(f"fire_{self.fire_counter}", smoke_pos)
-                        self.fires[smoke_pos] = fire
-                        self.fire_counter += 1
-                
+        if self.cells is not None:
+            converted = flashover_mask(self.cells, self.edges)
+            count = int(np.count_nonzero(converted))
+            if count:
+                self.cells[converted] = FIRE
+                self.fire_counter += count
+                self._terrain_changed()
+                if self.event_listeners:
+                    for x, y in zip(*np.nonzero(converted)):
+                        self.emit('fire', (int(x), int(y)))
+            return
+        smokes_to_convert = []
+        for smoke_pos in list(self.smoke.keys()):
+            neighbors = self.grid.get_neighborhood(smoke_pos, moore=False, include_center=False)
+            for neighbor_pos in neighbors:
+                if neighbor_pos in self.fires:
+                    if not self.edges.blocks_fire(smoke_pos, neighbor_pos):
+                        smokes_to_convert.append(smoke_pos)
+                        break  # No need to check other neighbors for this smoke
+        for smoke_pos in smokes_to_convert:
+            self.place_fire(smoke_pos)
+
     def check_victims_in_fire(self):
-        starting_positions = [(4, 0), (7, 6), (0, 3), (3, 9)]
-        victims_to_remove = []
-        pois_to_remove = []
-        for agent in self.agents:
-            if isinstance(agent, FirefighterAgent):
-                if agent.pos in self.fires:
-                    agent.is_knocked_down = True
-                    if agent.is_carrying_victim:
-                        agent.is_carrying_victim = False
-                        self.victims_lost += 1
-                    nearest_start = min(starting_positions, key=lambda spot: self.manhattan_distance(agent.pos, spot))
-                    self.grid.move_agent(agent, nearest_start)
-            elif isinstance(agent, Victim) and agent.is_revealed:
-                if agent.pos in self.fires:
-                    victims_to_remove.append(agent)
-            elif isinstance(agent, POI) and not agent.is_revealed:
-                if agent.pos in self.fires:
-                    pois_to_remove.append(agent)
-                    if agent.content_type == 'victim':
-                        self.victims_lost += 1
-                        self.total_victims_on_board -= 1
+        starting_positions = self.starting_positions
+        for agent in self.firefighters:
+            if agent.pos in self.fires:
+                agent.is_knocked_down = True
+                if agent.is_carrying_victim:
+                    agent.is_carrying_victim = False
+                    self.victims_lost += 1
+                nearest_start = min(starting_positions, key=lambda spot: self.manhattan_distance(agent.pos, spot))
+                self.move_firefighter(agent, nearest_start)
+                self.emit('knockdown', agent.unique_id, nearest_start)
+        victims_to_remove = [agent for agent in self.victims
+                             if agent.is_revealed and agent.pos in self.fires]
+        pois_to_remove = [agent for agent in self.hidden_pois if agent.pos in self.fires]
+        for agent in pois_to_remove:
+            if agent.content_type == 'victim':
+                self.victims_lost += 1
+                self.total_victims_on_board -= 1
         for victim in victims_to_remove:
+            self.emit('victim_lost', victim.pos)
             self.grid.remove_agent(victim)
             self.deregister_agent(victim)
             self.victims_lost += 1
             self.total_victims_on_board -= 1
         for poi in pois_to_remove:
+            self.emit('poi_lost', poi.pos, poi.content_type)
             self.grid.remove_agent(poi)
             self.deregister_agent(poi)
             self.poi_placed -= 1
 
     def replenish_pois(self):
-        current_pois = len([agent for agent in self.agents
-                           if isinstance(agent, POI) and not agent.is_revealed])
+        current_pois = len(self.hidden_pois)
         while current_pois < 3 and self.poi_placed < self.total_poi_markers:
             empty_positions = []
-            for x in range(1, 7):
-                for y in range(1, 9):
+            x0, y0, x1, y1 = self.interior
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
                     pos = (x, y)
                     cell_contents = self.grid.get_cell_list_contents([pos])
                     if (not cell_contents and
@@ -842,32 +972,22 @@ class FireRescueModel(mesa.Model):
                         pos not in self.smoke):
                         empty_positions.append(pos)
             if empty_positions:
-                red_die = self.random.randint(1, 6)
-                black_die = self.random.randint(1, 8)
+                red_die = self.streams.poi.randint(1, self.fire_dice[1])
+                black_die = self.streams.poi.randint(1, self.fire_dice[0])
                 target_x = black_die - 1
                 target_y = red_die - 1
                 pos = (target_x, target_y)
-                if not (1 <= pos[0] <= 6 and 1 <= pos[1] <= 8):
-                    pos = self.random.choice(empty_positions)
+                if not self.is_interior(pos):
+                    pos = self.streams.poi.choice(empty_positions)
                 elif pos not in empty_positions:
                     pos = min(empty_positions, key=lambda p: self.manhattan_distance(pos, p))
                 total_victims_revealed = (self.total_victims_on_board +
                                         self.victims_rescued + self.victims_lost)
-                victims_in_pois = len([agent for agent in self.agents
-                                     if isinstance(agent, POI) and agent.content_type == 'victim'])
-                total_victims_used = total_victims_revealed + victims_in_pois
-                false_alarms_revealed = len([agent for agent in self.agents
-                                           if isinstance(agent, POI) and
-                                           agent.content_type == 'false_alarm' and
-                                           agent.is_revealed])
-                false_alarms_in_pois = len([agent for agent in self.agents
-                                          if isinstance(agent, POI) and
-                                          agent.content_type == 'false_alarm' and
-                                          not agent.is_revealed])
-                total_false_alarms_used = false_alarms_revealed + false_alarms_in_pois
+                total_victims_used = total_victims_revealed + self.victims_in_pois
+                total_false_alarms_used = self.false_alarms_revealed + self.false_alarms_in_pois
                 victims_left = self.total_victims_available - total_victims_used
                 false_alarms_left = self.total_false_alarms_available - total_false_alarms_used
-                if victims_left > 0 and (false_alarms_left == 0 or self.random.random() < 0.67):
+                if victims_left > 0 and (false_alarms_left == 0 or self.streams.poi.random() < 0.67):
                     content_type = 'victim'
                 elif false_alarms_left > 0:
                     content_type = 'false_alarm'
@@ -879,6 +999,7 @@ class FireRescueModel(mesa.Model):
                 self.poi_counter += 1
                 self.poi_placed += 1
                 current_pois += 1
+                self.emit('poi', poi.unique_id, pos)
             else:
                 break
     def check_game_end(self):
@@ -900,9 +1021,14 @@ class FireRescueModel(mesa.Model):
         if self.advance_fire:
             self.advance_fire_phase()
             self.check_game_end()
+            if self.game_over:
+                self.emit('game_over', self.game_won)
+                self.close()
             self.advance_fire = False
+            if self.recorder is not None:
+                self.recorder.step_done()
             return
-        firefighters = [agent for agent in self.agents if isinstance(agent, FirefighterAgent)]
+        firefighters = list(self.firefighters)
         if not firefighters:
             return
         all_turns_completed = all(agent.turn_completed for agent in firefighters)
@@ -914,63 +1040,94 @@ class FireRescueModel(mesa.Model):
             if not agent.turn_completed:
                 current_firefighter = agent
                 break
-        action_taken = current_firefighter.step()
+        if self.profiler is None:
+            current_firefighter.step()
+        else:
+            self.profiler.time_action(current_firefighter)
         if current_firefighter.turn_completed:
+            self.emit('end_turn', current_firefighter.unique_id)
             self.advance_fire = True
-    def get_state(self):
-        state = {
-            "agents": [],
-            "victims": [],
-            "pois": [],
-            "fires": [],
-            "smoke": [],
-            "signs": [],
-            "walls": [
-                {
-                    "pos": [list(wall[0]), list(wall[1])],
-                    "state": self.wall_damage.get(wall, 0)
-                } for wall in self.walls
-            ],
-            "doors": [],
-            "game_stats": {
-                "victims_rescued": self.victims_rescued,
-                "victims_lost": self.victims_lost,
-                "damage_cubes": self.damage_cubes,
-                "game_over": self.game_over,
-                "game_won": self.game_won,
-                "win_condition": self.WIN_VICTIMS_NEEDED,
-                "lose_victims": self.LOSE_VICTIMS_LOST,
-                "max_damage": self.MAX_DAMAGE_CUBES
-            }
-        }
-        for agent in self.agents:
-            if isinstance(agent, FirefighterAgent):
-                state["agents"].append({
-                    "id": agent.unique_id,
-                    "pos": agent.pos,
-                    "carrying_victim": agent.is_carrying_victim,
-                    "action_points": agent.action_points,
-                    "saved_ap": agent.saved_ap,
-                    "turn_completed": agent.turn_completed
-                })
-            elif isinstance(agent, Victim):
-                state["victims"].append({
-                    "id": agent.unique_id,
-                    "pos": agent.pos,
-                    "is_revealed": agent.is_revealed
-                })
-            elif isinstance(agent, POI):
-                state["pois"].append({
-                    "id": agent.unique_id,
-                    "pos": agent.pos,
-                    "is_revealed": agent.is_revealed,
-                    "content_type": agent.content_type if agent.is_revealed else "unknown"
-                })
-        state["fires"] = list(self.fires.keys())
-        state["smoke"] = list(self.smoke.keys())
-        state["signs"] = list(self.signs.keys())
-        state["doors"] = [
+        if self.recorder is not None:
+            self.recorder.step_done()
+    def _agents_state(self):
+        return [{
+            "id": agent.unique_id,
+            "pos": agent.pos,
+            "carrying_victim": agent.is_carrying_victim,
+            "action_points": agent.action_points,
+            "saved_ap": agent.saved_ap,
+            "turn_completed": agent.turn_completed
+        } for agent in self.firefighters]
+    def _victims_state(self):
+        return [{
+            "id": agent.unique_id,
+            "pos": agent.pos,
+            "is_revealed": agent.is_revealed
+        } for agent in self.victims]
+    def _pois_state(self):
+        return [{
+            "id": agent.unique_id,
+            "pos": agent.pos,
+            "is_revealed": agent.is_revealed,
+            "content_type": agent.content_type if agent.is_revealed else "unknown"
+        } for agent in self.pois]
+    def _walls_state(self):
+        return [
+            {
+                "pos": [list(wall[0]), list(wall[1])],
+                "state": self.wall_damage.get(wall, 0)
+            } for wall in self.walls
+        ]
+    def _doors_state(self):
+        return [
             {"pos": list(door_pos), "state": info["state"]}
             for door_pos, info in self.doors.items()
         ]
-        return state
\ No newline at end of file
+    def _game_stats(self):
+        return {
+            "victims_rescued": self.victims_rescued,
+            "victims_lost": self.victims_lost,
+            "damage_cubes": self.damage_cubes,
+            "game_over": self.game_over,
+            "game_won": self.game_won,
+            "win_condition": self.WIN_VICTIMS_NEEDED,
+            "lose_victims": self.LOSE_VICTIMS_LOST,
+            "max_damage": self.MAX_DAMAGE_CUBES
+        }
+    def get_state(self):
+        return {
+            "agents": self._agents_state(),
+            "victims": self._victims_state(),
+            "pois": self._pois_state(),
+            "fires": list(self.fires.keys()),
+            "smoke": list(self.smoke.keys()),
+            "signs": list(self.signs.keys()),
+            "walls": self._walls_state(),
+            "doors": self._doors_state(),
+            "game_stats": self._game_stats()
+        }
+    def _fragment(self, section, version, build):
+        cached = self.json_fragments.get(section)
+        if cached is None or cached[0] != version:
+            cached = self.json_fragments[section] = (version, json.dumps(build()).encode('utf-8'))
+        return cached[1]
+    def get_state_json(self):
+        """``get_state()`` already encoded, byte for byte what ``json.dumps`` would give.
+
+        Walls and doors are re-encoded only after a wall is damaged or a door
+        changes, fire and smoke only after the terrain changes and signs never,
+        so a typical firefighter step only encodes agents, victims, POIs and
+        the game stats.
+        """
+        encode = json.dumps
+        return b''.join((
+            b'{"agents": ', encode(self._agents_state()).encode('utf-8'),
+            b', "victims": ', encode(self._victims_state()).encode('utf-8'),
+            b', "pois": ', encode(self._pois_state()).encode('utf-8'),
+            b', "fires": ', self._fragment('fires', self.terrain_version, lambda: list(self.fires.keys())),
+            b', "smoke": ', self._fragment('smoke', self.terrain_version, lambda: list(self.smoke.keys())),
+            b', "signs": ', self._fragment('signs', 0, lambda: list(self.signs.keys())),
+            b', "walls": ', self._fragment('walls', self.edge_version, self._walls_state),
+            b', "doors": ', self._fragment('doors', self.edge_version, self._doors_state),
+            b', "game_stats": ', encode(self._game_stats()).encode('utf-8'),
+            b'}'))
\ No newline at end of file
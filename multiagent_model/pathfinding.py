@@ -0,0 +1,269 @@
+import heapq
+from collections import OrderedDict
+from board import DIRECTIONS, WALL_INTACT, WALL_DESTROYED, DOOR_CLOSED
+
+
+class DistanceFieldService:
+    """Multi-source cost-to-go fields for firefighter planning.
+
+    A field maps each reachable cell to the cheapest cost of walking from it to
+    any of its goal cells, with the step costs of ``find_path`` (closed door +3,
+    fire 10, smoke 3, leaving the building +20), treating the ``blocked`` cells
+    (other firefighters) as impassable. With ``interior_only`` no path runs
+    through a cell outside the building, as ``find_path`` does when both ends
+    are inside. Fields are kept in a ``FieldCache`` per (goals, blocked,
+    interior_only) until the model's ``terrain_version`` changes, and an agent
+    picks its next step by looking at its four neighbours.
+
+    One cost differs from ``find_path``: a field is shared by every agent, so
+    the +5 for revisiting one of the agent's last three positions is added to
+    its next step only, not to later cells of the path. On fixed seeds 2-4% of
+    steps differ from ``find_path``'s, nearly all of them onto a path of the
+    same ``find_path`` cost (``test_pathfinding.py``).
+    """
+
+    def __init__(self, model, max_fields=32):
+        self.model = model
+        self.cache = FieldCache(max_fields)
+
+    def field(self, goals, blocked=(), interior_only=False):
+        key = (frozenset(goals), frozenset(blocked), interior_only)
+        version = self.model.terrain_version
+        field = self.cache.get(key, version)
+        if field is None:
+            field = self._compute(*key)
+            self.cache.put(key, version, field)
+        return field
+
+    def stats(self):
+        return self.cache.stats()
+
+    def exit_field(self, blocked=()):
+        return self.field(self.model.exit_positions, blocked)
+
+    def step_cost(self, pos, d, goals):
+        model = self.model
+        x, y = pos
+        dx, dy = DIRECTIONS[d]
+        neighbor = (x + dx, y + dy)
+        if neighbor in model.fires:
+            cost = 10
+        elif neighbor in model.smoke:
+            cost = 3
+        else:
+            cost = 1
+            if model.edges.door.item(x, y, d) == DOOR_CLOSED:
+                cost += 3
+        if not model.is_interior(neighbor) and neighbor not in goals:
+            cost += 20
+        return cost
+
+    def _compute(self, goals, blocked, interior_only=False):
+        model = self.model
+        walls = model.edges.wall
+        dist = {}
+        pq = [(0, goal) for goal in goals if not model.grid.out_of_bounds(goal)]
+        heapq.heapify(pq)
+        while pq:
+            cost, current = heapq.heappop(pq)
+            if current in dist:
+                continue
+            dist[current] = cost
+            # An outside cell can start a path but never be passed through
+            if interior_only and current not in goals and not model.is_interior(current):
+                continue
+            cx, cy = current
+            for d, (dx, dy) in enumerate(DIRECTIONS):
+                previous = (cx + dx, cy + dy)
+                if previous in dist or previous in blocked or model.grid.out_of_bounds(previous):
+                    continue
+                if WALL_INTACT <= walls.item(cx, cy, d) < WALL_DESTROYED:
+                    continue
+                # Cost of the step previous -> current, taken in the opposite direction
+                back = (d + 2) % 4
+                heapq.heappush(pq, (cost + self.step_cost(previous, back, goals), previous))
+        if model.profiler is not None:
+            model.profiler.count('distance_field_expansions', len(dist))
+        return FieldView(dist, goals, interior_only)
+
+    def ranked_steps(self, field, pos, firefighter=None):
+        """Neighbours of ``pos`` ordered by step cost plus remaining distance."""
+        if pos in field.goals:
+            return []
+        model = self.model
+        walls = model.edges.wall
+        recent = ()
+        if firefighter is not None and len(firefighter.last_positions) >= 3:
+            recent = firefighter.last_positions[-3:]
+        x, y = pos
+        candidates = []
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            neighbor = (x + dx, y + dy)
+            remaining = field.dist.get(neighbor)
+            if remaining is None or WALL_INTACT <= walls.item(x, y, d) < WALL_DESTROYED:
+                continue
+            if model.has_other_firefighter(neighbor, firefighter):
+                continue
+            if field.interior_only and neighbor not in field.goals and not model.is_interior(neighbor):
+                continue
+            total = self.step_cost(pos, d, field.goals) + remaining
+            if neighbor in recent:
+                total += 5
+            candidates.append((total, neighbor))
+        candidates.sort()
+        return [neighbor for _, neighbor in candidates]
+
+    def next_step(self, field, pos, firefighter=None):
+        steps = self.ranked_steps(field, pos, firefighter)
+        return steps[0] if steps else None
+
+
+class FieldView:
+    def __init__(self, dist, goals, interior_only=False):
+        self.dist = dist
+        self.goals = goals
+        self.interior_only = interior_only
+
+    def distance(self, pos):
+        return self.dist.get(pos, float('inf'))
+
+
+class FieldCache:
+    """Bounded LRU of distance fields, valid for a single ``terrain_version``.
+
+    Entries are dropped wholesale as soon as a lookup arrives with a newer
+    version, so a hit is always a field of the board as it is now.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+                self.entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        self._sync(version)
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, version, value):
+        self._sync(version)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "version": self.version
+        }
+
+
+def find_path(model, start, end, firefighter=None, heuristic=True):
+    """Cheapest path from ``start`` to ``end`` using the firefighter step costs.
+
+    Costs match the original planner: entering fire 10, smoke 3, otherwise 1
+    plus 3 through a closed door, +20 for stepping outside the building (unless
+    that cell is the goal) and +5 for revisiting one of the firefighter's last
+    three positions. Cells holding other firefighters are impassable and outside
+    cells are only used when ``start`` or ``end`` is outside. Every step costs at
+    least 1, so the Manhattan heuristic is admissible and consistent.
+
+    Returns ``(path, cost)`` with ``path`` running from ``start`` to ``end``, or
+    ``(None, inf)`` when ``end`` is unreachable.
+    """
+    walls = model.edges.wall
+    doors = model.edges.door
+    fires = model.fires
+    smoke = model.smoke
+    is_interior = model.is_interior
+    out_of_bounds = model.grid.out_of_bounds
+    occupancy = model.grid.occupancy
+    own = firefighter.pos if firefighter is not None else None
+    recent = ()
+    if firefighter is not None and len(firefighter.last_positions) >= 3:
+        recent = firefighter.last_positions[-3:]
+    allow_outside = not is_interior(start) or not is_interior(end)
+    ex, ey = end
+
+    best = {start: 0}
+    parent = {start: None}
+    closed = set()
+    h = abs(start[0] - ex) + abs(start[1] - ey) if heuristic else 0
+    pq = [(h, 0, start)]
+    while pq:
+        _, cost, current = heapq.heappop(pq)
+        if current in closed:
+            continue
+        if current == end:
+            if model.profiler is not None:
+                model.profiler.count('dijkstra_expansions', len(closed) + 1)
+            path = []
+            while current is not None:
+                path.append(current)
+                current = parent[current]
+            path.reverse()
+            return path, cost
+        closed.add(current)
+        cx, cy = current
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            neighbor = (cx + dx, cy + dy)
+            if neighbor in closed or out_of_bounds(neighbor):
+                continue
+            # Blocked by any firefighter except the one asking
+            if occupancy.item(neighbor) > (neighbor == own):
+                continue
+            interior = is_interior(neighbor)
+            if not allow_outside and not interior and neighbor != end:
+                continue
+            if WALL_INTACT <= walls.item(cx, cy, d) < WALL_DESTROYED:
+                continue
+            if neighbor in fires:
+                step = 10
+            elif neighbor in smoke:
+                step = 3
+            else:
+                step = 1
+                if doors.item(cx, cy, d) == DOOR_CLOSED:
+                    step += 3
+            if not interior and neighbor != end:
+                step += 20
+            if neighbor in recent:
+                step += 5
+            new_cost = cost + step
+            if new_cost < best.get(neighbor, float('inf')):
+                best[neighbor] = new_cost
+                parent[neighbor] = current
+                h = abs(neighbor[0] - ex) + abs(neighbor[1] - ey) if heuristic else 0
+                heapq.heappush(pq, (new_cost + h, new_cost, neighbor))
+    if model.profiler is not None:
+        model.profiler.count('dijkstra_expansions', len(closed))
+    return None, float('inf')
@@ -0,0 +1,143 @@
+import json
+import time
+from functools import wraps
+
+# Model methods timed while a profiler is attached, by the phase name they report under
+MODEL_PHASES = {
+    'step': 'step',
+    'advance_fire_phase': 'advance_fire_phase',
+    'handle_explosion': 'handle_explosion',
+    'check_victims_in_fire': 'check_victims_in_fire',
+    'replenish_pois': 'replenish_pois',
+    'dijkstra': 'dijkstra',
+    'get_state': 'get_state'
+}
+
+# Events a firefighter raises itself; the first one of a step names the action taken
+ACTION_EVENTS = frozenset(('move', 'extinguish', 'chop', 'toggle_door', 'carry', 'reveal', 'rescue'))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Profiler:
+    """Call counts and wall time per model phase and firefighter action, plus plain counters.
+
+    Nothing is timed until ``attach`` wraps a model's phase methods on the
+    instance, so an unprofiled model runs exactly the code it always did.
+    Totals cover every call; percentiles come from the last ``window`` calls of
+    each phase. One profiler can be attached to many models to pool a batch.
+    """
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.calls = {}
+        self.totals = {}
+        self.samples = {}
+        self.counters = {}
+        self.action = None
+
+    def record(self, name, seconds):
+        calls = self.calls.get(name, 0)
+        self.calls[name] = calls + 1
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = []
+        if len(samples) < self.window:
+            samples.append(seconds)
+        else:
+            samples[calls % self.window] = seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name, func):
+        record = self.record
+        perf_counter = time.perf_counter
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, perf_counter() - start)
+        return wrapper
+
+    def attach(self, model):
+        """Start timing ``model``; its unwrapped methods come back with ``detach``."""
+        for method, name in MODEL_PHASES.items():
+            setattr(model, method, self.timed(name, getattr(model, method)))
+        fields = model.distance_fields
+        fields._compute = self.timed('distance_field', fields._compute)
+        emit = model.emit
+        def noting_emit(kind, *data):
+            if self.action is None and kind in ACTION_EVENTS:
+                self.action = kind
+            emit(kind, *data)
+        model.emit = noting_emit
+        model.profiler = self
+        return self
+
+    def detach(self, model):
+        for method in list(MODEL_PHASES) + ['emit']:
+            model.__dict__.pop(method, None)
+        model.distance_fields.__dict__.pop('_compute', None)
+        # mesa installs step on the instance itself, so put its wrapper back
+        model.step = model._wrapped_step
+        model.profiler = None
+
+    def time_action(self, agent):
+        """Run one firefighter step, timed under ``action.<kind>`` of the first action event it raised."""
+        self.action = None
+        start = time.perf_counter()
+        agent.step()
+        seconds = time.perf_counter() - start
+        action = self.action or ('end_turn' if agent.turn_completed else 'none')
+        self.record(f"action.{action}", seconds)
+        self.record(f"strategy.{agent.strategy}", seconds)
+
+    def merge(self, other):
+        for name, calls in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+            self.totals[name] = self.totals.get(name, 0.0) + other.totals[name]
+            samples = self.samples.setdefault(name, [])
+            samples.extend(other.samples[name])
+            del samples[:-self.window]
+        for name, n in other.counters.items():
+            self.count(name, n)
+        return self
+
+    def reset(self):
+        self.calls.clear()
+        self.totals.clear()
+        self.samples.clear()
+        self.counters.clear()
+
+    def report(self):
+        phases = {}
+        for name in sorted(self.calls):
+            samples = sorted(self.samples[name])
+            calls = self.calls[name]
+            phases[name] = {
+                "calls": calls,
+                "total_ms": self.totals[name] * 1000,
+                "mean_us": self.totals[name] / calls * 1e6,
+                "p50_us": percentile(samples, 0.50) * 1e6,
+                "p90_us": percentile(samples, 0.90) * 1e6,
+                "p99_us": percentile(samples, 0.99) * 1e6,
+                "max_us": samples[-1] * 1e6
+            }
+        counters = dict(self.counters)
+        searches = self.calls.get('dijkstra')
+        if searches:
+            counters["dijkstra_expansions_per_search"] = counters.get('dijkstra_expansions', 0) / searches
+        return {"phases": phases, "counters": counters}
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,116 @@
+import json
+import threading
+from delta import diff_indexes
+
+# Seconds between keep-alive comments on an idle stream; proxies drop silent connections
+KEEPALIVE_INTERVAL = 15.0
+
+
+def encode_event(event, event_id, data):
+    """One Server-Sent Events message; ``data`` is sent as a single line of JSON."""
+    return f"event: {event}\nid: {event_id}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+class StateFeed:
+    """Pushes one session's state to any number of subscribers as the model advances.
+
+    ``publish`` is called under the session lock whenever a step or reset
+    changed the model; it only bumps a counter and wakes the subscribers, so
+    stepping costs the same with or without viewers. Each subscriber then asks
+    for the change from the last version it sent to the current one. Nothing
+    is queued per subscriber: a viewer that falls behind skips the versions it
+    missed and gets one delta covering all of them. Subscribers at the same
+    version share one encoded message.
+    """
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.condition = threading.Condition()
+        self.changes = 0
+        self.closed = False
+        self.subscribers = 0
+        self.sent = 0
+        self.coalesced = 0
+        self._changes = None
+        self._version = None
+        self._state = None
+        self._messages = {}
+
+    def publish(self):
+        with self.condition:
+            self.changes += 1
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """The change counter once it moves past ``seen`` (or after ``timeout`` seconds, unchanged)."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.changes != seen or self.closed, timeout)
+            return self.changes
+
+    def message(self, model, since):
+        """``(changes, version, event)`` taking a subscriber from tracker version ``since`` to now.
+
+        Must run under the session lock. ``event`` is None when nothing changed
+        since ``since``; a ``since`` the tracker no longer has gets the full state.
+        """
+        # Polling clients share the tracker, so the cached version may have left its history
+        if self._changes != self.changes or self._version not in self.deltas.indexes:
+            self._state = model.get_state()
+            self._version = self.deltas.record(self._state)
+            self._changes = self.changes
+            self._messages = {}
+        version = self._version
+        if since == version:
+            return self._changes, version, None
+        event = self._messages.get(since)
+        if event is None:
+            if since in self.deltas.indexes:
+                payload = {"version": version, "since": since, "full": False,
+                           "delta": diff_indexes(self.deltas.indexes[since], self.deltas.indexes[version])}
+            else:
+                payload = {"version": version, "full": True, "game_state": self._state}
+            event = self._messages[since] = encode_event('state', version, payload)
+        return self._changes, version, event
+
+    def stream(self, session, run, write, keepalive=KEEPALIVE_INTERVAL):
+        """Send ``session``'s state, then every change, through ``write`` until the feed closes.
+
+        ``run(session, action)`` runs ``action`` under the session lock
+        (``SessionManager.run``). Returns when the feed is closed; a failed
+        ``write`` raises, which is how a disconnected viewer ends its stream.
+        """
+        with self.condition:
+            self.subscribers += 1
+        try:
+            since = None
+            seen = None
+            while not self.closed:
+                if seen is not None:
+                    changes = self.wait(seen, keepalive)
+                    if changes == seen:
+                        write(b': keepalive\n\n')
+                        session.touch()
+                        continue
+                changes, version, event = run(session, lambda s: self.message(s.model, since))
+                if seen is not None and changes - seen > 1:
+                    with self.condition:
+                        self.coalesced += changes - seen - 1
+                seen = changes
+                if event is not None:
+                    write(event)
+                    since = version
+                    with self.condition:
+                        self.sent += 1
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    def stats(self):
+        return {"subscribers": self.subscribers, "changes": self.changes, "sent": self.sent,
+                "coalesced": self.coalesced}
+
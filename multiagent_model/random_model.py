@@ -1,38 +1,38 @@
 import mesa
-import heapq
-import random
+from board import OccupancyGrid
+from model import Fire, Smoke
+from rng import RandomStreams
 class Wall:
+    __slots__ = ('unique_id',)
     def __init__(self, unique_id):
         self.unique_id = unique_id
 class Door:
+    __slots__ = ('unique_id', 'state', 'destroyed')
     def __init__(self, unique_id, state='closed'):
         self.unique_id = unique_id
         self.state = state
         self.destroyed = False
 class Victim(mesa.Agent):
+    __slots__ = ('is_revealed',)
     def __init__(self, unique_id, model, is_revealed=False):
         super().__init__(model)
         self.unique_id = unique_id
         self.is_revealed = is_revealed
 class POI(mesa.Agent):
+    __slots__ = ('content_type', 'is_revealed')
     def __init__(self, unique_id, model, content_type='unknown'):
         super().__init__(model)
         self.unique_id = unique_id
         self.content_type = content_type
         self.is_revealed = False
-class Fire:
-    def __init__(self, unique_id, pos):
-        self.unique_id = unique_id
-        self.pos = pos
-class Smoke:
-    def __init__(self, unique_id, pos):
-        self.unique_id = unique_id
-        self.pos = pos
 class Sign:
+    __slots__ = ('unique_id', 'pos')
     def __init__(self, unique_id, pos):
         self.unique_id = unique_id
         self.pos = pos
 class RandomFirefighterAgent(mesa.Agent):
+    __slots__ = ('action_points', 'saved_ap', 'is_carrying_victim', 'is_knocked_down',
+                 'turn_completed', 'verbose')
     def __init__(self, unique_id, model):
         super().__init__(model)
         self.unique_id = unique_id
@@ -61,7 +61,7 @@ class RandomFirefighterAgent(mesa.Agent):
             self.random_chop_wall,
             self.end_turn_voluntarily
         ]
-        action = random.choice(actions)
+        action = self.model.streams.agent.choice(actions)
         action()
         if self.is_carrying_victim:
             self.rescue_victim_at_exit()
@@ -71,12 +71,10 @@ class RandomFirefighterAgent(mesa.Agent):
         possible_moves = self.model.grid.get_neighborhood(
             self.pos, moore=False, include_center=False)
         possible_moves = list(possible_moves)
-        random.shuffle(possible_moves)
+        self.model.streams.agent.shuffle(possible_moves)
         for move in possible_moves:
             if not self.model.grid.out_of_bounds(move):
-                cell_contents = self.model.grid.get_cell_list_contents([move])
-                has_firefighter = any(isinstance(obj, RandomFirefighterAgent) for obj in cell_contents)
-                if not has_firefighter:
+                if not self.model.grid.is_occupied(move):
                     move_tuple = tuple(sorted((self.pos, move)))
                     if move_tuple in self.model.walls:
                         if move_tuple in self.model.wall_damage and self.model.wall_damage[move_tuple] >= 2:
@@ -86,7 +84,7 @@ class RandomFirefighterAgent(mesa.Agent):
                     if move_tuple in self.model.doors:
                         door_state = self.model.doors[move_tuple]['state']
                         if door_state == 'closed':
-                            if random.random() < 0.5 and self.action_points >= 2:
+                            if self.model.streams.agent.random() < 0.5 and self.action_points >= 2:
                                 self.model.doors[move_tuple]['state'] = 'open'
                                 self.action_points -= 1
                             else:
@@ -113,7 +111,7 @@ class RandomFirefighterAgent(mesa.Agent):
         possible_targets = self.model.grid.get_neighborhood(
             self.pos, moore=False, include_center=True)
         possible_targets = list(possible_targets)
-        random.shuffle(possible_targets)
+        self.model.streams.agent.shuffle(possible_targets)
         for target_pos in possible_targets:
             # Check if there's a wall between the firefighter and the target
             if target_pos != self.pos:  # Skip check for current position
@@ -130,8 +128,7 @@ class RandomFirefighterAgent(mesa.Agent):
                     return True
                 elif self.action_points >= 1:
                     del self.model.fires[target_pos]
-                    smoke = Smoke(f"smoke_{self.model.smoke_counter}", target_pos)
-                    self.model.smoke[target_pos] = smoke
+                    self.model.smoke[target_pos] = Smoke.at(target_pos)
                     self.model.smoke_counter += 1
                     self.action_points -= 1
                     return True
@@ -159,7 +156,7 @@ class RandomFirefighterAgent(mesa.Agent):
         possible_drops = self.model.grid.get_neighborhood(
             self.pos, moore=False, include_center=False)
         possible_drops = list(possible_drops)
-        random.shuffle(possible_drops)
+        self.model.streams.agent.shuffle(possible_drops)
         for drop_pos in possible_drops:
             if not self.model.grid.out_of_bounds(drop_pos):
                 victim = Victim(f"dropped_victim_{self.model.victim_counter}", self.model, is_revealed=True)
@@ -179,7 +176,7 @@ class RandomFirefighterAgent(mesa.Agent):
             if self.pos in door_pos:
                 door_keys.append(door_pos)
         if door_keys:
-            door_key = random.choice(door_keys)
+            door_key = self.model.streams.agent.choice(door_keys)
             current_state = self.model.doors[door_key]['state']
             if current_state == 'closed':
                 new_state = 'open'
@@ -200,7 +197,7 @@ class RandomFirefighterAgent(mesa.Agent):
                 if self.model.manhattan_distance(self.pos, segment) == 1:
                     adjacent_walls.append(wall)
         if adjacent_walls:
-            wall_key = random.choice(adjacent_walls)
+            wall_key = self.model.streams.agent.choice(adjacent_walls)
             if wall_key not in self.model.wall_damage:
                 self.model.wall_damage[wall_key] = 0
             if self.model.wall_damage[wall_key] < 2:
@@ -212,7 +209,7 @@ class RandomFirefighterAgent(mesa.Agent):
         return False
     def end_turn_voluntarily(self):
         if not self.turn_completed and self.action_points > 0:
-            if random.random() < 0.2:
+            if self.model.streams.agent.random() < 0.2:
                 self.end_turn()
                 return True
         return False
@@ -249,8 +246,11 @@ class RandomFirefighterAgent(mesa.Agent):
             return True
         return False
 class RandomFireRescueModel(mesa.Model):
-    def __init__(self, num_agents=1, verbose=False):
-        super().__init__()
+    def __init__(self, num_agents=1, verbose=False, seed=None):
+        # Same per-subsystem streams as FireRescueModel
+        self.streams = RandomStreams(seed)
+        super().__init__(seed=self.streams.entropy)
+        self.random = self.streams.model
         self.num_agents = num_agents
         self.verbose = verbose
         self.building_width = 8
@@ -264,7 +264,7 @@ class RandomFireRescueModel(mesa.Model):
         self.wall_damage = {}
         self.damage_cubes = 0
         self.MAX_DAMAGE_CUBES = 24
-        self.grid = mesa.space.MultiGrid(self.building_width, self.building_height, True)
+        self.grid = OccupancyGrid(self.building_width, self.building_height, True, RandomFirefighterAgent)
         self.schedule = mesa.time.RandomActivation(self)
         self.all_agents = []
         self.victims_rescued = 0
@@ -391,7 +391,7 @@ class RandomFireRescueModel(mesa.Model):
                 self.signs[sign_pos] = sign
                 self.sign_counter += 1
     def _create_poi(self, pos):
-        content_type = random.choice(['victim', 'false_alarm'])
+        content_type = self.streams.poi.choice(['victim', 'false_alarm'])
         poi = POI(f"poi_{self.poi_counter}", self, content_type)
         self.grid.place_agent(poi, pos)
         self.register_agent(poi)
@@ -399,17 +399,15 @@ class RandomFireRescueModel(mesa.Model):
         self.total_poi += 1
     def _add_initial_fire_and_smoke(self):
         fire_pos = (4, 4)
-        fire = Fire(f"fire_{self.fire_counter}", fire_pos)
-        self.fires[fire_pos] = fire
+        self.fires[fire_pos] = Fire.at(fire_pos)
         self.fire_counter += 1
         smoke_pos = (3, 4)
-        smoke = Smoke(f"smoke_{self.smoke_counter}", smoke_pos)
-        self.smoke[smoke_pos] = smoke
+        self.smoke[smoke_pos] = Smoke.at(smoke_pos)
         self.smoke_counter += 1
     def _add_firefighters(self, num_agents):
         entry_points = [(0, 4), (3, 0), (7, 4), (3, 9)]
         for i in range(num_agents):
-            pos = random.choice(entry_points)
+            pos = self.streams.agent.choice(entry_points)
             agent = RandomFirefighterAgent(f"bombero_{self.agent_counter}", self)
             self.grid.place_agent(agent, pos)
             self.schedule.add(agent)
@@ -430,19 +428,17 @@ class RandomFireRescueModel(mesa.Model):
     def advance_fire_phase(self):
         if self.game_over:
             return
-        red_die = random.randint(1, 6)
-        black_die = random.randint(1, 8)
+        red_die = self.streams.fire.randint(1, 6)
+        black_die = self.streams.fire.randint(1, 8)
         target_pos = (black_die - 1, red_die - 1)
         if target_pos in self.fires:
             self.handle_explosion(target_pos)
         elif target_pos in self.smoke:
             del self.smoke[target_pos]
-            fire = Fire(f"fire_{self.fire_counter}", target_pos)
-            self.fires[target_pos] = fire
+            self.fires[target_pos] = Fire.at(target_pos)
             self.fire_counter += 1
         else:
-            smoke = Smoke(f"smoke_{self.smoke_counter}", target_pos)
-            self.smoke[target_pos] = smoke
+            self.smoke[target_pos] = Smoke.at(target_pos)
             self.smoke_counter += 1
     def handle_explosion(self, explosion_center):
         self.check_firefighter_damage(explosion_center)
@@ -471,8 +467,7 @@ class RandomFireRescueModel(mesa.Model):
                 if next_pos in self.smoke:
                     del self.smoke[next_pos]
                 if next_pos not in self.fires:
-                    fire = Fire(f"fire_{self.fire_counter}", next_pos)
-                    self.fires[next_pos] = fire
+                    self.fires[next_pos] = Fire.at(next_pos)
                     self.fire_counter += 1
                     self.check_firefighter_damage(next_pos)
                 current_pos = next_pos
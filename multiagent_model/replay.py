@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+from delta import apply_delta, index_state, state_from_index
+from game_trace import END, KEYFRAME, DELTA, INDEX_ENTRY, check_magic, iter_records
+
+# Layout of a <trace>.idx entry (game_trace.INDEX_ENTRY) as a numpy record
+INDEX_DTYPE = np.dtype([('game', '<u4'), ('step', '<u4'), ('turn', '<u4'), ('offset', '<u8')])
+assert INDEX_DTYPE.itemsize == INDEX_ENTRY.size
+
+
+def scan_index(path):
+    """Index entries of every KEYFRAME record, read from the trace itself when it has no .idx file."""
+    entries = []
+    with open(path, 'rb') as f:
+        check_magic(f, path)
+        for offset, record in iter_records(f):
+            if record[0] == KEYFRAME:
+                entries.append((record[1], record[2], record[3], offset))
+    return np.array(entries, dtype=INDEX_DTYPE)
+
+
+def load_index(path):
+    """Keyframe index of the trace at ``path``, sorted by game then step."""
+    if os.path.exists(path + '.idx'):
+        with open(path + '.idx', 'rb') as f:
+            data = f.read()
+        # A writer killed mid-write can leave half an entry at the end
+        index = np.frombuffer(data[:len(data) - len(data) % INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+    else:
+        index = scan_index(path)
+    return index[np.lexsort((index['step'], index['game']))]
+
+
+def game_state(index, board_order=()):
+    """The state an index was built from, with the ``board_order`` sections sorted as the model lists them."""
+    state = state_from_index(index)
+    for section in board_order:
+        state[section].sort()
+    return state
+
+
+class Replay:
+    """Game states of a trace recorded with keyframes, at any step or turn, without re-simulating.
+
+    A seek finds the nearest keyframe at or before the target with a binary
+    search of the index, then applies the deltas recorded after it, so it
+    reads at most one keyframe interval of the file. ``state_at`` returns
+    what ``model.get_state()`` gave at that point of the game as it reads
+    back from JSON (positions as lists), the form clients of /state get.
+    The index is reloaded when the trace grows, so a trace still being
+    written can be replayed up to its last flushed record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            check_magic(self.file, path)
+        except ValueError:
+            self.file.close()
+            raise
+        self.lock = threading.Lock()
+        self.index_mtime = None
+        self.index = None
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def refresh(self):
+        source = self.path + '.idx' if os.path.exists(self.path + '.idx') else self.path
+        mtime = os.stat(source).st_mtime_ns
+        if mtime != self.index_mtime:
+            self.index = load_index(self.path)
+            self.index_mtime = mtime
+
+    def games(self):
+        """Game numbers with at least one keyframe, in order."""
+        self.refresh()
+        return [int(game) for game in np.unique(self.index['game'])]
+
+    def _keyframes(self, game):
+        self.refresh()
+        games = self.index['game']
+        return self.index[np.searchsorted(games, game, 'left'):np.searchsorted(games, game, 'right')]
+
+    def _seek(self, game, step=None, turn=None):
+        """Offset of the last keyframe of ``game`` before the target, or its first keyframe."""
+        keyframes = self._keyframes(game)
+        if not len(keyframes):
+            raise KeyError(f"no keyframes for game {game} in {self.path}")
+        if step is not None:
+            i = np.searchsorted(keyframes['step'], step, 'right') - 1
+        elif turn is not None:
+            # The first state of a turn can follow the keyframe that ends the turn before it
+            i = np.searchsorted(keyframes['turn'], turn, 'left') - 1
+        else:
+            i = 0
+        return int(keyframes['offset'][max(i, 0)])
+
+    def _records(self, f, game, offset):
+        """The KEYFRAME and DELTA records of ``game`` from ``offset`` to its END."""
+        for _, record in iter_records(f, offset):
+            if record[1] != game:
+                continue
+            if record[0] == KEYFRAME or record[0] == DELTA:
+                yield record
+            elif record[0] == END:
+                return
+
+    def state_at(self, game, step=None, turn=None):
+        """``(step, turn, state)`` of ``game`` after model step ``step``, or at the start of turn ``turn``.
+
+        Turn ``n`` starts once ``n`` fire phases have run. A target past the end
+        of the recording gives its last state.
+        """
+        with self.lock:
+            index = None
+            for record in self._records(self.file, game, self._seek(game, step, turn)):
+                if step is not None and record[2] > step and index is not None:
+                    break
+                if record[0] == KEYFRAME:
+                    index = index_state(record[4])
+                    board_order = record[5]
+                else:
+                    apply_delta(index, record[4])
+                found = record
+                if turn is not None and record[3] >= turn:
+                    break
+            if index is None:
+                raise KeyError(f"no states for game {game} in {self.path}")
+            return found[2], found[3], game_state(index, board_order)
+
+    def states(self, game, start=0):
+        """``(step, turn, state)`` for every recorded step of ``game`` from step ``start`` on."""
+        with open(self.path, 'rb') as f:
+            for record in self._records(f, game, self._seek(game, start)):
+                if record[0] == KEYFRAME:
+                    index = index_state(record[4])
+                    board_order = record[5]
+                else:
+                    apply_delta(index, record[4])
+                if record[2] >= start:
+                    yield record[2], record[3], game_state(index, board_order)
+
+
+class ReplayLibrary:
+    """The traces of one directory, opened on first use and kept open, for the server's /replay routes."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.replays = {}
+        self.lock = threading.Lock()
+
+    def names(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if not name.endswith('.idx') and os.path.isfile(os.path.join(self.directory, name)))
+
+    def get(self, name):
+        """The Replay of trace ``name``, or None if there is no such trace (or it is not one)."""
+        if not name or name != os.path.basename(name) or name.endswith('.idx'):
+            return None
+        with self.lock:
+            replay = self.replays.get(name)
+            if replay is None:
+                path = os.path.join(self.directory, name)
+                if not os.path.isfile(path):
+                    return None
+                try:
+                    replay = self.replays[name] = Replay(path)
+                except ValueError:
+                    return None
+            return replay
+
+    def list(self):
+        traces = []
+        for name in self.names():
+            replay = self.get(name)
+            if replay is not None:
+                traces.append({"trace": name, "games": replay.games()})
+        return traces
+
+    def close(self):
+        with self.lock:
+            for replay in self.replays.values():
+                replay.close()
+            self.replays.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a recorded game state, or time replaying a trace")
+    parser.add_argument("path", help="trace recorded with keyframes (batch_runner --trace ... --keyframes N)")
+    parser.add_argument("--game", type=int, default=None, help="game number (default the first one)")
+    parser.add_argument("--step", type=int, default=None, help="state after this model step")
+    parser.add_argument("--turn", type=int, default=None, help="state at the start of this turn")
+    parser.add_argument("--bench", action="store_true", help="replay every game and report steps and seeks per second")
+    args = parser.parse_args()
+    with Replay(args.path) as replay:
+        games = replay.games()
+        if not games:
+            parser.error(f"{args.path} has no keyframes")
+        if args.bench:
+            start = time.perf_counter()
+            steps = sum(1 for game in games for _ in replay.states(game))
+            replay_sec = time.perf_counter() - start
+            targets = [(game, step) for game in games for step, _, _ in replay.states(game)][::97]
+            start = time.perf_counter()
+            for game, step in targets:
+                replay.state_at(game, step)
+            seek_sec = time.perf_counter() - start
+            print(json.dumps({"games": len(games), "steps": steps, "replay_sec": replay_sec,
+                              "steps_per_sec": steps / replay_sec if replay_sec > 0 else None,
+                              "seeks": len(targets), "seek_ms": 1000 * seek_sec / max(len(targets), 1)}, indent=2))
+            return
+        game = games[0] if args.game is None else args.game
+        step, turn, state = replay.state_at(game, args.step, args.turn)
+        print(json.dumps({"game": game, "step": step, "turn": turn, "game_state": state}))
+
+
+if __name__ == '__main__':
+    main()
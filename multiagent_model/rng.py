@@ -0,0 +1,56 @@
+import random
+import numpy as np
+
+# Independent random streams every model draws from; 'model' is mesa's own self.random
+STREAMS = ('model', 'fire', 'poi', 'agent')
+
+
+def seed_sequence(seed=None):
+    """``seed`` as a ``SeedSequence``; None draws fresh entropy from the OS."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def game_seed(base_seed, game):
+    """Seed of game number ``game`` of a batch, the same whichever process plays it."""
+    return np.random.SeedSequence(base_seed, spawn_key=(game,))
+
+
+def stream_seeds(seed, names=STREAMS):
+    """One integer seed per stream name, derived from ``seed`` so the streams never overlap."""
+    sequence = seed_sequence(seed)
+    # spawn() bumps the parent's child counter, so spawn from a copy to get the same children every time
+    parent = np.random.SeedSequence(sequence.entropy, spawn_key=sequence.spawn_key,
+                                    pool_size=sequence.pool_size)
+    return {name: int(child.generate_state(1, np.uint64)[0]) for name, child in zip(names, parent.spawn(len(names)))}
+
+
+class RandomStreams:
+    """A ``random.Random`` per subsystem, all derived from one seed.
+
+    ``seed`` is whatever the streams were built from: an int, a
+    ``SeedSequence`` (e.g. from ``game_seed``) or None, in which case the OS
+    entropy that was used is kept in ``entropy`` so the game can be replayed.
+    """
+
+    def __init__(self, seed=None, names=STREAMS):
+        self.names = names
+        for name in names:
+            setattr(self, name, random.Random())
+        self.reseed(seed)
+
+    def reseed(self, seed):
+        """Restart every stream from ``seed``."""
+        sequence = seed_sequence(seed)
+        self.seed = seed
+        self.entropy = sequence.entropy
+        for name, value in stream_seeds(sequence, self.names).items():
+            getattr(self, name).seed(value)
+
+    def getstate(self):
+        return tuple(getattr(self, name).getstate() for name in self.names)
+
+    def setstate(self, state):
+        for name, value in zip(self.names, state):
+            getattr(self, name).setstate(value)
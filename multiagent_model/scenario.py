@@ -0,0 +1,268 @@
+import argparse
+import os
+import numpy as np
+from board import EdgeTable, DOOR_CODES
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios')
+DOOR_STATES = {code: state for state, code in DOOR_CODES.items()}
+POI_TYPES = ('false_alarm', 'victim')
+# Compiled scenarios are directories of .npy files next to their text file, final.txt -> final.board
+COMPILED_SUFFIX = '.board'
+
+# Parsed scenarios by absolute path, with the mtime they were read at
+_cache = {}
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+class Scenario:
+    """A board layout ready to be dropped into a model.
+
+    Walls and doors are the final edge lists (perimeter generated, door
+    openings already removed from the walls), kept in the order they were
+    declared. ``edges`` is a prebuilt ``EdgeTable`` that models copy rather than
+    rebuild. Scenarios are shared between models and must not be mutated.
+    """
+
+    def __init__(self, width, height, interior, dice, walls, doors, signs, pois, fires, starts,
+                 edges=None, name=None):
+        self.width = width
+        self.height = height
+        self.interior = interior
+        self.dice = dice
+        self.walls = walls
+        self.doors = doors
+        self.signs = signs
+        self.pois = pois
+        self.fires = fires
+        self.starts = starts
+        self.name = name
+        if edges is None:
+            edges = EdgeTable.from_board(width, height, walls, {},
+                                         {door: {'state': state} for door, state in doors})
+        self.edges = edges
+
+    def is_interior(self, pos):
+        x0, y0, x1, y1 = self.interior
+        return x0 <= pos[0] <= x1 and y0 <= pos[1] <= y1
+
+    @classmethod
+    def parse(cls, text, name='<scenario>'):
+        """Build a scenario from the text format described in ``scenarios/final.txt``."""
+        width = height = interior = None
+        dice = None
+        walls = {}
+        doors = {}
+        signs = []
+        pois = []
+        fires = []
+        starts = []
+        for lineno, raw in enumerate(text.splitlines(), 1):
+            line = raw.split('#', 1)[0].split()
+            if not line:
+                continue
+            keyword, args = line[0], line[1:]
+
+            def fail(message):
+                raise ScenarioError(f"{name}:{lineno}: {message}")
+
+            def ints(count):
+                if len(args) < count:
+                    fail(f"'{keyword}' needs {count} numbers")
+                try:
+                    return [int(value) for value in args[:count]]
+                except ValueError:
+                    fail(f"'{keyword}' needs {count} numbers")
+
+            def cell(pos):
+                if not (0 <= pos[0] < width and 0 <= pos[1] < height):
+                    fail(f"{pos} is off the {width}x{height} board")
+                return pos
+
+            def edge(x1, y1, x2, y2):
+                if abs(x1 - x2) + abs(y1 - y2) != 1:
+                    fail(f"({x1}, {y1}) and ({x2}, {y2}) are not adjacent")
+                return tuple(sorted((cell((x1, y1)), cell((x2, y2)))))
+
+            if keyword != 'size' and width is None:
+                fail("'size' must come first")
+            if keyword == 'size':
+                width, height = ints(2)
+                interior = (1, 1, width - 2, height - 2)
+            elif keyword == 'interior':
+                interior = tuple(ints(4))
+            elif keyword == 'dice':
+                dice = tuple(ints(2))
+            elif keyword == 'perimeter':
+                x0, y0, x1, y1 = interior
+                for x in range(x0, x1 + 1):
+                    walls[edge(x, y0 - 1, x, y0)] = None
+                for x in range(x0, x1 + 1):
+                    walls[edge(x, y1, x, y1 + 1)] = None
+                for y in range(y0, y1 + 1):
+                    walls[edge(x0 - 1, y, x0, y)] = None
+                for y in range(y0, y1 + 1):
+                    walls[edge(x1, y, x1 + 1, y)] = None
+            elif keyword == 'wall':
+                walls[edge(*ints(4))] = None
+            elif keyword in ('door', 'entrance'):
+                if keyword == 'door':
+                    x1, y1, x2, y2 = ints(4)
+                    wall = edge(x1, y1, x2, y2)
+                    sign = (x1, y1)
+                    state = args[4] if len(args) > 4 else 'closed'
+                else:
+                    x, y = cell(tuple(ints(2)))
+                    x0, y0, x1, y1 = interior
+                    inner = (min(max(x, x0), x1), min(max(y, y0), y1))
+                    if abs(inner[0] - x) + abs(inner[1] - y) != 1:
+                        fail(f"entrance ({x}, {y}) does not touch the interior")
+                    wall = edge(x, y, *inner)
+                    sign = (x, y)
+                    state = args[2] if len(args) > 2 else 'open'
+                if state not in DOOR_CODES:
+                    fail(f"unknown door state '{state}'")
+                if wall not in walls:
+                    fail(f"no wall at {wall} to put a door in")
+                del walls[wall]
+                doors[wall] = state
+                signs.append(sign)
+            elif keyword == 'poi':
+                pos = tuple(ints(2))
+                content = args[2] if len(args) > 2 else None
+                if content not in POI_TYPES:
+                    fail(f"POI type must be one of {', '.join(POI_TYPES)}")
+                pois.append((pos, content))
+            elif keyword == 'fire':
+                fires.append(tuple(ints(2)))
+            elif keyword == 'start':
+                starts.append(cell(tuple(ints(2))))
+            else:
+                fail(f"unknown keyword '{keyword}'")
+        if width is None:
+            raise ScenarioError(f"{name}: empty scenario")
+        scenario = cls(width, height, interior, None, list(walls), list(doors.items()), signs,
+                       pois, fires, starts, name=name)
+        for pos in [pos for pos, _ in pois] + fires:
+            if not scenario.is_interior(pos):
+                raise ScenarioError(f"{name}: {pos} is not inside the building")
+        if not starts:
+            raise ScenarioError(f"{name}: at least one 'start' cell is needed")
+        x0, y0, x1, y1 = interior
+        scenario.dice = dice or (x1 - x0 + 1, y1 - y0 + 1)
+        return scenario
+
+    def save(self, path):
+        """Write the compiled form: a directory holding one ``.npy`` file per array, edge table included.
+
+        ``size.npy`` is written last and marks the directory as complete.
+        """
+        def cells(positions):
+            return np.array(positions, dtype=np.int16).reshape(-1, 2)
+        def edges(pairs):
+            return np.array([a + b for a, b in pairs], dtype=np.int16).reshape(-1, 4)
+        arrays = {
+            'interior': np.array(self.interior, dtype=np.int16),
+            'dice': np.array(self.dice, dtype=np.int16),
+            'walls': edges(self.walls),
+            'doors': edges([door for door, _ in self.doors]),
+            'door_states': np.array([DOOR_CODES[state] for _, state in self.doors], dtype=np.int8),
+            'signs': cells(self.signs),
+            'pois': cells([pos for pos, _ in self.pois]),
+            'poi_types': np.array([POI_TYPES.index(t) for _, t in self.pois], dtype=np.int8),
+            'fires': cells(self.fires),
+            'starts': cells(self.starts),
+            'edge_wall': self.edges.wall,
+            'edge_door': self.edges.door,
+            'size': np.array([self.width, self.height], dtype=np.int16)
+        }
+        os.makedirs(path, exist_ok=True)
+        for key, array in arrays.items():
+            np.save(os.path.join(path, key + '.npy'), array)
+
+    @classmethod
+    def load_compiled(cls, path):
+        """Load a directory written by ``save``; the arrays are memory-mapped, not read into memory.
+
+        The scenario's edge table keeps the read-only mappings, so every model
+        on the board copies its own edges from the same pages.
+        """
+        def array(key):
+            return np.load(os.path.join(path, key + '.npy'), mmap_mode='r')
+        def cells(key):
+            return [(int(x), int(y)) for x, y in array(key).tolist()]
+        def edges(key):
+            return [((a, b), (c, d)) for a, b, c, d in array(key).tolist()]
+        width, height = array('size').tolist()
+        states = [DOOR_STATES[code] for code in array('door_states').tolist()]
+        return cls(width, height, tuple(array('interior').tolist()), tuple(array('dice').tolist()),
+                   edges('walls'), list(zip(edges('doors'), states)), cells('signs'),
+                   list(zip(cells('pois'), [POI_TYPES[t] for t in array('poi_types').tolist()])),
+                   cells('fires'), cells('starts'),
+                   EdgeTable.from_arrays(array('edge_wall'), array('edge_door'), copy=False), name=path)
+
+
+def compiled_path(path):
+    """Where ``scenario.py`` puts the compiled form of the text scenario at ``path``."""
+    return os.path.splitext(path)[0] + COMPILED_SUFFIX
+
+
+def _compiled_mtime(path):
+    # The marker written last, so a half-written directory never counts as compiled
+    try:
+        return os.path.getmtime(os.path.join(path, 'size.npy'))
+    except OSError:
+        return None
+
+
+def scenario_path(name):
+    if os.path.exists(name):
+        return os.path.abspath(name)
+    return os.path.join(SCENARIO_DIR, name)
+
+
+def load_scenario(name):
+    """Scenario by file name, from the in-process cache when the file has not changed.
+
+    ``name`` may be a path or a file in ``scenarios/``. A text scenario with an
+    up-to-date compiled ``.board`` directory next to it is read from the compiled form.
+    """
+    path = scenario_path(name)
+    is_compiled = path.rstrip(os.sep).endswith(COMPILED_SUFFIX)
+    mtime = _compiled_mtime(path) if is_compiled else (os.path.getmtime(path) if os.path.isfile(path) else None)
+    if mtime is None:
+        raise ScenarioError(f"scenario not found: {name}")
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    compiled = compiled_path(path)
+    compiled_mtime = None if is_compiled else _compiled_mtime(compiled)
+    if is_compiled:
+        scenario = Scenario.load_compiled(path)
+    elif compiled_mtime is not None and compiled_mtime >= mtime:
+        scenario = Scenario.load_compiled(compiled)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            scenario = Scenario.parse(f.read(), name=path)
+    _cache[path] = (mtime, scenario)
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile text scenarios to directories of memory-mappable .npy arrays")
+    parser.add_argument("scenarios", nargs='+', help="text scenario files")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        path = scenario_path(name)
+        with open(path, 'r', encoding='utf-8') as f:
+            scenario = Scenario.parse(f.read(), name=path)
+        target = compiled_path(path)
+        scenario.save(target)
+        print(f"{path} -> {target} ({scenario.width}x{scenario.height}, {len(scenario.walls)} walls, "
+              f"{len(scenario.doors)} doors)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import collections
+import threading
+import time
+from profiler import percentile
+
+# Steps an autoplay runs at most, like batch_runner's max_steps
+MAX_STEPS = 20000
+# Steps without any change to the game stats after which autoplay gives up on the game; progressing games
+# change them every few hundred steps, a game whose firefighters are stuck never again
+STALL_STEPS = 2000
+
+
+def _summary(samples):
+    values = sorted(samples)
+    if not values:
+        return None
+    return {"mean": 1000 * sum(values) / len(values), "p50": 1000 * percentile(values, 0.5),
+            "p99": 1000 * percentile(values, 0.99), "max": 1000 * values[-1]}
+
+
+class SessionScheduler:
+    """Steps one session's model on its own thread, ``rate`` steps per second or (``rate=None``) flat out.
+
+    Ticks are laid on a fixed timeline, start + n / rate, so a slow step delays
+    one tick instead of pushing back every later one. When a step overruns by
+    more than a whole interval the ticks it missed are skipped and counted, not
+    run in a burst. A tick holds the session lock only for ``model.step()``:
+    viewers are woken through the session's feed and encode and write on their
+    own threads, so the stepping thread never waits on a client's socket.
+    ``stats`` reports the achieved rate and, over the last ``window`` ticks,
+    how late each tick started (the jitter) and how long its step took.
+    Autoplay ends with the game, after ``max_steps`` steps, or once
+    ``stall_steps`` steps in a row left the game stats unchanged, so an
+    abandoned session never steps forever; ``stop_reason`` says which.
+    """
+
+    def __init__(self, session, locked, rate=None, window=4096, max_steps=MAX_STEPS, stall_steps=STALL_STEPS):
+        self.session = session
+        self.locked = locked
+        self.rate = rate
+        self.max_steps = max_steps
+        self.stall_steps = stall_steps
+        self.stop_reason = None
+        self.last_stats = None
+        self.last_change = 0
+        self.ticks = 0
+        self.missed = 0
+        self.lateness = collections.deque(maxlen=window)
+        self.step_times = collections.deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.finished = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name=f"scheduler {session.id}", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _tick(session):
+        if not session.model.game_over:
+            session.model.step()
+        return session.model._game_stats()
+
+    def _done(self, stats):
+        if stats['game_over']:
+            self.stop_reason = 'game_over'
+        elif stats != self.last_stats:
+            self.last_stats = stats
+            self.last_change = self.ticks
+        elif self.ticks - self.last_change >= self.stall_steps:
+            self.stop_reason = 'stalled'
+        if self.stop_reason is None and self.ticks >= self.max_steps:
+            self.stop_reason = 'max_steps'
+        return self.stop_reason is not None
+
+    def _loop(self):
+        perf_counter = time.perf_counter
+        interval = 1.0 / self.rate if self.rate else 0.0
+        next_tick = perf_counter()
+        try:
+            while not self.stopped.is_set():
+                if interval:
+                    delay = next_tick - perf_counter()
+                    if delay > 0 and self.stopped.wait(delay):
+                        break
+                begin = perf_counter()
+                stats = self.locked(self.session, self._tick)
+                end = perf_counter()
+                self.ticks += 1
+                self.step_times.append(end - begin)
+                if self._done(stats):
+                    break
+                if interval:
+                    self.lateness.append(begin - next_tick)
+                    next_tick += interval
+                    if end - next_tick > interval:
+                        skipped = int((end - next_tick) / interval)
+                        self.missed += skipped
+                        next_tick += skipped * interval
+                else:
+                    # Lets request threads waiting on the session lock in between steps
+                    time.sleep(0)
+        finally:
+            self.finished = perf_counter()
+            self.stopped.set()
+
+    def stop(self):
+        if self.running:
+            self.stop_reason = 'stopped'
+        self.stopped.set()
+
+    @property
+    def running(self):
+        return not self.stopped.is_set()
+
+    def stats(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "rate": self.rate or "max",
+            "running": self.running,
+            "stop_reason": self.stop_reason,
+            "ticks": self.ticks,
+            "elapsed_sec": elapsed,
+            "steps_per_sec": self.ticks / elapsed if elapsed > 0 else None,
+            "missed_ticks": self.missed,
+            "lateness_ms": _summary(list(self.lateness)),
+            "step_ms": _summary(list(self.step_times))
+        }
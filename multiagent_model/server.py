@@ -1,129 +1,410 @@
+import argparse
 import json
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import logging
-from model import FireRescueModel
+from urllib.parse import urlsplit, parse_qs
+from sessions import SessionManager, SessionLimitError
+from replay import ReplayLibrary
 
 
-model = None
+class EncodedState(bytes):
+    """A game_state the model already encoded to JSON; _send_json splices it in unchanged."""
 
-def create_model(strategy='improved', num_agents=1):
-    global model
-    model = FireRescueModel(strategy=strategy, num_agents=num_agents)
+
+DEFAULT_SESSION = 'default'
+# Every game lives in a session; the original single-game routes drive the pinned default one
+sessions = SessionManager()
+# Recorded games served on /replay; None until run() is given a --replay-dir
+replays = None
+
+def step_action(model):
+    model.step()
+    return "Firefighter action (1 AP) completed"
+
+def step_fire(model):
+    model.advance_fire = True
+    model.step()
+    return "Fire phase completed"
+
+def step_complete_turn(model):
+    safety_counter = 0
+    while getattr(model, 'advance_fire', False) is False and safety_counter < 100:
+        model.step()
+        safety_counter += 1
+    if getattr(model, 'advance_fire', False):
+        model.step()
+    return "Complete turn (all AP + fire) executed"
+
+# Upper bound on model steps a single /step_many request may run
+MAX_BATCH_STEPS = 2000
+# Upper bound on a numeric /autoplay rate; "max" steps as fast as the model goes
+MAX_AUTOPLAY_RATE = 1000.0
+# An event stream whose viewer has not taken a message for this many seconds is dropped
+STREAM_WRITE_TIMEOUT = 30.0
+
+def step_many(model, actions=None, turns=None):
+    """Run ``actions`` model steps, or as many as it takes to finish ``turns`` fire phases.
+
+    Returns the number of steps taken and every model event raised on the way,
+    each as ``[step, kind, *data]`` in the order it happened.
+    """
+    events = []
+    steps = 0
+    def record(event):
+        events.append((steps,) + event)
+    model.event_listeners.append(record)
+    try:
+        fire_phases = 0
+        while steps < MAX_BATCH_STEPS and not model.game_over:
+            if actions is not None and steps >= actions:
+                break
+            if turns is not None and fire_phases >= turns:
+                break
+            fire_phase = model.advance_fire
+            model.step()
+            steps += 1
+            if fire_phase:
+                fire_phases += 1
+    finally:
+        model.event_listeners.remove(record)
+    return steps, events
+
+def autoplay_rate(value):
+    """Steps/sec asked for by an /autoplay request: None for "max", 0 to stop; ValueError if unreadable."""
+    if value == 'max':
+        return None
+    rate = float(value)
+    if rate != rate:
+        raise ValueError("rate is NaN")
+    return min(max(rate, 0.0), MAX_AUTOPLAY_RATE)
+
+STEP_ROUTES = {
+    '/step': step_action,
+    '/step_firefighter': step_action,
+    '/step_fire': step_fire,
+    '/step_complete_turn': step_complete_turn
+}
 
 class Server(BaseHTTPRequestHandler):
-    def _set_response(self, content_type='application/json'):
-        self.send_response(200)
+    # HTTP/1.1 keeps the connection open between polls; every response must carry Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without TCP_NODELAY, Nagle plus delayed ACKs
+    # add ~40 ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def _send_body(self, body, content_type='application/json', status=200):
+        self.send_response(status)
         self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, status=200):
+        state = data.get('game_state')
+        if isinstance(state, EncodedState):
+            # game_state is always the last key, so the rest is encoded and the state appended
+            fields = {key: value for key, value in data.items() if key != 'game_state'}
+            head = json.dumps(fields).encode('utf-8')[:-1]
+            body = head + (b', ' if fields else b'') + b'"game_state": ' + state + b'}'
+        else:
+            body = json.dumps(data).encode('utf-8')
+        self._send_body(body, status=status)
+
+    def _read_json(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        post_data = self.rfile.read(content_length)
+        return json.loads(post_data) if post_data else {}
+
+    def _parse_path(self):
+        url = urlsplit(self.path)
+        self.route = url.path
+        self.params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    def _state_payload(self, session):
+        # Plain requests get the full game_state as before; since/delta opt into deltas. A client id
+        # (client=) still opts in but no longer stands for a base version: only the client knows
+        # which response it last applied, so without since the answer is a full state
+        params = self.params
+        if not ('since' in params or 'client' in params or 'delta' in params):
+            return {"game_state": EncodedState(session.model.get_state_json())}
+        since = int(params['since']) if params.get('since', '').isdigit() else None
+        return session.deltas.payload(session.model.get_state(), since, params.get('full') == '1')
+
+    def _steppable(self, session):
+        if session is None:
+            self.send_error(400, "Model not initialized")
+            return False
+        # While the scheduler drives the game, clients only observe it
+        if session.autoplaying:
+            self.send_error(409, "Session is on autoplay")
+            return False
+        return True
+
+    def _run_step(self, session, action):
+        if not self._steppable(session):
+            return
+        def work(s):
+            status = action(s.model)
+            return dict(status=status, **self._state_payload(s))
+        self._send_json(sessions.run(session, work))
+
+    def _run_step_many(self, session):
+        if not self._steppable(session):
+            return
+        params = self.params
+        turns = int(params['turns']) if params.get('turns', '').isdigit() else None
+        actions = int(params['n']) if params.get('n', '').isdigit() else None
+        if turns is None and actions is None:
+            actions = 1
+        def work(s):
+            steps, events = step_many(s.model, actions, turns)
+            return dict(status=f"{steps} step(s) executed", steps=steps, events=events,
+                        **self._state_payload(s))
+        self._send_json(sessions.run(session, work))
+
+    def _metrics(self, session):
+        # ?reset=1 clears the counters after reporting them, to measure one stretch of play at a time
+        def work(s):
+            if s.profiler is None:
+                return None
+            report = s.profiler.report()
+            if self.params.get('reset') == '1':
+                s.profiler.reset()
+            return report
+        return sessions.run(session, work)
+
+    def _stream_events(self, session):
+        # Server-Sent Events: the full state first, then one delta each time the model advances
+        if session is None:
+            self.send_error(400, "Model not initialized")
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.close_connection = True
+        self.connection.settimeout(STREAM_WRITE_TIMEOUT)
+        try:
+            session.feed.stream(session, sessions.run, self.wfile.write)
+        except OSError:
+            # The viewer went away, or stopped reading for STREAM_WRITE_TIMEOUT
+            pass
+
+    def _autoplay(self, session, data=None):
+        # POST {"rate": steps_per_sec | "max" | 0} starts or stops the scheduler; GET reports its tick stats
+        if session is None:
+            self.send_error(400, "Model not initialized")
+            return
+        if data is not None:
+            try:
+                rate = autoplay_rate(data.get('rate', self.params.get('rate', 0)))
+            except (TypeError, ValueError):
+                self.send_error(400, "rate must be a number of steps per second or \"max\"")
+                return
+            sessions.autoplay(session, rate)
+        stats = session.autoplay.stats() if session.autoplay is not None else None
+        self._send_json({"session_id": session.id, "autoplay": stats})
+
+    def _session_route(self):
+        # /sessions/<id>[/<action>] -> (id, '/<action>' or '')
+        parts = self.route.split('/')
+        if len(parts) < 3 or parts[1] != 'sessions' or not parts[2]:
+            return None, None
+        return parts[2], '/' + '/'.join(parts[3:]) if len(parts) > 3 else ''
+
+    def _create_session(self, data):
+        strategy = data.get('strategy', 'improved')
+        num_agents = min(data.get('num_agents', 1), 6)
+        try:
+            rate = autoplay_rate(data['autoplay']) if 'autoplay' in data else 0
+        except (TypeError, ValueError):
+            self.send_error(400, "autoplay must be a number of steps per second or \"max\"")
+            return
+        try:
+            session = sessions.create(strategy, num_agents, seed=data.get('seed'), profile=data.get('profile'))
+        except SessionLimitError as exc:
+            self.send_error(503, str(exc))
+            return
+        state = sessions.run(session, lambda s: EncodedState(s.model.get_state_json()))
+        if rate != 0:
+            sessions.autoplay(session, rate)
+        self._send_json({"session_id": session.id, "seed": session.model.streams.entropy, "game_state": state},
+                        status=201)
+
+    def _handle_session(self, method, data=None):
+        session_id, action = self._session_route()
+        if session_id is None:
+            if method == 'GET' and self.route in ('/sessions', '/sessions/'):
+                with_memory = self.params.get('memory') == '1'
+                self._send_json({"sessions": sessions.list(with_memory), "stats": sessions.stats()})
+            elif method == 'POST' and self.route in ('/sessions', '/sessions/'):
+                self._create_session(data or {})
+            else:
+                self.send_error(404)
+            return
+        session = sessions.get(session_id)
+        if session is None:
+            self.send_error(404, "Unknown session")
+        elif method == 'DELETE' and action == '':
+            sessions.delete(session_id)
+            self._send_json({"status": "Session closed", "session_id": session_id})
+        elif method == 'GET' and action == '':
+            payload = sessions.run(session, self._state_payload)
+            self._send_json(dict(session=session.info(with_memory=True), **payload))
+        elif method == 'GET' and action == '/state':
+            self._send_json(sessions.run(session, self._state_payload))
+        elif method in ('GET', 'POST') and action in STEP_ROUTES:
+            self._run_step(session, STEP_ROUTES[action])
+        elif method in ('GET', 'POST') and action == '/step_many':
+            self._run_step_many(session)
+        elif method == 'GET' and action == '/metrics':
+            self._send_json({"session_id": session_id, "metrics": self._metrics(session)})
+        elif method == 'GET' and action == '/events':
+            self._stream_events(session)
+        elif method == 'POST' and action == '/autoplay':
+            self._autoplay(session, data or {})
+        elif method == 'GET' and action == '/autoplay':
+            self._autoplay(session)
+        elif method == 'POST' and action == '/reset':
+            data = data or {}
+            strategy = data.get('strategy')
+            num_agents = min(data['num_agents'], 6) if 'num_agents' in data else None
+            seed = data.get('seed')
+            def reset(s):
+                s.reset(strategy, num_agents, seed)
+                return EncodedState(s.model.get_state_json())
+            state = sessions.run(session, reset)
+            self._send_json({"status": "Session reset", "session_id": session_id,
+                             "seed": session.model.streams.entropy, "game_state": state})
+        else:
+            self.send_error(404)
+
+    def _handle_replay(self):
+        # /replay lists the traces; /replay/<trace>?game=G&step=S|turn=T is one recorded state
+        if replays is None:
+            self.send_error(404, "Replay is not enabled")
+            return
+        name = self.route[len('/replay/'):] if self.route.startswith('/replay/') else ''
+        if not name:
+            self._send_json({"traces": replays.list()})
+            return
+        replay = replays.get(name)
+        if replay is None:
+            self.send_error(404, "Unknown trace")
+            return
+        params = self.params
+        step = int(params['step']) if params.get('step', '').isdigit() else None
+        turn = int(params['turn']) if params.get('turn', '').isdigit() else None
+        games = replay.games()
+        game = int(params['game']) if params.get('game', '').isdigit() else (games[0] if games else None)
+        if game not in games:
+            self.send_error(404, "Unknown game")
+            return
+        try:
+            step, turn, state = replay.state_at(game, step, turn)
+        except ValueError:
+            self.send_error(422, "Unreadable trace")
+            return
+        self._send_json({"trace": name, "game": game, "step": step, "turn": turn, "game_state": state})
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
 
     def do_OPTIONS(self):
-        self._set_response()
+        self._send_body(b'')
+
+    def do_DELETE(self):
+        self._parse_path()
+        if self.route.startswith('/sessions'):
+            self._handle_session('DELETE')
+        else:
+            self.send_error(404)
 
     def do_GET(self):
-        if self.path == '/':
+        self._parse_path()
+        if self.route == '/':
             try:
                 with open('index.html', 'r', encoding='utf-8') as f:
                     html_content = f.read()
-                self._set_response('text/html')
-                self.wfile.write(html_content.encode('utf-8'))
+                self._send_body(html_content.encode('utf-8'), 'text/html')
             except FileNotFoundError:
                 self.send_error(404, "index.html not found")
-        elif self.path == '/init':
-            global model
-            if model is None:
-                create_model(strategy='improved', num_agents=1)
-            self._set_response()
-            response_data = {
+        elif self.route == '/init':
+            session = sessions.get(DEFAULT_SESSION)
+            if session is None:
+                session = sessions.create('improved', 1, session_id=DEFAULT_SESSION, pinned=True)
+            state = sessions.run(session, lambda s: EncodedState(s.model.get_state_json()))
+            self._send_json({
                 "status": "Game initialized",
-                "game_state": model.get_state()
-            }
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
-        elif self.path == '/step':
-            if model:
-                model.step()
-                self._set_response()
-                response_data = {
-                    "status": "Firefighter action (1 AP) completed",
-                    "game_state": model.get_state()
-                }
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
+                "game_state": state
+            })
+        elif self.route == '/step':
+            self._run_step(sessions.get(DEFAULT_SESSION), step_action)
+        elif self.route == '/step_many':
+            self._run_step_many(sessions.get(DEFAULT_SESSION))
+        elif self.route == '/state':
+            session = sessions.get(DEFAULT_SESSION)
+            if session is None:
                 self.send_error(400, "Model not initialized")
+            else:
+                self._send_json(sessions.run(session, self._state_payload))
+        elif self.route == '/events':
+            self._stream_events(sessions.get(DEFAULT_SESSION))
+        elif self.route == '/autoplay':
+            self._autoplay(sessions.get(DEFAULT_SESSION))
+        elif self.route == '/metrics':
+            # Every profiled session at once; sessions created without profiling report null
+            self._send_json({"sessions": {session.id: self._metrics(session) for session in sessions.live()},
+                             "stats": sessions.stats()})
+        elif self.route.startswith('/sessions'):
+            self._handle_session('GET')
+        elif self.route == '/replay' or self.route.startswith('/replay/'):
+            self._handle_replay()
         else:
             self.send_error(404)
-    
+
     def do_POST(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        data = json.loads(post_data) if post_data else {}
-
-        if self.path == '/step':
-            if model:
-                model.step()
-                self._set_response()
-                response_data = {
-                    "status": "Firefighter action (1 AP) completed",
-                    "game_state": model.get_state()
-                }
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_error(400, "Model not initialized")
-        elif self.path == '/step_firefighter':
-            if model:
-                model.step()
-                self._set_response()
-                response_data = {
-                    "status": "Firefighter action (1 AP) completed",
-                    "game_state": model.get_state()
-                }
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_error(400, "Model not initialized")
-        elif self.path == '/step_fire':
-            if model:
-                model.advance_fire = True
-                model.step()
-                self._set_response()
-                response_data = {
-                    "status": "Fire phase completed",
-                    "game_state": model.get_state()
-                }
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_error(400, "Model not initialized")
-        elif self.path == '/step_complete_turn':
-            if model:
-                safety_counter = 0
-                while getattr(model, 'advance_fire', False) is False and safety_counter < 100:
-                    model.step()
-                    safety_counter += 1
-                if getattr(model, 'advance_fire', False):
-                    model.step()
-                self._set_response()
-                response_data = {
-                    "status": "Complete turn (all AP + fire) executed",
-                    "game_state": model.get_state()
-                }
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_error(400, "Model not initialized")
-        elif self.path == '/reset':
+        self._parse_path()
+        data = self._read_json()
+
+        if self.route in STEP_ROUTES:
+            self._run_step(sessions.get(DEFAULT_SESSION), STEP_ROUTES[self.route])
+        elif self.route == '/step_many':
+            self._run_step_many(sessions.get(DEFAULT_SESSION))
+        elif self.route == '/autoplay':
+            self._autoplay(sessions.get(DEFAULT_SESSION), data)
+        elif self.route.startswith('/sessions'):
+            self._handle_session('POST', data)
+        elif self.route == '/reset':
             strategy = data.get('strategy', 'improved')
             num_agents = min(data.get('num_agents', 1), 6)  # Enforce max 6 firefighters
-            create_model(strategy, num_agents)
-            self._set_response()
-            response_data = {
+            # An optional integer seed replays the same fire dice, POIs and choices
+            session = sessions.create(strategy, num_agents, session_id=DEFAULT_SESSION, pinned=True,
+                                      seed=data.get('seed'))
+            state = sessions.run(session, lambda s: EncodedState(s.model.get_state_json()))
+            self._send_json({
                 "status": f"Game reset with {num_agents} firefighter(s)",
-                "game_state": model.get_state()
-            }
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+                "seed": session.model.streams.entropy,
+                "game_state": state
+            })
         else:
             self.send_error(404)
 
-def run(server_class=HTTPServer, handler_class=Server, port=8585):
+class SimulationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when many pollers connect at once
+    request_queue_size = 128
+
+def run(server_class=SimulationServer, handler_class=Server, port=8585, max_sessions=64,
+        idle_timeout=600.0, step_workers=None, profile=False, replay_dir=None, mcts_workers=0):
+    global sessions, replays
+    sessions = SessionManager(max_sessions, idle_timeout, step_workers, profile, mcts_workers)
+    replays = ReplayLibrary(replay_dir) if replay_dir else None
     logging.basicConfig(level=logging.INFO)
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
@@ -134,8 +415,20 @@ def run(server_class=HTTPServer, handler_class=Server, port=8585):
     except KeyboardInterrupt:
         pass
     httpd.server_close()
+    sessions.close()
     logging.info("Stopping httpd...")
     logging.info("\n")
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fire rescue simulation HTTP server")
+    parser.add_argument("--port", type=int, default=8585)
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="seconds before an idle session is evicted")
+    parser.add_argument("--step-workers", type=int, default=None, help="run model steps on a pool of this many threads")
+    parser.add_argument("--profile", action="store_true", help="time model phases in every session, served on /metrics")
+    parser.add_argument("--replay-dir", default=None, help="serve the game traces in this directory on /replay")
+    parser.add_argument("--mcts-workers", type=int, default=0, help="processes per search for sessions playing mcts")
+    args = parser.parse_args()
+    run(port=args.port, max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+        step_workers=args.step_workers, profile=args.profile, replay_dir=args.replay_dir,
+        mcts_workers=args.mcts_workers)
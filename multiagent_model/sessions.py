@@ -0,0 +1,276 @@
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from delta import DeltaTracker
+from model import FireRescueModel
+from profiler import Profiler
+from push import StateFeed
+from scheduler import SessionScheduler
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+def estimate_size(obj):
+    """Rough deep size in bytes of ``obj`` and everything it owns (NumPy arrays by ``nbytes``)."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, type(sys), type(estimate_size))):
+            continue
+        seen.add(id(current))
+        if isinstance(current, np.ndarray):
+            total += sys.getsizeof(current) + (current.nbytes if current.base is None else 0)
+            continue
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(current.__dict__)
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+class Session:
+    def __init__(self, session_id, strategy='improved', num_agents=1, pinned=False, seed=None, profile=False,
+                 mcts_workers=0):
+        self.id = session_id
+        self.mcts_workers = mcts_workers
+        self.strategy = strategy
+        self.num_agents = num_agents
+        self.pinned = pinned
+        self.lock = threading.Lock()
+        self.created = time.monotonic()
+        self.last_access = self.created
+        # Kept across resets so /metrics covers every game played in the session
+        self.profiler = Profiler() if profile else None
+        self.model = self._new_model(seed)
+        self.deltas = DeltaTracker()
+        self.feed = StateFeed(self.deltas)
+        self.autoplay = None
+
+    def _new_model(self, seed):
+        model = FireRescueModel(strategy=self.strategy, num_agents=self.num_agents, seed=seed,
+                                mcts_workers=self.mcts_workers)
+        if self.profiler is not None:
+            model.enable_profiling(self.profiler)
+        return model
+
+    def reset(self, strategy=None, num_agents=None, seed=None):
+        # A reset without a seed starts a fresh game rather than replaying the last one
+        self.strategy = strategy or self.strategy
+        self.num_agents = num_agents or self.num_agents
+        self.model.close()
+        self.model = self._new_model(seed)
+        self.deltas.reset()
+
+    def start_autoplay(self, locked, rate=None):
+        """Step the model in the background, ``rate`` times a second or as fast as it goes.
+
+        ``locked(session, action)`` runs one step under the session lock; use
+        ``SessionManager.autoplay`` rather than calling this directly.
+        """
+        self.stop_autoplay()
+        self.autoplay = SessionScheduler(self, locked, rate)
+
+    @property
+    def autoplaying(self):
+        return self.autoplay is not None and self.autoplay.running
+
+    def stop_autoplay(self):
+        # The stopped scheduler stays around so its stats can still be read
+        if self.autoplay is not None:
+            self.autoplay.stop()
+
+    def close(self):
+        # Ends every event stream of the session; viewers reconnect to whatever replaced it
+        self.stop_autoplay()
+        self.feed.close()
+        with self.lock:
+            self.model.close()
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def info(self, with_memory=False):
+        now = time.monotonic()
+        data = {
+            "session_id": self.id,
+            "strategy": self.strategy,
+            "num_agents": self.num_agents,
+            "seed": self.model.streams.entropy,
+            "pinned": self.pinned,
+            "profiling": self.profiler is not None,
+            "age_sec": now - self.created,
+            "idle_sec": now - self.last_access,
+            "game_over": self.model.game_over,
+            "autoplay": self.autoplay.stats() if self.autoplay is not None else None,
+            "feed": self.feed.stats()
+        }
+        if with_memory:
+            with self.lock:
+                data["memory_bytes"] = estimate_size(self.model)
+        return data
+
+
+class SessionManager:
+    """Live games keyed by session id, with idle eviction and a cap on live sessions.
+
+    Pinned sessions (the legacy single-game endpoints) never expire and do not
+    count towards ``max_sessions``. With ``step_workers`` set, model work runs on
+    a shared thread pool instead of the request thread; each session's lock
+    keeps its own steps in order. With ``profile`` set, new sessions time their
+    models' phases for ``/metrics``. ``mcts_workers`` is passed to the models of
+    sessions playing the mcts strategy. A reaper thread runs ``evict_idle``
+    every ``evict_interval`` seconds (a quarter of ``idle_timeout``, at most a
+    minute, by default), so abandoned sessions are freed on a server that gets
+    no requests at all.
+    """
+
+    def __init__(self, max_sessions=64, idle_timeout=600.0, step_workers=None, profile=False, mcts_workers=0,
+                 evict_interval=None):
+        self.max_sessions = max_sessions
+        self.mcts_workers = mcts_workers
+        self.profile = profile
+        self.idle_timeout = idle_timeout
+        self.evict_interval = evict_interval or min(idle_timeout / 4, 60.0)
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=step_workers) if step_workers else None
+        self.evicted = 0
+        self.closed = threading.Event()
+        self.reaper = threading.Thread(target=self._reap, name="session reaper", daemon=True)
+        self.reaper.start()
+
+    def _live_count(self):
+        return sum(1 for session in self.sessions.values() if not session.pinned)
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = [sid for sid, session in self.sessions.items()
+                       if not session.pinned and session.last_access < cutoff]
+            closed = [self.sessions.pop(sid) for sid in expired]
+            self.evicted += len(expired)
+        # Closing waits for a step in progress, so it happens outside the manager lock
+        for session in closed:
+            session.close()
+        return expired
+
+    def _reap(self):
+        while not self.closed.wait(self.evict_interval):
+            self.evict_idle()
+
+    def create(self, strategy='improved', num_agents=1, session_id=None, pinned=False, seed=None, profile=None):
+        self.evict_idle()
+        session_id = session_id or uuid.uuid4().hex[:12]
+        # Checked up front so a full manager does not build a model for nothing, and
+        # again when inserting, since other creates may have filled it in between
+        with self.lock:
+            full = not pinned and self._over_limit(session_id)
+        if full:
+            raise SessionLimitError(f"session limit of {self.max_sessions} reached")
+        session = Session(session_id, strategy, num_agents, pinned, seed,
+                          self.profile if profile is None else profile, self.mcts_workers)
+        with self.lock:
+            full = not pinned and self._over_limit(session_id)
+            if not full:
+                replaced = self.sessions.get(session_id)
+                self.sessions[session_id] = session
+        if full:
+            session.close()
+            raise SessionLimitError(f"session limit of {self.max_sessions} reached")
+        if replaced is not None:
+            replaced.close()
+        return session
+
+    def _over_limit(self, session_id):
+        # A live session replaced under the same id frees its own slot
+        replaced = self.sessions.get(session_id)
+        return self._live_count() - (replaced is not None and not replaced.pinned) >= self.max_sessions
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is not None:
+            session.touch()
+        return session
+
+    def delete(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def live(self):
+        self.evict_idle()
+        with self.lock:
+            return list(self.sessions.values())
+
+    def list(self, with_memory=False):
+        return [session.info(with_memory) for session in self.live()]
+
+    def _locked(self, session, action):
+        # Does not touch the session: the autoplay scheduler steps through here, and only
+        # client requests should keep a session from being evicted
+        with session.lock:
+            model, steps = session.model, session.model.steps
+            try:
+                return action(session)
+            finally:
+                # Event streams only hear about work that advanced or replaced the model
+                if session.model is not model or session.model.steps != steps:
+                    session.feed.publish()
+
+    def autoplay(self, session, rate=None):
+        """Have a scheduler thread step ``session``, ``rate`` steps/sec or as fast as possible; 0 stops it."""
+        if rate == 0:
+            session.stop_autoplay()
+        else:
+            # Straight under the session lock: a tick must not wait for a free step worker
+            session.start_autoplay(self._locked, rate)
+
+    def run(self, session, action):
+        """Run ``action(session)`` for a client under the session lock, on the worker pool when there is one."""
+        session.touch()
+        if self.executor is None:
+            return self._locked(session, action)
+        return self.executor.submit(self._locked, session, action).result()
+
+    def close(self):
+        """Stop the reaper and close every session."""
+        self.closed.set()
+        with self.lock:
+            closed = list(self.sessions.values())
+            self.sessions.clear()
+        for session in closed:
+            session.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def stats(self):
+        with self.lock:
+            live = self._live_count()
+            total = len(self.sessions)
+        return {
+            "live_sessions": live,
+            "pinned_sessions": total - live,
+            "max_sessions": self.max_sessions,
+            "idle_timeout_sec": self.idle_timeout,
+            "evicted": self.evicted,
+            "step_workers": self.executor._max_workers if self.executor else 0
+        }
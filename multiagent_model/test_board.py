@@ -0,0 +1,35 @@
+from board import DIRECTIONS, DOOR_CODES, NO_DOOR, NO_WALL
+from model import FireRescueModel
+
+
+def adjacent_pairs(model):
+    for x in range(model.grid.width):
+        for y in range(model.grid.height):
+            for dx, dy in DIRECTIONS:
+                other = (x + dx, y + dy)
+                if not model.grid.out_of_bounds(other):
+                    yield (x, y), other
+
+
+def test_edge_table_follows_wall_and_door_dicts_through_a_game():
+    model = FireRescueModel(num_agents=4, seed=3)
+    while not model.game_over and model.steps < 1500:
+        model.step()
+    assert model.wall_damage and any(door['state'] != 'closed' for door in model.doors.values())
+    for pos, other in adjacent_pairs(model):
+        key = tuple(sorted((pos, other)))
+        wall = model.wall_damage.get(key, 0) + 1 if key in model.walls else NO_WALL
+        door = DOOR_CODES[model.doors[key]['state']] if key in model.doors else NO_DOOR
+        assert model.edges.wall_code(pos, other) == wall, key
+        assert model.edges.door_code(pos, other) == door, key
+
+
+def test_cell_grid_plays_the_same_games_as_marker_dicts():
+    for seed in range(3):
+        games = []
+        for cell_grid in (False, True):
+            model = FireRescueModel(num_agents=3, seed=seed, cell_grid=cell_grid)
+            while not model.game_over and model.steps < 1500:
+                model.step()
+            games.append((model.steps, sorted(model.fires), sorted(model.smoke), model._game_stats()))
+        assert games[0] == games[1]
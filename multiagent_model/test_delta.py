@@ -0,0 +1,25 @@
+from delta import DeltaTracker, apply_delta, index_state, state_from_index
+from model import FireRescueModel
+
+
+def test_delta_is_taken_from_the_version_the_client_applied():
+    model = FireRescueModel(num_agents=2, seed=1)
+    tracker = DeltaTracker()
+    first = tracker.payload(model.get_state(), full=True)
+    applied = index_state(first['game_state'])
+    for _ in range(5):
+        model.step()
+    # This response never reaches the client
+    tracker.payload(model.get_state(), first['version'])
+    for _ in range(5):
+        model.step()
+    response = tracker.payload(model.get_state(), first['version'])
+    assert response['since'] == first['version']
+    assert state_from_index(apply_delta(applied, response['delta'])) == state_from_index(index_state(model.get_state()))
+
+
+def test_unknown_version_gets_full_state():
+    model = FireRescueModel(num_agents=1, seed=2)
+    tracker = DeltaTracker()
+    assert tracker.payload(model.get_state())['full']
+    assert tracker.payload(model.get_state(), since=-1)['full']
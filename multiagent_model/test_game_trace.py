@@ -0,0 +1,29 @@
+import threading
+from game_trace import STEP, TraceWriter, read_trace
+
+
+def test_every_accepted_write_reaches_the_file(tmp_path):
+    path = str(tmp_path / 'trace')
+    writer = TraceWriter(path, batch_size=7, flush_interval=0.001)
+    accepted = []
+
+    def produce(game):
+        step = 0
+        while True:
+            try:
+                writer.write((STEP, game, step, ()))
+            except ValueError:
+                return
+            accepted.append((game, step))
+            step += 1
+
+    threads = [threading.Thread(target=produce, args=(game,)) for game in range(4)]
+    for thread in threads:
+        thread.start()
+    while len(accepted) < 20000:
+        pass
+    writer.close()
+    for thread in threads:
+        thread.join()
+    written = [(record[1], record[2]) for record in read_trace(path)]
+    assert sorted(written) == sorted(accepted)
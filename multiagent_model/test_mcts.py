@@ -0,0 +1,23 @@
+import threading
+from model import FireRescueModel
+
+
+def play(seed, steps, errors):
+    try:
+        model = FireRescueModel(strategy='mcts', num_agents=2, seed=seed, mcts_budget=0.005)
+        for _ in range(steps):
+            if model.game_over:
+                break
+            model.step()
+    except Exception as exc:
+        errors.append(exc)
+
+
+def test_concurrent_mcts_models_keep_separate_scratch_models():
+    errors = []
+    threads = [threading.Thread(target=play, args=(seed, 60, errors)) for seed in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
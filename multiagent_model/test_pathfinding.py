@@ -0,0 +1,68 @@
+import random
+from board import DIRECTIONS
+from model import FireRescueModel
+from pathfinding import find_path
+
+
+def baseline_cost_through(model, pos, step, goal, firefighter):
+    """find_path's cost of reaching ``goal`` from ``pos`` with ``step`` as the first move."""
+    fields = model.distance_fields
+    d = DIRECTIONS.index((step[0] - pos[0], step[1] - pos[1]))
+    cost = fields.step_cost(pos, d, (goal,))
+    if len(firefighter.last_positions) >= 3 and step in firefighter.last_positions[-3:]:
+        cost += 5
+    _, rest = find_path(model, step, goal, firefighter)
+    return cost + rest
+
+
+def test_field_steps_match_find_path_on_fixed_seeds():
+    moves = same = worse = 0
+    for seed in range(6):
+        model = FireRescueModel(num_agents=4, seed=seed)
+        fields = model.distance_fields
+        ranked_steps = fields.ranked_steps
+
+        def checked(field, pos, firefighter=None):
+            nonlocal moves, same, worse
+            steps = ranked_steps(field, pos, firefighter)
+            if firefighter is None or len(field.goals) != 1 or not steps:
+                return steps
+            goal = next(iter(field.goals))
+            path, cost = find_path(model, pos, goal, firefighter)
+            if path is None:
+                return steps
+            moves += 1
+            if steps[0] == path[1]:
+                same += 1
+            elif baseline_cost_through(model, pos, steps[0], goal, firefighter) > cost:
+                worse += 1
+            return steps
+
+        fields.ranked_steps = checked
+        while not model.game_over and model.steps < 1500:
+            model.step()
+    assert moves > 300
+    assert same >= 0.95 * moves
+    assert worse <= 0.01 * moves
+
+
+def test_a_star_finds_paths_as_cheap_as_plain_dijkstra():
+    model = FireRescueModel(num_agents=4, seed=1)
+    while model.steps < 300:
+        model.step()
+    firefighter = next(iter(model.firefighters))
+    cells = [(x, y) for x in range(model.grid.width) for y in range(model.grid.height)]
+    rng = random.Random(0)
+    found = 0
+    for _ in range(300):
+        start, end = rng.sample(cells, 2)
+        path, cost = find_path(model, start, end, firefighter)
+        assert cost == find_path(model, start, end, firefighter, heuristic=False)[1]
+        if path is None:
+            continue
+        found += 1
+        assert path[0] == start and path[-1] == end
+        for pos, nxt in zip(path, path[1:]):
+            assert abs(pos[0] - nxt[0]) + abs(pos[1] - nxt[1]) == 1
+            assert not model.edges.wall_blocks(pos, nxt)
+    assert found > 200
@@ -0,0 +1,27 @@
+import json
+from game_trace import TraceWriter
+from model import FireRescueModel
+from replay import Replay
+
+
+def test_replay_gives_the_live_state_at_every_step(tmp_path):
+    for cell_grid in (False, True):
+        path = str(tmp_path / f'trace_{cell_grid}')
+        live = {}
+        with TraceWriter(path) as writer:
+            for game, seed in enumerate((1, 2)):
+                model = FireRescueModel(num_agents=3, seed=seed, cell_grid=cell_grid)
+                model.enable_tracing(writer, game, keyframes=25)
+                live[game, 0] = json.loads(json.dumps(model.get_state()))
+                while not model.game_over and model.steps < 800:
+                    model.step()
+                    live[game, model.steps] = json.loads(json.dumps(model.get_state()))
+                model.disable_tracing()
+
+        with Replay(path) as replay:
+            for game in range(2):
+                replayed = {(game, step): state for step, _, state in replay.states(game)}
+                assert replayed == {key: state for key, state in live.items() if key[0] == game}
+            for (game, step), state in list(live.items())[::37]:
+                found, _, replayed = replay.state_at(game, step)
+                assert (found, replayed) == (step, state)
@@ -0,0 +1,27 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from scenario import SCENARIO_DIR, Scenario, ScenarioError, compiled_path, load_scenario
+
+FIELDS = ('width', 'height', 'interior', 'dice', 'walls', 'doors', 'signs', 'pois', 'fires', 'starts')
+
+
+def test_compiled_board_equals_the_text_scenario(tmp_path):
+    text = str(tmp_path / 'final.txt')
+    shutil.copy(os.path.join(SCENARIO_DIR, 'final.txt'), text)
+    with open(text, encoding='utf-8') as f:
+        parsed = Scenario.parse(f.read(), name=text)
+    parsed.save(compiled_path(text))
+    compiled = load_scenario(text)
+    assert compiled.name == compiled_path(text)
+    for field in FIELDS:
+        assert getattr(compiled, field) == getattr(parsed, field), field
+    assert isinstance(compiled.edges.wall, np.memmap)
+    assert np.array_equal(compiled.edges.wall, parsed.edges.wall)
+    assert np.array_equal(compiled.edges.door, parsed.edges.door)
+
+
+def test_parse_errors_name_the_line():
+    with pytest.raises(ScenarioError, match='board:2:'):
+        Scenario.parse("size 4 4\nwall 0 0 2 0\n", name='board')
@@ -0,0 +1,60 @@
+import threading
+import time
+from scheduler import SessionScheduler
+from sessions import SessionLimitError, SessionManager
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_autoplaying_session_without_clients_is_evicted():
+    # No request reaches the manager after autoplay starts; the reaper thread frees the session
+    manager = SessionManager(idle_timeout=0.3)
+    session = manager.create(num_agents=1, seed=0)
+    manager.autoplay(session, 200)
+    assert wait_until(lambda: session.id not in manager.sessions)
+    assert session.autoplay.ticks > 20
+    assert not session.autoplay.running
+    assert manager.evicted == 1
+    manager.close()
+
+
+def test_concurrent_creates_stay_within_the_session_limit():
+    manager = SessionManager(max_sessions=4)
+    created = []
+    refused = []
+    start = threading.Barrier(16)
+
+    def create():
+        start.wait()
+        try:
+            created.append(manager.create(num_agents=2))
+        except SessionLimitError:
+            refused.append(True)
+
+    threads = [threading.Thread(target=create) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 4 and len(refused) == 12
+    assert manager.stats()["live_sessions"] == 4
+    manager.close()
+
+
+def test_autoplay_stops_at_step_cap_and_when_stalled():
+    manager = SessionManager()
+    session = manager.create(num_agents=1, seed=0)
+    scheduler = SessionScheduler(session, manager._locked, max_steps=50)
+    assert wait_until(lambda: not scheduler.running)
+    assert scheduler.stop_reason == 'max_steps'
+    assert scheduler.ticks == 50
+    # Seed 0 with one firefighter stops changing the game stats and never ends
+    scheduler = SessionScheduler(session, manager._locked, stall_steps=300)
+    assert wait_until(lambda: not scheduler.running, timeout=30.0)
+    assert scheduler.stop_reason == 'stalled'
+    manager.delete(session.id)
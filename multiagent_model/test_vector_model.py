@@ -0,0 +1,12 @@
+from batch_runner import play_game
+from rng import game_seed
+from vector_model import OUTCOMES, VectorFireRescueModel, compare_outcomes
+
+
+def test_greedy_outcomes_match_the_scalar_improved_strategy():
+    vector = VectorFireRescueModel(200, num_agents=4, policy='greedy', seed=0).run(300)
+    scalar = [play_game(game_seed(0, game), 'improved', 4, max_turns=300) for game in range(100)]
+    comparison = compare_outcomes(vector.results(), scalar)
+    for key in OUTCOMES:
+        assert abs(comparison[key]["z"]) < 4, (key, comparison[key])
+    assert comparison["finished"]["vector"] > 0.2
@@ -0,0 +1,726 @@
+import argparse
+import json
+import math
+import time
+import numpy as np
+from batch_runner import aggregate, play_game
+from board import DIRECTIONS, OPPOSITE, WALL_INTACT, WALL_DESTROYED, NO_WALL, NO_DOOR, DOOR_CLOSED, DOOR_OPEN, \
+    DOOR_DESTROYED, EMPTY, SMOKE, FIRE
+from rng import game_seed, stream_seeds
+from scenario import load_scenario
+
+# Marker layer codes: a cell holds at most one hidden POI or revealed victim
+NO_MARKER, HIDDEN_VICTIM, HIDDEN_FALSE_ALARM, VICTIM = 0, 1, 2, 3
+# Von Neumann neighbourhood with centre in mesa's order, as direction indexes (-1 is the cell itself)
+NEIGHBOURHOOD = (3, 2, -1, 0, 1)
+# Rank of each direction's neighbour when sorted as a position tuple, for tie-breaking like the scalar sort
+TIE_ORDER = np.array([2, 3, 1, 0])
+DX = np.array([dx for dx, _ in DIRECTIONS])
+DY = np.array([dy for _, dy in DIRECTIONS])
+OPPOSITE_INDEX = np.array(OPPOSITE)
+INF = 1 << 20
+# Distance-field cost of entering an EMPTY, SMOKE or FIRE cell
+ENTER_COST = np.array([1, 3, 10], dtype=np.int32)
+POLICIES = ('greedy', 'random')
+# Single actions a firefighter may take in one turn before it is ended for it
+MAX_ACTIONS = 32
+
+
+def neighbour(array, d, fill):
+    """``out[n, x, y] == array[n, x + dx, y + dy]`` for direction ``d``; ``fill`` past the board edge."""
+    dx, dy = DIRECTIONS[d]
+    width, height = array.shape[1:3]
+    out = np.full_like(array, fill)
+    out[:, max(0, -dx):width - max(0, dx), max(0, -dy):height - max(0, dy)] = \
+        array[:, max(0, dx):width - max(0, -dx), max(0, dy):height - max(0, -dy)]
+    return out
+
+
+def nearest_table(width, height, spots):
+    """``table[x, y]`` is the first of ``spots`` closest to (x, y), as ``min(spots, key=manhattan)`` picks."""
+    table = np.zeros((width, height, 2), dtype=np.int64)
+    for x in range(width):
+        for y in range(height):
+            table[x, y] = min(spots, key=lambda spot: abs(x - spot[0]) + abs(y - spot[1]))
+    return table
+
+
+class VectorFireRescueModel:
+    """``boards`` independent games of one scenario stepped in lockstep as stacked arrays.
+
+    Cells and markers are ``(boards, width, height)`` arrays, walls and doors
+    ``(boards, width, height, 4)`` edge tables and firefighters ``(boards,
+    num_agents)`` arrays, so a fire phase or one firefighter action is a few
+    NumPy operations over every live board. The rules are FireRescueModel's,
+    quirks included (only the first explosion direction is processed, the
+    fire dice can land outside the building); explosions and POI
+    replenishment touch few boards and run per board on the same arrays.
+
+    Policies:
+
+    - ``greedy``: the improved strategy, with its distance fields computed for
+      all boards at once. Loop avoidance is left out and doors are only ever
+      opened, so single games differ from the scalar model, but outcome
+      statistics agree within sampling error (see ``--validate``).
+    - ``random``: a uniformly random legal move or extinguish each action,
+      ending the turn when there is none.
+    """
+
+    def __init__(self, boards, num_agents=1, policy='greedy', seed=None, scenario='final.txt'):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.scenario = load_scenario(scenario)
+        self.boards = boards
+        self.num_agents = num_agents = min(num_agents, 6)
+        self.policy = policy
+        self.seed = seed
+        seeds = stream_seeds(seed, ('fire', 'poi', 'agent'))
+        self.fire_rng = np.random.default_rng(seeds['fire'])
+        self.poi_rng = np.random.default_rng(seeds['poi'])
+        self.agent_rng = np.random.default_rng(seeds['agent'])
+        width, height = self.width, self.height = self.scenario.width, self.scenario.height
+        x0, y0, x1, y1 = self.interior = self.scenario.interior
+        self.fire_dice = self.scenario.dice
+        self.interior_mask = np.zeros((width, height), dtype=bool)
+        self.interior_mask[x0:x1 + 1, y0:y1 + 1] = True
+        self.total_victims_available = 10
+        self.total_false_alarms_available = 5
+        self.total_poi_markers = self.total_victims_available + self.total_false_alarms_available
+        self.WIN_VICTIMS_NEEDED = 7
+        self.LOSE_VICTIMS_LOST = 4
+        self.MAX_DAMAGE_CUBES = 24
+
+        self.cells = np.zeros((boards, width, height), dtype=np.uint8)
+        for pos in self.scenario.fires:
+            self.cells[:, pos[0], pos[1]] = FIRE
+        self.wall = np.broadcast_to(self.scenario.edges.wall, (boards, width, height, 4)).copy()
+        self.door = np.broadcast_to(self.scenario.edges.door, (boards, width, height, 4)).copy()
+        self.markers = np.zeros((boards, width, height), dtype=np.int8)
+        for pos, content_type in self.scenario.pois:
+            self.markers[:, pos[0], pos[1]] = HIDDEN_VICTIM if content_type == 'victim' else HIDDEN_FALSE_ALARM
+
+        def counter(value=0, dtype=np.int64):
+            return np.full(boards, value, dtype=dtype)
+        self.victims_rescued = counter()
+        self.victims_lost = counter()
+        self.damage_cubes = counter(0.0, np.float64)
+        self.total_victims_on_board = counter()
+        self.victims_in_pois = counter(sum(t == 'victim' for _, t in self.scenario.pois))
+        self.false_alarms_in_pois = counter(sum(t == 'false_alarm' for _, t in self.scenario.pois))
+        self.false_alarms_revealed = counter()
+        self.poi_placed = counter(len(self.scenario.pois))
+        self.turns = counter()
+        self.steps = counter()
+        self.game_over = np.zeros(boards, dtype=bool)
+        self.game_won = np.zeros(boards, dtype=bool)
+
+        starts = list(self.scenario.starts)
+        self.x = np.array([[starts[i % len(starts)][0] for i in range(num_agents)]] * boards, dtype=np.int64)
+        self.y = np.array([[starts[i % len(starts)][1] for i in range(num_agents)]] * boards, dtype=np.int64)
+        self.action_points = np.full((boards, num_agents), 4, dtype=np.int64)
+        self.carrying = np.zeros((boards, num_agents), dtype=bool)
+        self.turn_completed = np.zeros((boards, num_agents), dtype=bool)
+        self.nearest_start = nearest_table(width, height, starts)
+        border = ([(x, y) for x in range(width) for y in (0, height - 1)] +
+                  [(x, y) for y in range(1, height - 1) for x in (0, width - 1)])
+        self.nearest_border = nearest_table(width, height, border)
+        self.elapsed = 0.0
+
+    # Board queries
+
+    def in_bounds(self, x, y):
+        return (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+
+    def occupancy(self, idx, skip=None):
+        """Firefighters per cell on boards ``idx``, not counting agent slot ``skip``."""
+        counts = np.zeros((len(idx), self.width, self.height), dtype=np.int64)
+        rows = np.arange(len(idx))
+        for a in range(self.num_agents):
+            if a != skip:
+                np.add.at(counts, (rows, self.x[idx, a], self.y[idx, a]), 1)
+        return counts
+
+    def open_sides(self, idx, x, y):
+        """(n, 4) sides of each board's (x, y) that lead to a cell and have no standing wall or closed door."""
+        wall = self.wall[idx, x, y]
+        sides = ~((wall >= WALL_INTACT) & (wall < WALL_DESTROYED)) & (self.door[idx, x, y] != DOOR_CLOSED)
+        for d in range(4):
+            sides[:, d] &= self.in_bounds(x + DX[d], y + DY[d])
+        return sides
+
+    def set_edge(self, array, b, x, y, d, code):
+        array[b, x, y, d] = code
+        nx, ny = x + DIRECTIONS[d][0], y + DIRECTIONS[d][1]
+        if 0 <= nx < self.width and 0 <= ny < self.height:
+            array[b, nx, ny, OPPOSITE[d]] = code
+
+    def set_edges(self, array, idx, x, y, d, code):
+        """``set_edge`` for one inner edge per board in ``idx``."""
+        array[idx, x, y, d] = code
+        array[idx, x + DX[d], y + DY[d], OPPOSITE_INDEX[d]] = code
+
+    # Distance fields
+
+    def step_costs(self, idx, goals):
+        """(4, n, width, height) cost of stepping out of every cell through each side, INF through a wall.
+
+        The costs of ``DistanceFieldService.step_cost``: entering fire 10, smoke
+        3, a clear cell 1 plus 3 through a closed door, and +20 for stepping
+        outside the building onto a cell that is not a goal.
+        """
+        cells = self.cells[idx]
+        enter = ENTER_COST[cells]
+        enter += 20 * (~self.interior_mask & ~goals)
+        clear = cells == EMPTY
+        wall = self.wall[idx]
+        door = self.door[idx]
+        costs = np.empty((4,) + cells.shape, dtype=np.int32)
+        for d in range(4):
+            cost = neighbour(enter, d, INF) + 3 * ((door[..., d] == DOOR_CLOSED) & neighbour(clear, d, False))
+            costs[d] = np.where((wall[..., d] >= WALL_INTACT) & (wall[..., d] < WALL_DESTROYED), INF, cost)
+        return costs
+
+    def fields(self, goals, blocked, costs):
+        """Cost-to-go from every cell to its board's nearest goal, never passing a ``blocked`` cell.
+
+        Alternating sweeps along each axis relax a whole row or column of
+        every board per operation, so information crosses the board in one
+        sweep and a few rounds reach the fixed point.
+        """
+        dist = np.where(goals, 0, INF).astype(np.int32)
+        # A blocked cell has no way out, so its distance stays INF
+        costs = np.where(blocked & ~goals, INF, costs)
+        width, height = goals.shape[1:]
+        while True:
+            before = dist.copy()
+            for x in range(1, width):
+                np.minimum(dist[:, x], dist[:, x - 1] + costs[3, :, x], out=dist[:, x])
+            for x in range(width - 2, -1, -1):
+                np.minimum(dist[:, x], dist[:, x + 1] + costs[1, :, x], out=dist[:, x])
+            for y in range(1, height):
+                np.minimum(dist[:, :, y], dist[:, :, y - 1] + costs[2, :, :, y], out=dist[:, :, y])
+            for y in range(height - 2, -1, -1):
+                np.minimum(dist[:, :, y], dist[:, :, y + 1] + costs[0, :, :, y], out=dist[:, :, y])
+            if np.array_equal(dist, before):
+                return dist
+
+    def ranked_steps(self, idx, a, dist, costs, goals, occupied, carriers=None):
+        """Directions out of agent ``a``'s cell by step cost plus remaining distance, and which are usable.
+
+        Ties go to the smaller neighbour position, as when the scalar model
+        sorts ``(total, neighbour)`` tuples. A firefighter already on a goal
+        has no steps. On ``carriers`` boards, steps that lead further from the
+        goal are unusable while any other step is usable.
+        """
+        rows = np.arange(len(idx))
+        x, y = self.x[idx, a], self.y[idx, a]
+        here = dist[rows, x, y]
+        totals = np.full((len(idx), 4), INF, dtype=np.int64)
+        farther = np.zeros((len(idx), 4), dtype=bool)
+        for d in range(4):
+            nx, ny = x + DX[d], y + DY[d]
+            inside = self.in_bounds(nx, ny)
+            nx, ny = np.clip(nx, 0, self.width - 1), np.clip(ny, 0, self.height - 1)
+            remaining = dist[rows, nx, ny]
+            cost = costs[d, rows, x, y]
+            usable = inside & (remaining < INF) & (cost < INF) & (occupied[rows, nx, ny] == 0)
+            totals[:, d] = np.where(usable, (cost + remaining) * 4 + TIE_ORDER[d], INF)
+            farther[:, d] = remaining > here
+        order = np.argsort(totals, axis=1, kind='stable')
+        usable = np.take_along_axis(totals, order, axis=1) < INF
+        usable &= ~goals[rows, x, y][:, None]
+        if carriers is not None:
+            nearer = usable & ~np.take_along_axis(farther, order, axis=1)
+            usable = np.where((carriers & nearer.any(axis=1))[:, None], nearer, usable)
+        return order, usable
+
+    # Firefighter actions, each applied to agent slot ``a`` on boards ``idx``
+
+    def end_turn(self, idx, a):
+        self.action_points[idx, a] = 0
+        self.turn_completed[idx, a] = True
+
+    def movement_cost(self, idx, a, x, y):
+        base = np.where(self.cells[idx, x, y] == EMPTY, 1, 2)
+        return np.where(self.carrying[idx, a], base * 2, base)
+
+    def reveal_and_carry(self, idx, a):
+        """``reveal_poi_if_present``: reveal a POI under the firefighter, then pick up a victim there."""
+        x, y = self.x[idx, a], self.y[idx, a]
+        marker = self.markers[idx, x, y]
+        victim = marker == HIDDEN_VICTIM
+        self.markers[idx[victim], x[victim], y[victim]] = VICTIM
+        self.total_victims_on_board[idx[victim]] += 1
+        self.victims_in_pois[idx[victim]] -= 1
+        false_alarm = marker == HIDDEN_FALSE_ALARM
+        self.markers[idx[false_alarm], x[false_alarm], y[false_alarm]] = NO_MARKER
+        self.false_alarms_in_pois[idx[false_alarm]] -= 1
+        self.false_alarms_revealed[idx[false_alarm]] += 1
+        carry = (self.markers[idx, x, y] == VICTIM) & ~self.carrying[idx, a]
+        picked = idx[carry]
+        self.markers[picked, x[carry], y[carry]] = NO_MARKER
+        self.carrying[picked, a] = True
+        self.action_points[picked, a] -= 2
+
+    def rescue(self, idx, a):
+        """``rescue_victim_at_exit``; returns which boards rescued."""
+        outside = ~self.interior_mask[self.x[idx, a], self.y[idx, a]]
+        hit = self.carrying[idx, a] & outside & (self.action_points[idx, a] >= 1)
+        rows = idx[hit]
+        self.carrying[rows, a] = False
+        self.victims_rescued[rows] += 1
+        self.action_points[rows, a] -= 1
+        return hit
+
+    def move(self, idx, a, d, occupied):
+        """``move_action`` in direction ``d`` (one per board); returns which boards moved.
+
+        As in the scalar action, a closed door on the way is opened for 1 AP
+        even when the move itself then fails.
+        """
+        rows = np.arange(len(idx))
+        x, y = self.x[idx, a], self.y[idx, a]
+        nx, ny = x + DX[d], y + DY[d]
+        closed = self.door[idx, x, y, d] == DOOR_CLOSED
+        opens = closed & (self.action_points[idx, a] >= 2)
+        self.set_edges(self.door, idx[opens], x[opens], y[opens], d[opens], DOOR_OPEN)
+        self.action_points[idx[opens], a] -= 1
+        ap = self.action_points[idx, a]
+        cost = self.movement_cost(idx, a, nx, ny)
+        fire = self.cells[idx, nx, ny] == FIRE
+        moved = ((~closed | opens) & (ap >= cost) & ~(fire & (ap - cost <= 0)) & ~(fire & self.carrying[idx, a])
+                 & (occupied[rows, nx, ny] == 0))
+        done = idx[moved]
+        self.x[done, a] = nx[moved]
+        self.y[done, a] = ny[moved]
+        self.action_points[done, a] -= cost[moved]
+        self.reveal_and_carry(done, a)
+        return moved
+
+    def extinguish_at(self, idx, a, x, y):
+        """``extinguish_action`` on (x, y) of every board, which all hold fire or smoke."""
+        fire = self.cells[idx, x, y] == FIRE
+        full = ~fire | (self.action_points[idx, a] >= 2)
+        self.cells[idx, x, y] = np.where(full, EMPTY, SMOKE)
+        self.action_points[idx, a] -= np.where(fire & full, 2, 1)
+
+    def extinguish(self, idx, a):
+        """Extinguish the first hazard of the neighbourhood not behind a wall or closed door; returns which boards did."""
+        acted = np.zeros(len(idx), dtype=bool)
+        x, y = self.x[idx, a], self.y[idx, a]
+        sides = self.open_sides(idx, x, y)
+        able = self.action_points[idx, a] >= 1
+        for d in NEIGHBOURHOOD:
+            if d < 0:
+                tx, ty, reachable = x, y, able
+            else:
+                tx, ty = np.clip(x + DX[d], 0, self.width - 1), np.clip(y + DY[d], 0, self.height - 1)
+                reachable = able & sides[:, d]
+            hit = ~acted & reachable & (self.cells[idx, tx, ty] != EMPTY)
+            if hit.any():
+                self.extinguish_at(idx[hit], a, tx[hit], ty[hit])
+                acted |= hit
+        return acted
+
+    def open_door(self, idx, a, allowed):
+        """Open the first closed door next to the firefighter on an ``allowed`` side; returns which boards did."""
+        opened = np.zeros(len(idx), dtype=bool)
+        x, y = self.x[idx, a], self.y[idx, a]
+        able = self.action_points[idx, a] >= 1
+        for d in NEIGHBOURHOOD:
+            if d < 0:
+                continue
+            hit = ~opened & able & allowed[:, d] & (self.door[idx, x, y, d] == DOOR_CLOSED)
+            if hit.any():
+                self.set_edges(self.door, idx[hit], x[hit], y[hit], np.full(hit.sum(), d), DOOR_OPEN)
+                self.action_points[idx[hit], a] -= 1
+                opened |= hit
+        return opened
+
+    def nearest_marker(self, idx, a, codes):
+        """Closest cell holding one of ``codes`` (Manhattan, then scan order); -1 where there is none."""
+        x, y = self.x[idx, a], self.y[idx, a]
+        gx, gy = np.meshgrid(np.arange(self.width), np.arange(self.height), indexing='ij')
+        distance = np.abs(gx - x[:, None, None]) + np.abs(gy - y[:, None, None])
+        distance = np.where(np.isin(self.markers[idx], codes), distance, INF).reshape(len(idx), -1)
+        best = distance.argmin(axis=1)
+        found = distance[np.arange(len(idx)), best] < INF
+        return np.where(found, best // self.height, -1), np.where(found, best % self.height, -1)
+
+    def greedy_action(self, idx, a):
+        out = self.action_points[idx, a] <= 0
+        self.end_turn(idx[out], a)
+        idx = idx[~out]
+        idx = idx[~self.rescue(idx, a)]
+        carrier = self.carrying[idx, a]
+        self.reveal_and_carry(idx[~carrier], a)
+        idx = idx[~self.extinguish(idx, a)]
+        if not len(idx):
+            return
+        n = len(idx)
+        rows = np.arange(n)
+        carrier = self.carrying[idx, a]
+        occupied = self.occupancy(idx, skip=a)
+        # Carriers head for any cell outside, everyone else for the closest victim, or else hidden POI
+        tx, ty = self.nearest_marker(idx, a, [VICTIM])
+        px, py = self.nearest_marker(idx, a, [HIDDEN_VICTIM, HIDDEN_FALSE_ALARM])
+        tx, ty = np.where(tx >= 0, tx, px), np.where(tx >= 0, ty, py)
+        walker = ~carrier & (tx >= 0)
+        heading = carrier | walker
+        goals = np.zeros((n, self.width, self.height), dtype=bool)
+        goals[carrier] = ~self.interior_mask
+        goals[rows[walker], tx[walker], ty[walker]] = True
+        acted = np.zeros(n, dtype=bool)
+        if heading.any():
+            sub, goals, occupied = idx[heading], goals[heading], occupied[heading]
+            costs = self.step_costs(sub, goals)
+            dist = self.fields(goals, occupied > 0, costs)
+            order, usable = self.ranked_steps(sub, a, dist, costs, goals, occupied, carrier[heading])
+            tried = np.zeros(len(sub), dtype=bool)
+            # Carriers try their steps in rank order, everyone else only the best one
+            for k in range(4):
+                trying = ~tried & usable[:, k] & (carrier[heading] | (k == 0))
+                if not trying.any():
+                    break
+                boards, d = sub[trying], order[trying, k]
+                cost = self.movement_cost(boards, a, self.x[boards, a] + DX[d], self.y[boards, a] + DY[d])
+                affordable = self.action_points[boards, a] >= cost
+                moved = np.zeros(len(boards), dtype=bool)
+                moved[affordable] = self.move(boards[affordable], a, d[affordable], occupied[trying][affordable])
+                tried[np.flatnonzero(trying)[moved]] = True
+            acted[heading] = tried
+        # Still stuck: open a door, for walkers only one that brings them closer to their target
+        x, y = self.x[idx, a], self.y[idx, a]
+        allowed = np.zeros((n, 4), dtype=bool)
+        for d in range(4):
+            closer = np.abs(x + DX[d] - tx) + np.abs(y + DY[d] - ty) < np.abs(x - tx) + np.abs(y - ty)
+            allowed[:, d] = carrier | (walker & closer)
+        stuck = ~acted & heading
+        if stuck.any():
+            acted[stuck] = self.open_door(idx[stuck], a, allowed[stuck])
+        self.end_turn(idx[~acted], a)
+
+    def random_action(self, idx, a):
+        out = self.action_points[idx, a] <= 0
+        self.end_turn(idx[out], a)
+        idx = idx[~out]
+        idx = idx[~self.rescue(idx, a)]
+        if not len(idx):
+            return
+        n = len(idx)
+        rows = np.arange(n)
+        x, y = self.x[idx, a], self.y[idx, a]
+        ap = self.action_points[idx, a]
+        occupied = self.occupancy(idx, skip=a)
+        wall = self.wall[idx, x, y]
+        door = self.door[idx, x, y]
+        sides = self.open_sides(idx, x, y)
+        # Options 0-3 move in that direction, 4-8 extinguish the NEIGHBOURHOOD cell of the same rank
+        options = np.zeros((n, 9), dtype=bool)
+        for d in range(4):
+            nx, ny = x + DX[d], y + DY[d]
+            inside = self.in_bounds(nx, ny)
+            nx, ny = np.clip(nx, 0, self.width - 1), np.clip(ny, 0, self.height - 1)
+            closed = door[:, d] == DOOR_CLOSED
+            left = ap - closed
+            cost = self.movement_cost(idx, a, nx, ny)
+            fire = self.cells[idx, nx, ny] == FIRE
+            options[:, d] = (inside & ~((wall[:, d] >= WALL_INTACT) & (wall[:, d] < WALL_DESTROYED))
+                             & (~closed | (ap >= 2)) & (left >= cost) & ~(fire & (left - cost <= 0))
+                             & ~(fire & self.carrying[idx, a]) & (occupied[rows, nx, ny] == 0))
+        for k, d in enumerate(NEIGHBOURHOOD):
+            if d < 0:
+                options[:, 4 + k] = (ap >= 1) & (self.cells[idx, x, y] != EMPTY)
+            else:
+                tx, ty = np.clip(x + DX[d], 0, self.width - 1), np.clip(y + DY[d], 0, self.height - 1)
+                options[:, 4 + k] = (ap >= 1) & sides[:, d] & (self.cells[idx, tx, ty] != EMPTY)
+        count = options.sum(axis=1)
+        self.end_turn(idx[count == 0], a)
+        pick = (self.agent_rng.random(n) * count).astype(np.int64)
+        chosen = np.where(count > 0, np.argmax(np.cumsum(options, axis=1) > pick[:, None], axis=1), -1)
+        moving = (chosen >= 0) & (chosen < 4)
+        if moving.any():
+            self.move(idx[moving], a, chosen[moving], occupied[moving])
+        for k, d in enumerate(NEIGHBOURHOOD):
+            hit = chosen == 4 + k
+            if hit.any():
+                dx, dy = (0, 0) if d < 0 else DIRECTIONS[d]
+                self.extinguish_at(idx[hit], a, x[hit] + dx, y[hit] + dy)
+
+    def play_turn(self, idx, a):
+        """Firefighter ``a``'s whole turn on boards ``idx``, one action per board at a time."""
+        self.action_points[idx, a] = 4
+        self.turn_completed[idx, a] = False
+        action = self.greedy_action if self.policy == 'greedy' else self.random_action
+        for _ in range(MAX_ACTIONS):
+            pending = idx[~self.turn_completed[idx, a]]
+            if not len(pending):
+                return
+            self.steps[pending] += 1
+            action(pending, a)
+        self.end_turn(idx, a)
+
+    # Fire phase
+
+    def fire_phase(self, idx):
+        """``advance_fire_phase`` on boards ``idx``: roll the dice, spread, burn, replenish POIs."""
+        x_faces, y_faces = self.fire_dice
+        tx = self.fire_rng.integers(self.interior[0], self.interior[0] + x_faces, size=len(idx))
+        ty = self.fire_rng.integers(self.interior[1], self.interior[1] + y_faces, size=len(idx))
+        self.turns[idx] += 1
+        x0, y0, x1, y1 = self.interior
+        hit = (tx >= x0) & (tx <= x1) & (ty >= y0) & (ty <= y1)
+        idx, tx, ty = idx[hit], tx[hit], ty[hit]
+        cell = self.cells[idx, tx, ty]
+        for code, result in ((EMPTY, SMOKE), (SMOKE, FIRE)):
+            change = cell == code
+            self.cells[idx[change], tx[change], ty[change]] = result
+        for b, x, y in zip(idx[cell == FIRE], tx[cell == FIRE], ty[cell == FIRE]):
+            self.explode(b, x, y)
+        self.flashover(idx)
+        self.burn(idx)
+        self.replenish_pois(idx)
+
+    def explode(self, b, x, y):
+        """``handle_explosion`` on board ``b``; like the scalar model, only the first direction is processed."""
+        d = 0
+        dx, dy = DIRECTIONS[d]
+        damaged = set()
+        while True:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < self.width and 0 <= ny < self.height):
+                break
+            wall = self.wall[b, x, y, d]
+            door = self.door[b, x, y, d]
+            if wall != NO_WALL and (x, y) not in damaged:
+                if wall < WALL_DESTROYED:
+                    self.set_edge(self.wall, b, x, y, d, wall + 1)
+                    self.damage_cubes[b] += 0.5
+                    damaged.add((x, y))
+                else:
+                    break
+            if door != NO_DOOR and door != DOOR_DESTROYED:
+                self.set_edge(self.door, b, x, y, d, DOOR_DESTROYED)
+                break
+            if self.cells[b, nx, ny] == SMOKE:
+                self.cells[b, nx, ny] = FIRE
+                break
+            for a in range(self.num_agents):
+                if self.x[b, a] == nx and self.y[b, a] == ny:
+                    self.x[b, a], self.y[b, a] = self.nearest_border[nx, ny]
+                    if self.carrying[b, a]:
+                        self.carrying[b, a] = False
+                        self.victims_lost[b] += 1
+            if self.cells[b, nx, ny] != FIRE:
+                break
+            x, y = nx, ny
+            self.shockwave(b, x, y, d)
+
+    def shockwave(self, b, x, y, d):
+        dx, dy = DIRECTIONS[d]
+        for _ in range(20):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < self.width and 0 <= ny < self.height):
+                break
+            wall = self.wall[b, x, y, d]
+            if wall != NO_WALL and wall < WALL_DESTROYED:
+                self.damage_cubes[b] += 1
+                self.set_edge(self.wall, b, x, y, d, wall + 1)
+                # The wave carries on only through a wall it has just destroyed
+                if wall + 1 < WALL_DESTROYED:
+                    break
+            door = self.door[b, x, y, d]
+            if door == DOOR_CLOSED:
+                self.set_edge(self.door, b, x, y, d, DOOR_DESTROYED)
+                break
+            elif door == DOOR_OPEN:
+                self.set_edge(self.door, b, x, y, d, DOOR_DESTROYED)
+            if self.cells[b, nx, ny] != FIRE:
+                self.cells[b, nx, ny] = FIRE
+                break
+            x, y = nx, ny
+
+    def flashover(self, idx):
+        """Smoke sharing an open side with fire catches fire, in one pass as ``flashover_mask``."""
+        cells = self.cells[idx]
+        fire = cells == FIRE
+        wall = self.wall[idx]
+        passable = ((wall == NO_WALL) | (wall == WALL_DESTROYED)) & (self.door[idx] != DOOR_CLOSED)
+        spread = np.zeros_like(fire)
+        for d in range(4):
+            spread |= neighbour(fire, d, False) & passable[..., d]
+        cells[spread & (cells == SMOKE)] = FIRE
+        self.cells[idx] = cells
+
+    def burn(self, idx):
+        """``check_victims_in_fire``: knock firefighters out of fire and lose the victims and POIs in it."""
+        for a in range(self.num_agents):
+            x, y = self.x[idx, a], self.y[idx, a]
+            burned = self.cells[idx, x, y] == FIRE
+            boards = idx[burned]
+            self.victims_lost[boards] += self.carrying[boards, a]
+            self.carrying[boards, a] = False
+            start = self.nearest_start[x[burned], y[burned]]
+            self.x[boards, a], self.y[boards, a] = start[:, 0], start[:, 1]
+        markers = self.markers[idx]
+        burning = (self.cells[idx] == FIRE) & (markers != NO_MARKER)
+        if not burning.any():
+            return
+        victims = (burning & (markers == VICTIM)).sum(axis=(1, 2))
+        hidden_victims = (burning & (markers == HIDDEN_VICTIM)).sum(axis=(1, 2))
+        false_alarms = (burning & (markers == HIDDEN_FALSE_ALARM)).sum(axis=(1, 2))
+        # As in the scalar model a burned victim POI also counts against the victims on the board
+        self.victims_lost[idx] += victims + hidden_victims
+        self.total_victims_on_board[idx] -= victims + hidden_victims
+        self.victims_in_pois[idx] -= hidden_victims
+        self.false_alarms_in_pois[idx] -= false_alarms
+        self.poi_placed[idx] -= hidden_victims + false_alarms
+        markers[burning] = NO_MARKER
+        self.markers[idx] = markers
+
+    def replenish_pois(self, idx):
+        """``replenish_pois`` for the boards of ``idx`` left with fewer than three hidden POIs."""
+        markers = self.markers[idx]
+        hidden = ((markers == HIDDEN_VICTIM) | (markers == HIDDEN_FALSE_ALARM)).sum(axis=(1, 2))
+        short = (hidden < 3) & (self.poi_placed[idx] < self.total_poi_markers)
+        for b, count in zip(idx[short], hidden[short]):
+            while count < 3 and self.poi_placed[b] < self.total_poi_markers:
+                free = self.interior_mask & (self.cells[b] == EMPTY) & (self.markers[b] == NO_MARKER)
+                free[self.x[b], self.y[b]] = False
+                empty_positions = np.argwhere(free)
+                if not len(empty_positions):
+                    break
+                red_die = self.poi_rng.integers(1, self.fire_dice[1] + 1)
+                black_die = self.poi_rng.integers(1, self.fire_dice[0] + 1)
+                x, y = black_die - 1, red_die - 1
+                if not (x < self.width and y < self.height and self.interior_mask[x, y]):
+                    x, y = empty_positions[self.poi_rng.integers(len(empty_positions))]
+                elif not free[x, y]:
+                    x, y = empty_positions[np.abs(empty_positions - (x, y)).sum(axis=1).argmin()]
+                victims_left = self.total_victims_available - (self.total_victims_on_board[b] + self.victims_rescued[b]
+                                                                + self.victims_lost[b] + self.victims_in_pois[b])
+                false_alarms_left = self.total_false_alarms_available - (self.false_alarms_revealed[b]
+                                                                         + self.false_alarms_in_pois[b])
+                if victims_left > 0 and (false_alarms_left == 0 or self.poi_rng.random() < 0.67):
+                    self.markers[b, x, y] = HIDDEN_VICTIM
+                    self.victims_in_pois[b] += 1
+                elif false_alarms_left > 0:
+                    self.markers[b, x, y] = HIDDEN_FALSE_ALARM
+                    self.false_alarms_in_pois[b] += 1
+                else:
+                    break
+                self.poi_placed[b] += 1
+                count += 1
+
+    def check_game_end(self, idx):
+        lost = (self.victims_lost[idx] >= self.LOSE_VICTIMS_LOST) | (self.damage_cubes[idx] >= self.MAX_DAMAGE_CUBES)
+        won = ~lost & (self.victims_rescued[idx] >= self.WIN_VICTIMS_NEEDED)
+        self.game_over[idx] = lost | won
+        self.game_won[idx] = won
+
+    # Driving the batch
+
+    def live(self, max_turns=None):
+        live = ~self.game_over
+        if max_turns is not None:
+            live &= self.turns < max_turns
+        return np.flatnonzero(live)
+
+    def play_round(self, max_turns=None):
+        """Every firefighter's turn, each followed by a fire phase, on the boards still playing."""
+        for a in range(self.num_agents):
+            idx = self.live(max_turns)
+            if not len(idx):
+                return
+            self.play_turn(idx, a)
+            self.fire_phase(idx)
+            self.steps[idx] += 1
+            self.check_game_end(idx)
+
+    def run(self, max_turns=None):
+        """Play until every board is over or has had ``max_turns`` fire phases."""
+        start = time.perf_counter()
+        while len(self.live(max_turns)):
+            self.play_round(max_turns)
+        self.elapsed += time.perf_counter() - start
+        return self
+
+    def results(self):
+        """One ``play_game``-style result per board."""
+        return [{
+            "seed": self.seed,
+            "board": b,
+            "strategy": f"vector_{self.policy}",
+            "num_agents": self.num_agents,
+            "finished": bool(self.game_over[b]),
+            "won": bool(self.game_won[b]),
+            "victims_rescued": int(self.victims_rescued[b]),
+            "victims_lost": int(self.victims_lost[b]),
+            "damage_cubes": float(self.damage_cubes[b]),
+            "turns": int(self.turns[b]),
+            "steps": int(self.steps[b])
+        } for b in range(self.boards)]
+
+    def summary(self):
+        summary = aggregate(self.results())
+        summary["strategy"] = f"vector_{self.policy}"
+        summary["num_agents"] = self.num_agents
+        summary["elapsed_sec"] = self.elapsed
+        summary["games_per_sec"] = self.boards / self.elapsed if self.elapsed else None
+        return summary
+
+
+# Per-game outcomes compared by --validate
+OUTCOMES = ('finished', 'won', 'victims_rescued', 'victims_lost', 'damage_cubes')
+
+
+def compare_outcomes(vector_results, scalar_results):
+    """Mean of every outcome in both result lists and the z-score of their difference."""
+    comparison = {}
+    for key in OUTCOMES:
+        samples = []
+        for results in (vector_results, scalar_results):
+            values = [float(r[key]) for r in results]
+            mean = sum(values) / len(values)
+            variance = sum((v - mean) ** 2 for v in values) / max(1, len(values) - 1)
+            samples.append((mean, variance / len(values)))
+        (vector_mean, vector_var), (scalar_mean, scalar_var) = samples
+        error = math.sqrt(vector_var + scalar_var)
+        comparison[key] = {"vector": vector_mean, "scalar": scalar_mean,
+                           "z": (vector_mean - scalar_mean) / error if error else 0.0}
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play thousands of games at once on stacked NumPy boards")
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--num-agents", type=int, default=1)
+    parser.add_argument("--policy", choices=POLICIES, default='greedy')
+    parser.add_argument("--max-turns", type=int, default=300, help="stop a board after this many fire phases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", default='final.txt')
+    parser.add_argument("--output", default=None, help="write per-board results as JSON lines")
+    parser.add_argument("--validate", type=int, default=0, metavar="GAMES",
+                        help="also play GAMES scalar improved-strategy games and compare the outcomes")
+    args = parser.parse_args()
+    model = VectorFireRescueModel(args.boards, args.num_agents, args.policy, args.seed, args.scenario)
+    model.run(args.max_turns)
+    summary = model.summary()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in model.results():
+                f.write(json.dumps(result) + "\n")
+    if args.validate:
+        start = time.perf_counter()
+        scalar = [play_game(game_seed(args.seed, game), 'improved', model.num_agents, max_turns=args.max_turns)
+                  for game in range(args.validate)]
+        elapsed = time.perf_counter() - start
+        summary["scalar"] = aggregate(scalar)
+        summary["scalar"]["games_per_sec"] = args.validate / elapsed
+        summary["comparison"] = compare_outcomes(model.results(), scalar)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == '__main__':
+    main()